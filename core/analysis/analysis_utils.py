@@ -3,6 +3,7 @@ from core.data.interfaces import IAnalysisJob
 from core.container.container_interfaces import IProjectContainer
 from typing import List, Dict
 from core.container.project import ClassificationObject, VIANProject
+from core.container.analysis_cache import AnalysisResultCache
 
 PROJECT_LOCK = Lock()
 
@@ -10,19 +11,40 @@ def progress_dummy(args, **kwargs):
     pass
 
 def run_analysis(project:VIANProject, analysis: IAnalysisJob, targets: List[IProjectContainer],
-                 class_objs: List[ClassificationObject]=None):
+                 class_objs: List[ClassificationObject]=None, cache: AnalysisResultCache = None):
+    """
+    Runs an analysis in the current thread and adds the results to the project.
+
+    :param cache: an optional AnalysisResultCache, targets which are cached are not computed again
+    """
     fps = project.movie_descriptor.fps
 
     for clobj in class_objs:
         args = analysis.prepare(project, targets, fps, clobj)
 
+        hits, keys = [], dict()
+        if cache is not None:
+            hits, args, keys = cache.split(analysis, args, project.movie_descriptor.get_fingerprint_key(), clobj)
+        for r in hits:
+            with PROJECT_LOCK:
+                analysis.modify_project(project, r)
+                project.add_analysis(r)
+        if args is None:
+            continue
+
         res = []
-        if analysis.multiple_result:
+        if analysis.merged_decoding:
+            res = analysis.process_merged(args, progress_dummy)
+        elif analysis.multiple_result:
             for i, arg in enumerate(args):
                 res.append(analysis.process(arg, progress_dummy))
         else:
             res = analysis.process(args, progress_dummy)
 
+        for r in (res if isinstance(res, list) else [res]):
+            if r is not None and r.target_container in keys:
+                cache.put(keys[r.target_container], analysis, r)
+
         if isinstance(res, list):
             for r in res:
                 with PROJECT_LOCK:
@@ -33,3 +55,6 @@ def run_analysis(project:VIANProject, analysis: IAnalysisJob, targets: List[IPro
                 analysis.modify_project(project, res)
                 project.add_analysis(res)
 
+    if project.hdf5_manager is not None:
+        project.hdf5_manager.flush()
+
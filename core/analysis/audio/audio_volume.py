@@ -26,6 +26,9 @@ array Structure:
 
 @vian_analysis
 class AudioVolumeAnalysis(IAnalysisJob):
+    # The audio is read from the HDF5Manager of the project
+    thread_only = True
+
     def __init__(self, resolution=30):
         super(AudioVolumeAnalysis, self).__init__("Audio Volume", [MOVIE_DESCRIPTOR, SEGMENT],
                                                   menu=IAnalysisJob.M_AUDIO,
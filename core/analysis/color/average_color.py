@@ -54,7 +54,8 @@ class ColorFeatureAnalysis(IAnalysisJob):
                                                    dataset_dtype=np.float16,
                                                    author="Gaudenz Halter",
                                                    version="1.0.0",
-                                                   multiple_result=False)
+                                                   multiple_result=False,
+                                                   merged_decoding=True)
         self.resolution = resolution
 
     def prepare(self, project: VIANProject, targets: List[IProjectContainer], fps, class_objs = None):
@@ -72,90 +73,71 @@ class ColorFeatureAnalysis(IAnalysisJob):
         return args
 
     def process(self, argst, sign_progress):
-        argst, sign_progress = super(ColorFeatureAnalysis, self).process(argst, sign_progress)
-        result = []
-        # Signal the Progress
-        cap = None
-        counter = 0
-        for args in argst:
-            sign_progress(counter / len(argst))
-            counter += 1
-
-            start = args['start']
-            stop = args['end']
-            movie_path = args['movie_path']
-            margins = args['margins']
-            semseg = args['semseg']
-            colors_lab = []
-            colors_bgr = []
-
-            if cap is None:
-                cap = cv2.VideoCapture(movie_path)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
-            c = start
-
-            for i in range(start, stop  + 1, self.resolution):
-                sign_progress((c - start) / ((stop - start) + 1))
-                cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-                ret, frame = cap.read()
-                if frame is None:
-                    break
-
-                # Get sub frame if there are any margins
-                if margins is not None:
-                    frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
-
-                frame = preprocess_frame(frame, self.max_width)
-
-                bin_mask = None
-                if semseg is not None and self.target_class_obj is not None:
-                    name, labels = self.target_class_obj.semantic_segmentation_labels
-                    mask = semseg.get_adata()
-                    bin_mask = labels_to_binary_mask(mask, labels)
-                    if margins is not None:
-                        bin_mask = bin_mask[margins[1]:margins[3], margins[0]:margins[2]]
-                    bin_mask = preprocess_frame(bin_mask, self.max_width, mode=cv2.INTER_NEAREST)
-
-                if bin_mask is not None:
-                    indices = np.where(bin_mask > 0)
-                    colors_bgr.append(np.mean(frame[indices], axis=(0)))
-                    frame_lab = cv2.cvtColor(frame.astype(np.float32) / 255, cv2.COLOR_BGR2LAB)
-                    colors_lab.append(np.mean(frame_lab[indices], axis=(0)))
-                else:
-                    colors_bgr.append(np.mean(frame, axis = (0, 1)))
-                    frame_lab = cv2.cvtColor(frame.astype(np.float32) / 255, cv2.COLOR_BGR2LAB)
-                    colors_lab.append(np.mean(frame_lab, axis=(0, 1)))
-                c += 1
-
-            if len(colors_lab) > 1:
-                colors_bgr = np.mean(colors_bgr, axis = 0)
-                colors_lab = np.mean(colors_lab, axis = 0)
-
-            elif len(colors_lab) == 1:
-                colors_bgr = colors_bgr[0]
-                colors_lab = colors_lab[0]
-
-            else:
-                continue
-
-            saturation_l = lab_to_sat(lab=colors_lab, implementation="luebbe")
-            saturation_p = lab_to_sat(lab=colors_lab, implementation="pythagoras")
-
-            sign_progress(1.0)
-            result.append(
-             IAnalysisJobAnalysis(
-                name="Color Average",
-                results = dict(color_lab=colors_lab,
-                               color_bgr = colors_bgr,
-                               saturation_l=saturation_l,
-                               saturation_p = saturation_p
-                               ),
-                analysis_job_class=self.__class__,
-                parameters=dict(resolution = self.resolution),
-                container=args['target']
-            )
-            )
-        return result
+        return self.process_merged(argst, sign_progress)
+
+    def prepare_frame(self, frame_idx, frame, margins):
+        # Get sub frame if there are any margins
+        if margins is not None:
+            frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
+
+        frame = preprocess_frame(frame, self.max_width)
+        frame_lab = cv2.cvtColor(frame.astype(np.float32) / 255, cv2.COLOR_BGR2LAB)
+        return frame, frame_lab
+
+    def create_accumulator(self, args):
+        bin_mask = None
+        semseg = args['semseg']
+        margins = args['margins']
+        if semseg is not None and self.target_class_obj is not None:
+            name, labels = self.target_class_obj.semantic_segmentation_labels
+            mask = semseg.get_adata()
+            bin_mask = labels_to_binary_mask(mask, labels)
+            if margins is not None:
+                bin_mask = bin_mask[margins[1]:margins[3], margins[0]:margins[2]]
+            bin_mask = preprocess_frame(bin_mask, self.max_width, mode=cv2.INTER_NEAREST)
+        return dict(bin_mask=bin_mask, colors_lab=[], colors_bgr=[])
+
+    def accumulate(self, accumulator, frame_idx, frame, args):
+        frame, frame_lab = frame
+        bin_mask = accumulator['bin_mask']
+
+        if bin_mask is not None:
+            indices = np.where(bin_mask > 0)
+            accumulator['colors_bgr'].append(np.mean(frame[indices], axis=(0)))
+            accumulator['colors_lab'].append(np.mean(frame_lab[indices], axis=(0)))
+        else:
+            accumulator['colors_bgr'].append(np.mean(frame, axis = (0, 1)))
+            accumulator['colors_lab'].append(np.mean(frame_lab, axis=(0, 1)))
+
+    def finalize(self, accumulator, args):
+        colors_lab = accumulator['colors_lab']
+        colors_bgr = accumulator['colors_bgr']
+
+        if len(colors_lab) > 1:
+            colors_bgr = np.mean(colors_bgr, axis = 0)
+            colors_lab = np.mean(colors_lab, axis = 0)
+
+        elif len(colors_lab) == 1:
+            colors_bgr = colors_bgr[0]
+            colors_lab = colors_lab[0]
+
+        else:
+            return None
+
+        saturation_l = lab_to_sat(lab=colors_lab, implementation="luebbe")
+        saturation_p = lab_to_sat(lab=colors_lab, implementation="pythagoras")
+
+        return IAnalysisJobAnalysis(
+            name="Color Average",
+            results = dict(color_lab=colors_lab,
+                           color_bgr = colors_bgr,
+                           saturation_l=saturation_l,
+                           saturation_p = saturation_p
+                           ),
+            analysis_job_class=self.__class__,
+            parameters=dict(resolution = self.resolution),
+            container=args['target']
+        )
 
     def modify_project(self, project: VIANProject, result: IAnalysisJobAnalysis, main_window=None):
         """
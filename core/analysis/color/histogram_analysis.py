@@ -39,7 +39,8 @@ class ColorHistogramAnalysis(IAnalysisJob):
                                                    dataset_dtype=np.float32,
                                                    author="Gaudenz Halter",
                                                      version="1.0.0",
-                                                     multiple_result=True)
+                                                     multiple_result=True,
+                                                     merged_decoding=True)
         self.resolution = resolution
 
     def prepare(self, project: VIANProject, targets: List[IProjectContainer], fps, class_objs = None):
@@ -48,61 +49,54 @@ class ColorHistogramAnalysis(IAnalysisJob):
         return args
 
     def process(self, args, sign_progress):
-        args, sign_progress = super(ColorHistogramAnalysis, self).process(args, sign_progress)
+        result = self.process_merged([args], sign_progress)
+        if len(result) > 0:
+            return result[0]
+        return None
 
-        # Signal the Progress
-        sign_progress(0.0)
+    def prepare_frame(self, frame_idx, frame, margins):
+        # Get sub frame if there are any margins
+        if margins is not None:
+            frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
 
-        start = args['start']
-        stop = args['end']
-        movie_path = args['movie_path']
-        margins = args['margins']
-        semseg = args['semseg']
-
-        cap = cv2.VideoCapture(movie_path)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
-        c = start
-        final_hist = np.zeros(shape=(16,16,16), dtype = np.float32)
-        shape = (1,1)
+        frame = preprocess_frame(frame, self.max_width)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
 
+    def create_accumulator(self, args):
         bin_mask = None
+        semseg = args['semseg']
         if semseg is not None:
             name, labels = self.target_class_obj.semantic_segmentation_labels
             mask = semseg.get_adata()
             bin_mask = labels_to_binary_mask(mask, labels)
+            bin_mask = preprocess_frame(bin_mask, self.max_width, mode=cv2.INTER_NEAREST)
+        return dict(bin_mask=bin_mask, hist=np.zeros(shape=(16,16,16), dtype = np.float32), shape=None)
 
-        for i in range(start, stop  + 1, self.resolution):
-            sign_progress((c - start) / ((stop - start) + 1))
+    def accumulate(self, accumulator, frame_idx, frame, args):
+        if accumulator['shape'] is None:
+            accumulator['shape'] = frame.shape
 
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-            ret, frame = cap.read()
+        bin_mask = accumulator['bin_mask']
+        if bin_mask is not None:
+            data = frame[np.where(bin_mask==True)]
+        else:
+            data = np.resize(frame, (frame.shape[0] * frame.shape[1], 3))
 
-            if frame is None:
-                break
+        accumulator['hist'] += cv2.calcHist([data[:, 0], data[:, 1], data[:, 2]], [0, 1, 2], None,
+                            [16, 16, 16],
+                            [0, 255, 0, 255, 1, 255])
 
-            # Get sub frame if there are any margins
-            if margins is not None:
-                frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
-
-            frame = preprocess_frame(frame, self.max_width)
-            if c == start:
-                shape = frame.shape
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-            if bin_mask is not None:
-                bin_mask = preprocess_frame(bin_mask, self.max_width, mode=cv2.INTER_NEAREST)
-                data = frame[np.where(bin_mask==True)]
-            else:
-                data = np.resize(frame, (frame.shape[0] * frame.shape[1], 3))
-
-            final_hist += cv2.calcHist([data[:, 0], data[:, 1], data[:, 2]], [0, 1, 2], None,
-                                [16, 16, 16],
-                                [0, 255, 0, 255, 1, 255])
-            c += 1
+    def finalize(self, accumulator, args):
+        start = args['start']
+        stop = args['end']
+        shape = accumulator['shape']
+        if shape is None:
+            shape = (1, 1)
 
+        final_hist = accumulator['hist']
         final_hist /= (np.clip(stop - start, 1, None))
         final_hist /= (shape[0] * shape[1])
 
-        sign_progress(1.0)
         return IAnalysisJobAnalysis(
             name="Color-Histogram",
             results = final_hist,
@@ -140,6 +134,10 @@ class ColorHistogramAnalysis(IAnalysisJob):
                          "4th: Bins B-Channel {-128.0, ..., 128.0}\\"
         )
 
+    def get_hdf5_storage(self):
+        # Most bins of a histogram are empty, the zeros compress well
+        return dict(compression="gzip", compression_opts=4, shuffle=True)
+
     def to_hdf5(self, data):
         return data
 
@@ -57,7 +57,6 @@ class ColorPaletteAnalysis(IAnalysisJob):
 
         start = args['start']
         stop = args['end']
-        movie_path = args['movie_path']
         margins = args['margins']
         semseg = args['semseg']
         bin_mask = None
@@ -69,44 +68,35 @@ class ColorPaletteAnalysis(IAnalysisJob):
 
         palettes = []
 
-        cap = cv2.VideoCapture(movie_path)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
-        c = start
-
         model = None
-        for i in range(start, stop + 1, self.resolution):
-            sign_progress((c - start) / ((stop - start) + 1))
-
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i )
-            ret, frame = cap.read()
-
-            if frame is None:
-                break
-            # Get sub frame if there are any margins
-            if margins is not None:
-                frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
-            frame = preprocess_frame(frame, self.max_width)
-
-            if model is None:
-                if self.seeds_input_width < frame.shape[0]:
-                    rx = self.seeds_input_width / frame.shape[0]
-                    frame = cv2.resize(frame, None, None, rx, rx, cv2.INTER_CUBIC)
-                model = PaletteExtractorModel(frame, n_pixels=self.n_super_pixel, num_levels=8)
-
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-
-            try:
-                pal = color_palette(frame, mask=bin_mask,
-                                    mask_index=255,
-                                    n_pixels=self.n_super_pixel,
-                                    seeds_input_width = self.seeds_input_width,
-                                    seeds_model=model)
-            except Exception as e:
-                log_error(e)
-                pal = None
-            if pal is not None:
-                palettes.append(pal)
-            c += 1
+        with self.open_frame_source(args) as source:
+            for i, frame in source.read_frames(range(start, stop + 1, self.resolution)):
+                sign_progress((i - start) / ((stop - start) + 1))
+
+                # Get sub frame if there are any margins
+                if margins is not None:
+                    frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
+                frame = preprocess_frame(frame, self.max_width)
+
+                if model is None:
+                    if self.seeds_input_width < frame.shape[0]:
+                        rx = self.seeds_input_width / frame.shape[0]
+                        frame = cv2.resize(frame, None, None, rx, rx, cv2.INTER_CUBIC)
+                    model = PaletteExtractorModel(frame, n_pixels=self.n_super_pixel, num_levels=8)
+
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+
+                try:
+                    pal = color_palette(frame, mask=bin_mask,
+                                        mask_index=255,
+                                        n_pixels=self.n_super_pixel,
+                                        seeds_input_width = self.seeds_input_width,
+                                        seeds_model=model)
+                except Exception as e:
+                    log_error(e)
+                    pal = None
+                if pal is not None:
+                    palettes.append(pal)
 
         if len(palettes) > 0:
             if len(palettes) > 1:
@@ -191,12 +181,14 @@ class ColorPaletteAnalysis(IAnalysisJob):
                          " [6] Number of Colors"
         )
 
+    def get_hdf5_storage(self):
+        # Palettes use few of their rows, only these are stored
+        return dict(ragged=True, compression="gzip", compression_opts=4, shuffle=True)
+
     def to_hdf5(self, data):
-        d = np.zeros(shape=(COLOR_PALETTES_MAX_LENGTH, 6))
-        count = COLOR_PALETTES_MAX_LENGTH
-        if len(data['tree'][0]) < COLOR_PALETTES_MAX_LENGTH:
-            count = len(data['tree'][0])
-        d[:len(data['dist']), 0] = data['dist']
+        count = min(COLOR_PALETTES_MAX_LENGTH, max(len(data['dist']), len(data['tree'][0])))
+        d = np.zeros(shape=(count, 6))
+        d[:min(count, len(data['dist'])), 0] = data['dist'][:count]
         d[:count, 1] = data['tree'][0][:count]
         d[:count, 2:5] = data['tree'][1][:count]
         d[:count, 5] = data['tree'][2][:count]
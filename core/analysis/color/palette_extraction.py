@@ -27,30 +27,25 @@ class PaletteExtractorModel:
         return self.model.getLabels()
 
     def labels_to_avg_color_mask(self, lab, labels):
-        indices = np.unique(labels)
-        for idx in indices:
-            pixels = np.where(labels == idx)
-            lab[pixels] = np.mean(lab[pixels], axis = 0)
+        indices, means, counts = label_means(lab, labels)
+        lut = np.zeros(shape=(np.amax(indices) + 1, lab.shape[2]))
+        lut[indices] = means
+        lab[:] = lut[labels]
         return lab
 
     def labels_to_palette(self, lab, labels):
-        indices = np.unique(labels)
-        bins = []
-        for idx in indices:
-            pixels = np.where(labels == idx)
-            avg_col = np.mean(lab[pixels], axis = 0)
-            n_pixels = pixels[0].shape[0]
-            bins.append([avg_col, n_pixels])
-
-        bins = np.array(sorted(bins, key=lambda x:x[1], reverse=True))
+        indices, means, counts = label_means(lab, labels)
+        order = np.argsort(-counts, kind="stable")
+        means = means[order]
+        counts = counts[order]
 
         n_palette = 10
         preview = np.zeros(shape=(100,1500,3))
-        total = np.sum(bins[0:n_palette, 1])
+        total = np.sum(counts[0:n_palette])
         last  = 0
         for b in range(n_palette):
-            preview[:, last : last + (int(bins[b][1] * 1500 / total))] = bins[b, 0]
-            last += int(bins[b][1] * 1500 / total)
+            preview[:, last : last + (int(counts[b] * 1500 / total))] = means[b]
+            last += int(counts[b] * 1500 / total)
 
         return preview.astype(np.uint8)
 
@@ -78,64 +73,187 @@ class PaletteExtractorModel:
 
 
 
-def to_cluster_tree(Z, labels:List, colors, n_merge_steps = 1000, n_merge_per_lvl = 10):
-    all_lbl = labels.copy()
-    all_col = colors.copy()
-    all_n = [1] * len(all_col)
-
-    # print("Recreating Tree")
-    for i in range(Z.shape[0]):
-        a = int(Z[i][0])
-        b = int(Z[i][1])
-        all_lbl.append(len(all_lbl))
-        all_col.append(np.divide((all_col[a] * all_n[a]) + (all_col[b] * all_n[b]), all_n[a] + all_n[b]))
-        all_n.append(all_n[a] + all_n[b])
-
-    result_lbl = [[len(all_lbl) - 1]]
-    current_nodes = [len(all_lbl) - 1]
-    i = 0
-
-    merge_dists = []
-    while(len(current_nodes) <= n_merge_steps and i < len(all_lbl)):
-        try:
-            curr_lbl = len(all_lbl) - 1 - i
-            entry = Z[Z.shape[0] - 1 - i]
-            a = int(entry[0])
-            b = int(entry[1])
-            idx = current_nodes.index(curr_lbl)
-            current_nodes.remove(curr_lbl)
-            current_nodes.insert(idx, a)
-            current_nodes.insert(idx + 1, b)
-            result_lbl.append(current_nodes.copy())
-            merge_dists.append(entry[2])
-            i += 1
-        except Exception as e:
-            print(e)
-            break
+def label_means(values, labels):
+    """
+    Computes the mean value of all pixels per label in a single pass over the image.
+
+    :param values: an image of shape (h, w, c)
+    :param labels: a label image of shape (h, w)
+    :return: the sorted labels present, their mean values (n, c) and their pixel counts (n)
+    """
+    labels = labels.ravel().astype(np.int64)
+    values = values.reshape(labels.shape[0], -1)
+    counts = np.bincount(labels)
+    indices = np.nonzero(counts)[0]
+    sums = np.stack([np.bincount(labels, weights=values[:, c], minlength=counts.shape[0])
+                     for c in range(values.shape[1])], axis=1)
+    return indices, sums[indices] / counts[indices, None], counts[indices]
 
-    cols = np.zeros(shape=(0, 3), dtype=np.float32)
-    ns = np.zeros(shape=(0), dtype=np.uint16)
-    layers = np.zeros(shape=(0), dtype=np.uint16)
 
-    all_col = np.array(all_col, dtype=np.float32)
-    all_n = np.array(all_n, dtype=np.uint16)
+def weighted_ward_linkage(X, weights):
+    """
+    Ward linkage of the points X where each point counts weights[i] times.
+    This gives the same merges as repeating every point weights[i] times and clustering them
+    with linkage(data, 'ward'), except for the zero-distance merges among the copies.
 
-    i = 0
-    for r in result_lbl:
-        if i > 10 and i % n_merge_per_lvl != 0:
-            i += 1
-            continue
-        cols = np.concatenate((cols, all_col[r]))
-        ns = np.concatenate((ns, all_n[r]))
-        layers = np.concatenate((layers, np.array([i] * all_col[r].shape[0])))
-        i += 1
+    The nearest-neighbor chain algorithm is used, the result is a linkage matrix in the scipy format
+    where column 3 holds the summed weights.
+
+    :param X: the points of shape (n, d)
+    :param weights: the positive weights of shape (n)
+    :return: the linkage matrix Z of shape (n - 1, 4)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    size = np.asarray(weights, dtype=np.float64).copy()
+    n = X.shape[0]
+
+    # Squared ward distances between all active clusters
+    D = np.sum(np.square(X[:, None] - X[None, :]), axis=2)
+    D *= 2 * size[:, None] * size[None, :] / (size[:, None] + size[None, :])
+    np.fill_diagonal(D, np.inf)
+    active = np.ones(n, dtype=bool)
+
+    merges = []
+    chain = []
+    while len(merges) < n - 1:
+        if len(chain) == 0:
+            chain.append(int(np.argmax(active)))
+        while True:
+            x = chain[-1]
+            y = int(np.argmin(D[x]))
+            if len(chain) > 1 and D[x, y] >= D[x, chain[-2]]:
+                y = chain[-2]
+            if len(chain) > 1 and y == chain[-2]:
+                break
+            chain.append(y)
+        chain.pop()
+        chain.pop()
+
+        x, y = min(x, y), max(x, y)
+        merges.append((x, y, np.sqrt(D[x, y]), size[x] + size[y]))
+
+        # Lance-Williams update for ward, the merged cluster takes the place of y
+        nx, ny = size[x], size[y]
+        dxy = D[x, y]
+        d = ((nx + size) * D[x] + (ny + size) * D[y] - size * dxy) / (nx + ny + size)
+        D[y] = d
+        D[:, y] = d
+        D[y, y] = np.inf
+        D[x] = np.inf
+        D[:, x] = np.inf
+        active[x] = False
+        size[y] = nx + ny
+
+    # Sort by distance and relabel the clusters in the order they are merged
+    merges = sorted(merges, key=lambda m: m[2])
+    parent = np.arange(2 * n - 1)
+    cluster_of = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    Z = np.zeros(shape=(n - 1, 4))
+    for i, (x, y, dist, s) in enumerate(merges):
+        a = cluster_of[find(x)]
+        b = cluster_of[find(y)]
+        Z[i] = [min(a, b), max(a, b), dist, s]
+        root = find(x)
+        parent[find(y)] = root
+        cluster_of[root] = n + i
+    return Z
+
+
+def to_cluster_tree(Z, labels:List, colors, n_merge_steps = 1000, n_merge_per_lvl = 10, weights = None):
+    """
+    Walks the linkage tree from the root downwards, splitting one cluster per step, and returns the clusters
+    of every layer (the first ten, then every n_merge_per_lvl-th) as [layers, cols, ns].
+
+    :param Z: the linkage matrix
+    :param labels: the labels of the leaves
+    :param colors: the lab colors of the leaves
+    :param n_merge_steps: the maximal number of clusters in a layer
+    :param n_merge_per_lvl: every how many layers a layer is emitted after the tenth
+    :param weights: the sizes of the leaves, 1 if not given
+    :return: [layers, cols, ns] and the merge distances
+    """
+    n_leaves = len(labels)
+    n_nodes = n_leaves + Z.shape[0]
+    root = n_nodes - 1
+    children = Z[:, :2].astype(np.int64)
+
+    # Node sizes, for the leaves the weights
+    all_n = np.ones(shape=n_nodes, dtype=np.int64)
+    if weights is not None:
+        all_n[:n_leaves] = weights
+
+    # The depth of every node above the leaves, nodes of the same depth can be merged at once
+    height = np.zeros(shape=n_nodes, dtype=np.int64)
+    while True:
+        new_height = 1 + np.maximum(height[children[:, 0]], height[children[:, 1]])
+        if np.array_equal(new_height, height[n_leaves:]):
+            break
+        height[n_leaves:] = new_height
+
+    # Node colors as the size-weighted average of their children,
+    # computed in the dtype of the input colors with the same operations as merging them one by one
+    leaf_cols = np.array(colors)
+    all_col = np.zeros(shape=(n_nodes, ) + leaf_cols.shape[1:], dtype=leaf_cols.dtype)
+    all_col[:n_leaves] = leaf_cols
+    n_below = np.ones(shape=n_nodes, dtype=np.int64)
+    max_height = int(np.amax(height, initial=0))
+    for h in range(1, max_height + 1):
+        nodes = np.where(height[n_leaves:] == h)[0]
+        a = children[nodes, 0]
+        b = children[nodes, 1]
+        n_below[nodes + n_leaves] = n_below[a] + n_below[b]
+        na = all_n[a].astype(leaf_cols.dtype)[:, None]
+        nb = all_n[b].astype(leaf_cols.dtype)[:, None]
+        all_n[nodes + n_leaves] = all_n[a] + all_n[b]
+        all_col[nodes + n_leaves] = np.divide((all_col[a] * na) + (all_col[b] * nb), na + nb)
+
+    # The left to right position of every node, given by the number of leaves left of it.
+    # Splitting a cluster replaces it by its children in place, hence every layer is sorted by this position.
+    position = np.zeros(shape=n_nodes, dtype=np.int64)
+    for h in range(max_height, 0, -1):
+        nodes = np.where(height[n_leaves:] == h)[0]
+        a = children[nodes, 0]
+        b = children[nodes, 1]
+        position[a] = position[nodes + n_leaves]
+        position[b] = position[nodes + n_leaves] + n_below[a]
+
+    parent = np.full(shape=n_nodes, fill_value=n_nodes, dtype=np.int64)
+    parent[children[:, 0]] = np.arange(n_leaves, n_nodes)
+    parent[children[:, 1]] = np.arange(n_leaves, n_nodes)
+
+    # After step i the nodes root - i + 1 ... root have been split
+    n_steps = min(n_merge_steps, Z.shape[0])
+    merge_dists = list(Z[::-1, 2][:n_steps])
+
+    steps = np.arange(n_steps + 1)
+    steps = steps[(steps <= 10) | (steps % n_merge_per_lvl == 0)]
+    by_position = np.argsort(position, kind="stable")
+
+    layers = []
+    nodes = []
+    for i in steps:
+        t = root - i + 1
+        in_layer = by_position[(by_position < t) & (parent[by_position] >= t)]
+        nodes.append(in_layer)
+        layers.append(np.full(shape=in_layer.shape[0], fill_value=i, dtype=np.int64))
+    nodes = np.concatenate(nodes)
+    layers = np.concatenate(layers)
+
+    cols = all_col[nodes].astype(np.float32)
+    ns = all_n[nodes].astype(np.uint16)
 
     cols = np.round(cv2.cvtColor(np.array([cols, cols], dtype=np.float32), cv2.COLOR_LAB2BGR)[0] * 255).astype(np.uint8)
     result = [layers, cols, ns]
     return result, merge_dists
 
 
-
 def color_palette(frame, mask = None, mask_index = None, n_merge_steps = 100, image_size = 400.0, seeds_model = None,
                   n_pixels = 200, out_path = "", n_merge_per_lvl = 10, plot = False, mask_inverse = False, normalization_lower_bound = 100.0,
                   seeds_input_width = 600):
@@ -168,7 +286,6 @@ def color_palette(frame, mask = None, mask_index = None, n_merge_steps = 100, im
     else:
         bins = np.unique(labels)
 
-    data = []
     # region SEEDS
     hist = np.histogram(labels, bins = bins)
 
@@ -176,29 +293,21 @@ def color_palette(frame, mask = None, mask_index = None, n_merge_steps = 100, im
     normalization_f = np.amin(hist[0])
     if normalization_f < normalization_lower_bound:
         normalization_f = normalization_lower_bound
-    labels_list = []
-    colors_list = []
-
-    all_cols = []
-    all_labels = []
 
-    # print("Normalization Factor: ", normalization_f)
-    for i, bin in enumerate(hist[0]):
-        if bin < normalization_f:
-            continue
-        lbl = hist[1][i]
-        avg_color = np.mean(frame_bgr[np.where(labels == lbl)], axis=0)
-        labels_list.append(lbl)
-        colors_list.append(avg_color)
+    # The average color of every superpixel, computed in one pass over the frame
+    indices, means, counts = label_means(frame_bgr, labels)
+    mean_of_label = np.zeros(shape=(256, 3), dtype=np.float32)
+    mean_of_label[indices] = means
 
-        data.extend([avg_color] * int(np.round(bin / normalization_f))*2)
-        all_cols.extend([avg_color] * int(np.round(bin / normalization_f)) * 2)
-        all_labels.extend([lbl] * int(np.round(bin / normalization_f)) * 2)
+    # Every superpixel is weighted by its normalized size instead of being repeated in the data
+    keep = hist[0] >= normalization_f
+    all_labels = hist[1][:-1][keep].astype(np.int64)
+    all_cols = list(mean_of_label[all_labels])
+    all_weights = (np.round(hist[0][keep] / normalization_f).astype(np.int64) * 2)
 
-    data = np.array(data)
-    Z = linkage(data, 'ward')
+    Z = weighted_ward_linkage(np.array(all_cols), all_weights)
 
-    tree, merge_dists = to_cluster_tree(Z, all_labels, all_cols, n_merge_steps, n_merge_per_lvl)
+    tree, merge_dists = to_cluster_tree(Z, all_labels.tolist(), all_cols, n_merge_steps, n_merge_per_lvl, weights=all_weights)
     return PaletteAsset(tree, merge_dists)
 
 
@@ -1,19 +1,156 @@
 from core.container.project import VIANProject
 from core.analysis.colorimetry.computation import calculate_histogram
 from core.data.computation import frame2ms, ms_to_frames, lab_to_sat
-from core.analysis.spacial_frequency import get_spacial_frequency_heatmap
+from core.analysis.spacial_frequency import get_spacial_frequency_maps
 from core.analysis.color.palette_extraction import *
 import cv2
+import time
+import multiprocessing
 import numpy as np
-from collections import namedtuple
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor, wait
 from PyQt5.QtCore import pyqtSlot, QObject
 
 from core.analysis.misc import preprocess_frame
+from core.data.frame_source import FrameSource
 
 YieldedResult = namedtuple("YieldedResult", ["frame_pos", "time_ms", "hist", "avg_color", "palette"])
 
+def create_colorimetry_model(frame, margins, max_width, palette_input_width = 300):
+    """
+    Creates the SEEDS model used by color_palette() for all frames of the movie,
+    the model only depends on the shape of the frame.
+    """
+    if margins is not None:
+        frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
+    frame = preprocess_frame(frame, max_width)
+    frame_lab = cv2.cvtColor(frame.astype(np.uint8), cv2.COLOR_BGR2Lab)
+    if palette_input_width < frame.shape[0]:
+        rx = palette_input_width / frame.shape[0]
+        frame_lab_input = cv2.resize(frame_lab, None, None, rx, rx, cv2.INTER_CUBIC)
+    else:
+        frame_lab_input = frame
+    return PaletteExtractorModel(frame_lab_input, n_pixels=400, num_levels=8)
+
+
+def compute_colorimetry_sample(frame, margins, max_width, n_pixels, model, palette_input_width = 300, profile = False):
+    """
+    Computes histogram, palette, color features and spatial frequencies of a single frame.
+
+    :param frame: the BGR frame as read from the movie
+    :param margins: the letterbox rect or None
+    :param max_width: the processing width
+    :param n_pixels: the number of pixels the histogram is normalized by
+    :param model: a PaletteExtractorModel as returned by create_colorimetry_model()
+    :return: a dict as stored by HDF5Manager.dump_colorimetry(), without frame_pos and time_ms
+    """
+    # Get sub frame if there are any margins
+    if margins is not None:
+        frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
+
+    frame = preprocess_frame(frame, max_width)
+
+    t = time.time()
+
+    # Colorspace Conversion
+    frame_lab = cv2.cvtColor(frame.astype(np.uint8), cv2.COLOR_BGR2Lab)
+    t_read = time.time() - t
+    t = time.time()
+
+    # Histogram
+    hist = np.divide(calculate_histogram(frame_lab, 16), n_pixels)
+    t_hist = time.time() - t
+    t = time.time()
+
+    palette = color_palette(frame_lab, n_merge_steps=200, n_merge_per_lvl=20, image_size=150.0, n_pixels=400,
+                            seeds_input_width=palette_input_width, seeds_model=model)
+    t_palette = time.time() - t
+    t = time.time()
+
+    # Color Features
+    frame_lab = cv2.cvtColor(frame.astype(np.float32) / 255, cv2.COLOR_BGR2Lab)
+    color_bgr = np.mean(frame, axis = (0, 1))
+    color_lab = np.mean(frame_lab, axis = (0, 1))
+
+    feature_mat = np.zeros(shape=8)
+    feature_mat[0:3] = color_lab
+    feature_mat[3:6] = color_bgr
+    feature_mat[6] = lab_to_sat(lab=color_lab, implementation="luebbe")
+    feature_mat[7] = lab_to_sat(lab=color_lab, implementation="pythagoras")
+
+    t_features = time.time() - t
+    t = time.time()
+
+    # Spatial
+    rx = 250 / frame.shape[0]
+    frame = cv2.resize(frame, None, None, rx, rx, cv2.INTER_CUBIC)
+    spatial = get_spacial_frequency_maps(frame, normalize=False, raw_only=True)
+    edenorm = spatial["edge-mean"][1]
+    cdenorm = spatial["color-var"][1]
+    hdenorm = spatial["hue-var"][1]
+    ldenorm = spatial["luminance-var"][1]
+
+    t_spatial = time.time() - t
+
+    # Only the rows of the palette are stored, see HDF5Manager.dump_colorimetry()
+    max_p_length = 1000
+    count = min(max_p_length, max(len(palette.merge_dists), len(palette.tree[0])))
+    palette_mat = np.zeros(shape=(count, 6))
+    palette_mat[:min(count, len(palette.merge_dists)), 0] = palette.merge_dists[:count]
+    palette_mat[:count, 1] = palette.tree[0][:count]
+    palette_mat[:count, 2:5] = palette.tree[1][:count]
+    palette_mat[:count, 5] = palette.tree[2][:count]
+
+    if profile:
+        print("Read", round(t_read, 4),
+              "Features", round(t_features, 4),
+              "Histogram:", round(t_hist, 4),
+              "Palette", round(t_palette, 4),
+              "Spatial", round(t_spatial, 4))
+
+    return dict(hist=hist,
+                palette=palette_mat,
+                features=feature_mat,
+                spatial_edge = np.array([np.amax(edenorm), np.mean(edenorm)],dtype=np.float32),
+                spatial_color=np.array([np.amax(cdenorm), np.mean(cdenorm)], dtype=np.float32),
+                spatial_hue = np.array([np.amax(hdenorm), np.mean(hdenorm)], dtype=np.float32),
+                spatial_luminance = np.array([np.amax(ldenorm), np.mean(ldenorm)], dtype=np.float32))
+
+
+# The state of a colorimetry worker process, set by _init_colorimetry_worker()
+_worker_state = None
+
+
+def _init_colorimetry_worker(movie_path, margins, max_width):
+    global _worker_state
+    source = FrameSource(movie_path)
+    _worker_state = dict(
+        source=source,
+        margins=margins,
+        max_width=max_width,
+        n_pixels=int(source.get(cv2.CAP_PROP_FRAME_WIDTH)) * int(source.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        model=None
+    )
+
+
+def _compute_colorimetry_chunk(frame_positions):
+    """
+    Computes all samples of a chunk within a worker process, returns a list of (frame_pos, result).
+    """
+    state = _worker_state
+    result = []
+    for frame_pos, frame in state['source'].read_frames(frame_positions):
+        if state['model'] is None:
+            state['model'] = create_colorimetry_model(frame, state['margins'], state['max_width'])
+        sample = compute_colorimetry_sample(frame, state['margins'], state['max_width'],
+                                            state['n_pixels'], state['model'])
+        sample['frame_pos'] = frame_pos
+        result.append((frame_pos, sample))
+    return result
+
+
 class ColormetryJob2(QObject):
-    def __init__(self, resolution, main_window, max_width=1920):
+    def __init__(self, resolution, main_window, max_width=1920, n_processes=1, chunk_size=16):
         super(ColormetryJob2, self).__init__()
         self.resolution = resolution
         self.colormetry_analysis = None
@@ -23,6 +160,10 @@ class ColormetryJob2(QObject):
         self.aborted = False
         self.max_width = max_width
 
+        # If more than one process is given, the movie is split into chunks of chunk_size samples
+        self.n_processes = n_processes
+        self.chunk_size = chunk_size
+
     def prepare(self, project:VIANProject):
         if project.colormetry_analysis is None:
             self.colormetry_analysis = project.create_colormetry(resolution=self.resolution)
@@ -32,7 +173,8 @@ class ColormetryJob2(QObject):
             self.colormetry_analysis = project.colormetry_analysis
             self.resolution = self.colormetry_analysis.resolution
             start = self.colormetry_analysis.current_idx
-            if start == 0:
+            if start == 0 or not self.colormetry_analysis.matches_movie(project.movie_descriptor.get_fingerprint_key()):
+                start = 0
                 self.colormetry_analysis = project.create_colormetry(resolution=self.resolution)
                 self.colormetry_analysis.clear()
 
@@ -57,119 +199,80 @@ class ColormetryJob2(QObject):
 
         start *= resolution
         length = np.clip(int(end - start), 1, None)
+        frame_positions = range(start, start + length, resolution)
+
+        if self.n_processes > 1:
+            return self.run_parallel(movie_path, frame_positions, end, fps, margins, callback)
+
+        with FrameSource(movie_path) as source:
+            width = int(source.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(source.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+            model = None
+            for frame_pos, frame in source.read_frames(frame_positions, aborted=lambda: self.aborted):
+                t_total = time.time()
+                if model is None:
+                    model = create_colorimetry_model(frame, margins, self.max_width)
+
+                yielded_result = compute_colorimetry_sample(frame, margins, self.max_width, width * height,
+                                                            model, profile=self.profile)
+                if self.aborted:
+                    return
+
+                yielded_result['frame_pos'] = frame_pos
+                yielded_result['time_ms'] = frame2ms(frame_pos, fps)
+                callback.emit([yielded_result, frame_pos / end])
+
+                if self.profile:
+                    print("Total", round(time.time() - t_total, 4))
+
+    def run_parallel(self, movie_path, frame_positions, end, fps, margins, callback):
+        """
+        Splits the frame positions into chunks of self.chunk_size samples and computes them
+        in self.n_processes worker processes, each with its own FrameSource and PaletteExtractorModel.
+        The results are emitted in index order, since ColormetryAnalysis.append_data()
+        writes them into consecutive slots.
+        """
+        chunks = [frame_positions[i:i + self.chunk_size] for i in range(0, len(frame_positions), self.chunk_size)]
+        if len(chunks) == 0:
+            return
+
+        # Spawn instead of fork, the parent holds Qt threads and an open HDF5 file.
+        executor = ProcessPoolExecutor(max_workers=self.n_processes,
+                                       mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_colorimetry_worker,
+                                       initargs=(movie_path, margins, self.max_width))
+        pending = deque()
+        next_chunk = 0
+        try:
+            while next_chunk < len(chunks) or len(pending) > 0:
+                # Keep a bounded number of chunks in flight, such that results don't pile up
+                while next_chunk < len(chunks) and len(pending) < 2 * self.n_processes:
+                    chunk = list(chunks[next_chunk])
+                    pending.append((chunk, executor.submit(_compute_colorimetry_chunk, chunk)))
+                    next_chunk += 1
+
+                chunk, future = pending[0]
+                while not future.done():
+                    if self.aborted:
+                        return
+                    wait([future], timeout=0.2)
+                pending.popleft()
+
+                chunk_result = future.result()
+                for frame_pos, yielded_result in chunk_result:
+                    if self.aborted:
+                        return
+                    yielded_result['time_ms'] = frame2ms(frame_pos, fps)
+                    callback.emit([yielded_result, frame_pos / end])
 
-        video_capture = cv2.VideoCapture(movie_path)
-        video_capture.set(cv2.CAP_PROP_POS_FRAMES, start)
-
-        width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        progress_counter = 0
-        hist_counter = 0
-        model = None
-
-        for i in range(length):
-            if i % resolution == 0:
-                video_capture.set(cv2.CAP_PROP_POS_FRAMES, i + start)
-                ret, frame = video_capture.read()
-            else:
-                continue
-
-            if frame is None:
-                break
-
-            # Get sub frame if there are any margins
-            if margins is not None:
-                frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
-                # cv2.imshow("", frame)
-                # cv2.waitKey(5)
-
-            frame = preprocess_frame(frame, self.max_width)
-
-            t = time.time()
-            t_total = time.time()
-
-            # Colorspace Conversion
-            frame_lab = cv2.cvtColor(frame.astype(np.uint8), cv2.COLOR_BGR2Lab)
-            palette_input_width = 300
-            if model is None:
-                if palette_input_width < frame.shape[0]:
-                    rx = palette_input_width / frame.shape[0]
-                    frame_lab_input = cv2.resize(frame_lab, None, None, rx, rx, cv2.INTER_CUBIC)
-                else:
-                    frame_lab_input = frame
-                model = PaletteExtractorModel(frame_lab_input, n_pixels=400, num_levels=8)
-            t_read = time.time() - t
-            t = time.time()
-            # Histogram
-            hist = np.divide(calculate_histogram(frame_lab, 16), (width * height))
-            t_hist = time.time() - t
-            t = time.time()
-            # hist = None
-            palette = color_palette(frame_lab, n_merge_steps=200, n_merge_per_lvl=20, image_size=150.0, n_pixels=400,
-                                    seeds_input_width=palette_input_width, seeds_model=model)
-            t_palette = time.time() - t
-            t = time.time()
-            # palette = None
-
-            # Color Features
-            frame_lab = cv2.cvtColor(frame.astype(np.float32) / 255, cv2.COLOR_BGR2Lab)
-            color_bgr = np.mean(frame, axis = (0, 1))
-            color_lab = np.mean(frame_lab, axis = (0, 1))
-
-            feature_mat = np.zeros(shape=8)
-            feature_mat[0:3] = color_lab
-            feature_mat[3:6] = color_bgr
-            feature_mat[6] = lab_to_sat(lab=color_lab, implementation="luebbe")
-            feature_mat[7] = lab_to_sat(lab=color_lab, implementation="pythagoras")
-
-            t_features = time.time() - t
-            t = time.time()
-            # Spatial
-            rx = 250 / frame.shape[0]
-            frame = cv2.resize(frame, None, None, rx, rx, cv2.INTER_CUBIC)
-            eout, enorm, edenorm = get_spacial_frequency_heatmap(frame, method="edge-mean", normalize=False)
-            cout, cnorm, cdenorm = get_spacial_frequency_heatmap(frame, method="color-var", normalize=False)
-            hout, hnorm, hdenorm = get_spacial_frequency_heatmap(frame, method="hue-var", normalize=False)
-            lout, lnorm, ldenorm = get_spacial_frequency_heatmap(frame, method="luminance-var", normalize=False)
-
-            t_spatial = time.time() - t
-            t = time.time()
-            if self.aborted:
-                return
-
-            max_p_length = 1000
-            palette_mat = np.zeros(shape=(max_p_length, 6))
-            count = max_p_length
-            if len(palette.tree[0]) < max_p_length:
-                count = len(palette.tree[0])
-            palette_mat[:len(palette.merge_dists), 0] = palette.merge_dists
-            palette_mat[:count, 1] = palette.tree[0][:count]
-            palette_mat[:count, 2:5] = palette.tree[1][:count]
-            palette_mat[:count, 5] = palette.tree[2][:count]
-
-            yielded_result = dict(frame_pos=i + start,
-                                  time_ms=frame2ms(i + start, fps),
-                                  hist=hist,
-                                  palette=palette_mat,
-                                  features=feature_mat,
-                                  spatial_edge = np.array([np.amax(edenorm), np.mean(edenorm)],dtype=np.float32),
-                                  spatial_color=np.array([np.amax(cdenorm), np.mean(cdenorm)], dtype=np.float32),
-                                  spatial_hue = np.array([np.amax(hdenorm), np.mean(hdenorm)], dtype=np.float32),
-                                  spatial_luminance = np.array([np.amax(ldenorm), np.mean(ldenorm)], dtype=np.float32))
-            callback.emit([yielded_result, (i + start) / end])
-
-            t_store = time.time() -t
-            if self.profile:
-                print("Total", round(time.time() - t_total, 4),
-                      "Read", round(t_read, 4),
-                      "Features", round(t_features, 4),
-                      "Histogram:", round(t_hist, 4),
-                      "Palette" ,round(t_palette, 4),
-                      "Spatial", round(t_spatial, 4),
-                      "Store", round(t_store, 4))
-            hist_counter += 1
-            progress_counter += 1
+                # The chunk stopped early, the end of the movie has been reached
+                if len(chunk_result) < len(chunk):
+                    return
+        finally:
+            for chunk, future in pending:
+                future.cancel()
+            executor.shutdown(wait=not self.aborted)
 
     @pyqtSlot(object)
     def colormetry_callback(self, yielded_result):
@@ -14,6 +14,39 @@ import cv2
 import numpy as np
 
 
+def get_histogram_ranges(range_min = 0, range_max = 255, lab_mode = False):
+    """
+    Returns the ranges of the three channels as they are passed to cv2.calcHist
+    """
+    if lab_mode:
+        return [0, 100, -128, 128, -128, 128]
+    return [range_min, range_max, range_min, range_max, range_min, range_max]
+
+
+def calculate_histograms(image_stack, n_bins = 16, range_min = 0, range_max = 255, lab_mode = False):
+    """
+    Calculates the 3d histogram of each image of a stack.
+
+    The stack is cast to uint8 once, as calculate_histogram() does it, and the images are
+    passed to cv2.calcHist without reshaping them.
+
+    :param image_stack: a numpy array of images with the shape (n_images, image_height, image_width, 3)
+    :param n_bins: the number of bins created in each axis
+    :param range_min: the lowest value to include
+    :param range_max: the upper bound of the range, which is excluded
+    :param lab_mode: if True, the ranges of the Lab channels are used
+    :return: a numpy array with the shape (n_images, n_bins, n_bins, n_bins)
+    """
+    if image_stack.dtype != np.uint8:
+        image_stack = image_stack.astype(np.uint8)
+    ranges = get_histogram_ranges(range_min, range_max, lab_mode)
+
+    hists = np.zeros(shape=(image_stack.shape[0], n_bins, n_bins, n_bins), dtype=np.uint64)
+    for i in range(image_stack.shape[0]):
+        hists[i] = cv2.calcHist([image_stack[i]], [0, 1, 2], None, [n_bins, n_bins, n_bins], ranges)
+    return hists
+
+
 def calculate_histogram(image_stack, n_bins = 16, range_min = 0, range_max = 255, lab_mode = False):
     """
     Calculates the 3d histogram of a stack of images
@@ -25,24 +58,12 @@ def calculate_histogram(image_stack, n_bins = 16, range_min = 0, range_max = 255
     :return: a numpy array with 3 dimensions 
     
     """
-    if len(image_stack.shape) > 2:
-        # Reshaping to a a linear array of colors
-        if not len(image_stack.shape) == 4:
-            data = np.resize(image_stack, (image_stack.shape[0] * image_stack.shape[1], 3)).astype(np.uint8)
-        else:
-            data = np.resize(image_stack, (image_stack.shape[0] * image_stack.shape[1] * image_stack.shape[2], 3)).astype(np.uint8)
-    else:
-        data = image_stack
+    if len(image_stack.shape) == 3:
+        return calculate_histograms(image_stack[np.newaxis], n_bins, range_min, range_max, lab_mode)[0]
+    elif len(image_stack.shape) == 4:
+        return np.sum(calculate_histograms(image_stack, n_bins, range_min, range_max, lab_mode), axis=0, dtype=np.uint64)
+
     # Calculating the Histogram
-    if lab_mode:
-        hist = cv2.calcHist([data[:, 0], data[:, 1], data[:, 2]], [0, 1, 2], None,
-                            [n_bins, n_bins, n_bins],
-                            [0, 100, -128, 128,
-                             -128, 128])
-    else:
-        hist = cv2.calcHist([data[:, 0], data[:, 1], data[:, 2]], [0, 1, 2], None,
-                            [n_bins, n_bins, n_bins],
-                            [range_min, range_max, range_min, range_max,
-                             range_min, range_max])
+    hist = cv2.calcHist([image_stack[:, 0], image_stack[:, 1], image_stack[:, 2]], [0, 1, 2], None,
+                        [n_bins, n_bins, n_bins], get_histogram_ranges(range_min, range_max, lab_mode))
     return hist.astype(np.uint64)
-
@@ -3,6 +3,8 @@ import os
 import cv2
 import enum
 import numpy as np
+
+from core.data.log import log_warning
 # from bokeh import colors
 
 
@@ -22,6 +24,212 @@ class HilbertMode(enum.Enum):
     Indices_Non_Zero = 4
 
 
+# Bump if the layout of the cached tables changes, older caches are rebuilt
+HILBERT_CACHE_VERSION = 1
+HILBERT_CACHE_DIR = "data/"
+
+
+def _frame_tables_3d():
+    """
+    Derives the curve of hilbert_traversal_3d() as a finite state machine.
+    A frame is the triple of direction vectors (d1, d2, d3) of a sub cube, for every frame and child k
+    the tables hold the octant the k-th child occupies and the frame of that child.
+
+    :return: child_octant (n_frames, 8, 3), octant_to_child (n_frames, 8), child_frame (n_frames, 8)
+    """
+    def children(d1, d2, d3):
+        # Origin offsets and frames of the eight children, in the order of hilbert_traversal_3d()
+        return [
+            (0 * d1,           (d2, d3, d1)),
+            (d1,               (d3, d1, d2)),
+            (d1 + d2,          (d3, d1, d2)),
+            (d2,               (-d1, -d2, d3)),
+            (d2 + d3,          (-d1, -d2, d3)),
+            (d1 + d2 + d3,     (-d3, d1, -d2)),
+            (d1 + d3,          (-d3, d1, -d2)),
+            (d3,               (d2, -d3, -d1)),
+        ]
+
+    start = tuple(map(tuple, np.eye(3, dtype=np.int64)))
+    frames = [start]
+    frame_ids = {start: 0}
+    child_octant = []
+    child_frame = []
+    i = 0
+    while i < len(frames):
+        d = np.array(frames[i])
+        # The sub cube spans [o, o + s), the origin is moved along all negative directions
+        origin = -np.sum(np.clip(d, None, 0), axis=0)
+        octants = []
+        targets = []
+        for offset, frame in children(d[0], d[1], d[2]):
+            octants.append(origin + offset)
+            frame = tuple(map(tuple, frame))
+            if frame not in frame_ids:
+                frame_ids[frame] = len(frames)
+                frames.append(frame)
+            targets.append(frame_ids[frame])
+        child_octant.append(octants)
+        child_frame.append(targets)
+        i += 1
+
+    # At most 24 rotations, such that frame * 8 + k fits into a uint8
+    assert len(frames) * 8 <= 256
+    child_octant = np.array(child_octant, dtype=np.int64)
+    child_frame = np.array(child_frame, dtype=np.int64)
+    codes = child_octant[:, :, 0] * 4 + child_octant[:, :, 1] * 2 + child_octant[:, :, 2]
+    octant_to_child = np.argsort(codes, axis=1)
+    return child_octant, octant_to_child, child_frame
+
+
+def _frame_tables_2d():
+    """
+    Same as _frame_tables_3d() for the curve of hilbert_2d(), a frame is the pair of
+    direction vectors (x, y) of a cell.
+
+    :return: child_quadrant (n_frames, 4, 2), child_frame (n_frames, 4)
+    """
+    def children(dx, dy):
+        # Origins and frames of the four children in the order of hilbert_2d(), at half size
+        return [
+            (0 * dx,            (dy, dx)),
+            (dx,                (dx, dy)),
+            (dx + dy,           (dx, dy)),
+            (dx + 2 * dy,       (-dy, -dx)),
+        ]
+
+    start = ((1, 0), (0, 1))
+    frames = [start]
+    frame_ids = {start: 0}
+    child_quadrant = []
+    child_frame = []
+    i = 0
+    while i < len(frames):
+        d = np.array(frames[i])
+        corner = np.sum(np.clip(2 * d, None, 0), axis=0)
+        quadrants = []
+        targets = []
+        for origin, frame in children(d[0], d[1]):
+            frame_arr = np.array(frame)
+            child_corner = origin + np.sum(np.clip(frame_arr, None, 0), axis=0)
+            quadrants.append(child_corner - corner)
+            frame = tuple(map(tuple, frame_arr))
+            if frame not in frame_ids:
+                frame_ids[frame] = len(frames)
+                frames.append(frame)
+            targets.append(frame_ids[frame])
+        child_quadrant.append(quadrants)
+        child_frame.append(targets)
+        i += 1
+    return np.array(child_quadrant, dtype=np.int64), np.array(child_frame, dtype=np.int64)
+
+
+_TABLES_3D = _frame_tables_3d()
+_TABLES_2D = _frame_tables_2d()
+
+
+def hilbert_index_3d(x, y, z, s):
+    """
+    Returns the position of the given coordinates along the curve of hilbert_traversal_3d().
+
+    :param x, y, z: integer coordinate arrays in [0, s)
+    :param s: cube side length where s is a power of 2
+    :return: the indices as int64 array
+    """
+    child_octant, octant_to_child, child_frame = _TABLES_3D
+    # Flat tables indexed by frame * 8 + octant (or child), such that np.take can be used
+    octant_to_child = octant_to_child.astype(np.uint8).ravel()
+    child_frame = (child_frame * 8).astype(np.uint8).ravel()
+
+    x, y, z = (np.asarray(v, dtype=np.int64) for v in (x, y, z))
+    shape = np.broadcast(x, y, z).shape
+    index = np.zeros(shape=shape, dtype=np.int64)
+    frame = np.zeros(shape=shape, dtype=np.uint8)
+    for level in reversed(range(int(np.log2(s)))):
+        code = (((x >> level) & 1) * 4 + ((y >> level) & 1) * 2 + ((z >> level) & 1)).astype(np.uint8)
+        k = np.take(octant_to_child, frame + code)
+        index <<= 3
+        index += k
+        frame = np.take(child_frame, frame + k)
+    return index
+
+
+def hilbert_coordinates_3d(indices, s):
+    """
+    Returns the coordinates at the given positions along the curve of hilbert_traversal_3d().
+
+    :param indices: integer array of positions in [0, s**3)
+    :param s: cube side length where s is a power of 2
+    :return: the coordinates as int64 array of shape (n, 3)
+    """
+    child_octant, octant_to_child, child_frame = _TABLES_3D
+    indices = np.asarray(indices, dtype=np.int64)
+    coords = np.zeros(shape=indices.shape + (3,), dtype=np.int64)
+    frame = np.zeros(shape=indices.shape, dtype=np.int64)
+    n_levels = int(np.log2(s))
+    for level in reversed(range(n_levels)):
+        k = (indices >> (3 * level)) & 7
+        coords += child_octant[frame, k] << level
+        frame = child_frame[frame, k]
+    return coords
+
+
+def hilbert_coordinates_2d(n, multiplier = 64):
+    """
+    Returns the same points as hilbert_2d(), the cell centers of the 2d curve in traversal order.
+
+    :param n: number of items = 4^(n-1)
+    :param multiplier: the side length of the square
+    :return: float array of shape (4^(n-1), 2)
+    """
+    child_quadrant, child_frame = _TABLES_2D
+    n_levels = max(n - 1, 0)
+    indices = np.arange(4 ** n_levels, dtype=np.int64)
+    cells = np.zeros(shape=indices.shape + (2,), dtype=np.int64)
+    frame = np.zeros(shape=indices.shape, dtype=np.int64)
+    for level in reversed(range(n_levels)):
+        k = (indices >> (2 * level)) & 3
+        cells += child_quadrant[frame, k] << level
+        frame = child_frame[frame, k]
+    return (cells + 0.5) / (2 ** n_levels) * multiplier
+
+
+# Tables already loaded by this process, by cache path
+_LOADED_TABLES = dict()
+
+
+def _load_cached_tables(name, s, build, cache_dir = None):
+    """
+    Loads the tables of the given name and size from the cache directory,
+    builds and stores them if they are missing or have been built by another version.
+    """
+    if cache_dir is None:
+        cache_dir = HILBERT_CACHE_DIR
+    path = os.path.join(cache_dir, "hilbert_" + name + "_" + str(s) + ".npz")
+    if path in _LOADED_TABLES:
+        return _LOADED_TABLES[path]
+
+    tables = None
+    if os.path.isfile(path):
+        try:
+            d = np.load(path)
+            if int(d['version']) == HILBERT_CACHE_VERSION and int(d['s']) == s:
+                tables = {k: d[k] for k in d.files if k not in ("version", "s")}
+        except Exception as e:
+            log_warning("Could not load Hilbert Cache", path, e)
+
+    if tables is None:
+        tables = build(s)
+        try:
+            if os.path.isdir(cache_dir):
+                np.savez(path, version=HILBERT_CACHE_VERSION, s=s, **tables)
+        except Exception as e:
+            log_warning("Could not store Hilbert Cache", path, e)
+
+    _LOADED_TABLES[path] = tables
+    return tables
+
+
 def hilbert_traversal_3d(data, mapped, mode, s, rgb_multiplier = 1, x=0, y=0, z=0, dx=1, dy=0, dz=0, dx2=0, dy2=1, dz2=0, dx3=0, dy3=0, dz3=1):
     """
     
@@ -121,17 +329,25 @@ def hilbert_traversal_3d(data, mapped, mode, s, rgb_multiplier = 1, x=0, y=0, z=
 
 
 def hilbert_mapping_3d(s, v_data, hilbert_mode, multiplier = 1):
-    v_mapped = []
-    hilbert_traversal_3d(v_data, v_mapped, hilbert_mode, s, multiplier)#, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1)
-    return v_mapped
+    coords = hilbert_coordinates_3d(np.arange(s ** 3), s)
+    x, y, z = coords[:, 0], coords[:, 1], coords[:, 2]
+
+    if hilbert_mode == HilbertMode.Values_All:
+        return list(v_data[x, y, z])
+
+    if hilbert_mode == HilbertMode.Values_Non_Zero or hilbert_mode == HilbertMode.Indices_Non_Zero:
+        values = v_data[x, y, z]
+        nz = np.nonzero(values != 0)[0]
+        if hilbert_mode == HilbertMode.Values_Non_Zero:
+            return [(values[i] - 1, int(x[i]), int(y[i]), int(z[i])) for i in nz]
+        coords = coords[nz]
+
+    return (coords * multiplier + (multiplier / 2)).astype(np.int64).tolist()
 
 
 def create_hilbert_color_map(s, rgb_multiplier, colorspace):
-    grad_rgb = []
     grad_bokeh = []
-    # Old Code
-    # hilbert_walk_index(np.ones(shape=(s, s, s)), grad_rgb, s, rgb_multiplier)#, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1)
-    hilbert_traversal_3d(np.ones(shape=(s, s, s)), grad_rgb, HilbertMode.Indices_All, s, rgb_multiplier)  # , 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1)
+    grad_rgb = hilbert_mapping_3d(s, None, HilbertMode.Indices_All, rgb_multiplier)
     cv2.cvtColor(grad_rgb, colorspace)
 
     # for bgr in grad_rgb:
@@ -141,10 +357,7 @@ def create_hilbert_color_map(s, rgb_multiplier, colorspace):
 
 
 def create_hilbert_color_pattern(s = 16, multiplier = 16, color_space = cv2.COLOR_Lab2BGR, filename = "color_pattern", write_to_disc=False):
-    grad_hilbert = []
-    # OLD Code
-    # hilbert_walk_index(np.ones(shape=(s, s, s)), grad_hilbert, s, multiplier)#, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1)
-    hilbert_traversal_3d(np.ones(shape=(s, s, s)), grad_hilbert, HilbertMode.Indices_All, s, multiplier)
+    grad_hilbert = hilbert_mapping_3d(s, None, HilbertMode.Indices_All, multiplier)
 
     grad_source = np.array([grad_hilbert] * 1).astype(dtype=np.uint8)
     grad_in_bgr = cv2.cvtColor(grad_source, color_space)
@@ -163,61 +376,58 @@ def create_hilbert_color_pattern(s = 16, multiplier = 16, color_space = cv2.COLO
 
 
 def create_hilbert_3d_to_2d_coordinates(n):
-    mapping = []
-    hilbert_traversal_2d(mapping, 0, 0, 1, 0, 0, 1, n)
-    return mapping
+    return hilbert_coordinates_2d(n, multiplier=4096).tolist()
+
+
+def _build_conversion_tables(n2, n1 = 13):
+    return dict(hilbert_2d=hilbert_coordinates_2d(n1, multiplier=4096),
+                hilbert_3d=create_hilbert_lookup_table(n2))
 
 
 def create_hilbert_conversion_tables(dir, n1=13, n2=256):
-    if not os.path.exists(dir + str("hilbert_conversion.npz")):
-        indices_hilbert_3d_list = []
-        indices_hilbert_2d_list = []
+    tables = _load_cached_tables("conversion_" + str(n1), n2,
+                                 lambda s: _build_conversion_tables(s, n1), cache_dir=dir)
+    return tables['hilbert_2d'], tables['hilbert_3d']
 
-        hilbert_traversal_2d(indices_hilbert_2d_list, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, n1)
-        # OLD CODe
-        # hilbert_walk_index(np.ones(shape=(n2, n2, n2)), indices_hilbert_3d_list, n2, 1)#, 0, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 1)
-        hilbert_traversal_3d(np.ones(shape=(n2, n2, n2)), indices_hilbert_3d_list, HilbertMode.Indices_All, n2, 1)
-        indices_hilbert_3d = np.zeros(shape=(n2, n2, n2))
-        for index, i in enumerate(indices_hilbert_3d_list):
-            indices_hilbert_3d[i[0], i[1], i[2],] = index
 
-        np.savez(dir + str("hilbert_conversion.npz"), hilbert_2d=indices_hilbert_2d_list, hilbert_3d=indices_hilbert_3d)
+def create_hilbert_lookup_table(s):
+    """
+    Returns a (s, s, s) table holding the position of every cell along the hilbert curve.
+    """
+    r = np.arange(s)
+    lookup = hilbert_index_3d(r[:, None, None], r[None, :, None], r[None, None, :], s)
+    if s ** 3 <= np.iinfo(np.uint16).max + 1:
+        return lookup.astype(np.uint16)
+    return lookup.astype(np.uint32)
 
-    loaded = np.load(dir + str("hilbert_conversion.npz"))
-    return loaded['hilbert_2d'], loaded['hilbert_3d']
 
+def _build_hilbert_transform(s):
+    coords = hilbert_coordinates_3d(np.arange(s ** 3), s)
+    colors = np.array([coords * s, coords * s]).astype(np.uint8)
+    colors = cv2.cvtColor(colors, cv2.COLOR_LAB2RGB)[0]
 
-def create_hilbert_lookup_table(s):
-    mapped = []
-    hilbert_traversal_3d(None, mapped, HilbertMode.Indices_All, s)
-    lookup = np.zeros(shape= (s, s, s), dtype=np.uint16)
-    idx = 0
-    for m in mapped:
-        lookup[m[0], m[1], m[2]] = idx
-        idx += 1
-    return lookup
+    # The table indexes a histogram cube in hilbert order, a list of single element arrays per axis
+    return dict(table=coords.T[:, :, None], colors=colors)
 
 
 def create_hilbert_transform(s):
-    lookup = create_hilbert_lookup_table(s)
-    colors = []
-    a, b, c = [], [], []
-    for i in range(s**3):
-        t = np.where(lookup == i)
-        a.append(t[0])
-        b.append(t[1])
-        c.append(t[2])
-        colors.append([t[0][0] * s, t[1][0] * s, t[2][0] * s])
-    colors = np.array([colors, colors]).astype(np.uint8)
-    colors = cv2.cvtColor(colors, cv2.COLOR_LAB2RGB)[0]
-    return (a,b,c), colors
+    tables = _build_hilbert_transform(s)
+    return (list(tables['table'][0]), list(tables['table'][1]), list(tables['table'][2])), tables['colors']
 
 
-def get_hilbert_lookup():
-    if os.path.isfile("data/hilbert_lookup.npy"):
-        return np.load("data/hilbert_lookup.npy")
-    else:
-         return None
+def get_hilbert_transform(s = 16):
+    """
+    Same as create_hilbert_transform() but cached on disk.
+    """
+    tables = _load_cached_tables("transform", s, _build_hilbert_transform)
+    return (tables['table'][0], tables['table'][1], tables['table'][2]), tables['colors']
+
+
+def get_hilbert_lookup(s = 256):
+    """
+    Returns the lookup table of create_hilbert_lookup_table(), cached on disk.
+    """
+    return _load_cached_tables("lookup", s, lambda s: dict(lookup=create_hilbert_lookup_table(s)))['lookup']
 
 
 def hilbert_traversal_2d(data, mapped, mode, s, multiplier = 4096, x = 0.0, y = 0.0, dx1 = 1.0, dy1 = 0.0, dx2 = 0.0, dy2 = 1.0):
@@ -272,9 +482,7 @@ def convert_hilbert_3d_to_2d(x, y, z, hilbert_conversion_table_2d, hilbert_conve
 
 
 def create_1d_to_2d_projection_table():
-    mapping = []
-    hilbert_traversal_2d(mapping, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0, 7, multiplier=64)
-    return mapping
+    return hilbert_coordinates_2d(7, multiplier=64).tolist()
 
 
 def hilbert_2d(mapping, x0 = 0.0, y0 = 0.0, xi = 1.0, xj = 0.0, yi = 0.0, yj = 1.0, n = 7, multiplier = 64):
@@ -305,6 +513,5 @@ if __name__ == '__main__':
     import datetime
 
     start = datetime.datetime.now()
-    lookup = create_hilbert_lookup_table(256)
-    np.save("hilbert_lookup.npy", lookup)
+    lookup = get_hilbert_lookup(256)
     print(((datetime.datetime.now() - start)).total_seconds())
\ No newline at end of file
@@ -1,6 +1,9 @@
 import cv2
 import os
 import numpy as np
+from heapq import heappush, heappushpop
+from scipy.sparse import coo_matrix
+from sklearn.cluster import ward_tree
 
 from core.data.computation import resize_with_aspect
 
@@ -9,3 +12,98 @@ def preprocess_frame(frame, max_width=1920, mode=cv2.INTER_CUBIC):
     if frame.shape[1] > max_width:
         frame = resize_with_aspect(frame, width=max_width, mode=mode)
     return frame
+
+
+def chain_connectivity(n):
+    """
+    Returns a sparse connectivity matrix which connects each sample to its predecessor and successor,
+    such that only adjacent samples are merged by a clustering.
+
+    :param n: the number of samples
+    :return: a scipy.sparse matrix with the shape (n, n)
+    """
+    rows = np.repeat(np.arange(1, n - 1), 3)
+    cols = rows + np.tile([-1, 0, 1], max(n - 2, 0))
+    return coo_matrix((np.ones(rows.shape[0], dtype=np.uint8), (rows, cols)), shape=(n, n))
+
+
+class MergeTree:
+    """
+    A merge tree as returned by sklearn.cluster.ward_tree, which can be cut at any number of clusters.
+
+    The labels are the same as the ones of AgglomerativeClustering(n_clusters=k, compute_full_tree=True).
+    """
+    def __init__(self, children, n_leaves):
+        self.children = children
+        self.n_leaves = n_leaves
+
+        # Sizes and position of each node in the order of its leaves, such that
+        # the leaves of a node are a slice of that order
+        self.sizes = np.ones(n_leaves + len(children), dtype=np.intp)
+        for i, (a, b) in enumerate(children):
+            self.sizes[n_leaves + i] = self.sizes[a] + self.sizes[b]
+        self.starts = np.zeros(n_leaves + len(children), dtype=np.intp)
+        for i in range(len(children) - 1, -1, -1):
+            a, b = children[i]
+            self.starts[a] = self.starts[n_leaves + i]
+            self.starts[b] = self.starts[n_leaves + i] + self.sizes[a]
+        self.order = np.zeros(n_leaves, dtype=np.intp)
+        self.order[self.starts[:n_leaves]] = np.arange(n_leaves)
+
+    def cut(self, n_clusters):
+        """
+        Returns the labels of the samples for the given number of clusters.
+        """
+        return self.cut_levels([n_clusters])[n_clusters]
+
+    def cut_levels(self, cluster_sizes):
+        """
+        Cuts the tree at several levels at once.
+
+        :param cluster_sizes: the numbers of clusters to cut the tree at
+        :return: a dict mapping each number of clusters to the labels of the samples
+        """
+        result = dict()
+        if len(self.children) == 0:
+            return result
+
+        # The nodes are kept on a negated heap, each further cluster splits the latest merge
+        nodes = [-(max(self.children[-1]) + 1)]
+        for n_clusters in sorted(set(cluster_sizes)):
+            if n_clusters > self.n_leaves:
+                break
+            while len(nodes) < n_clusters:
+                these_children = self.children[-nodes[0] - self.n_leaves]
+                heappush(nodes, -these_children[0])
+                heappushpop(nodes, -these_children[1])
+
+            labels = np.zeros(self.n_leaves, dtype=np.intp)
+            for i, node in enumerate(nodes):
+                labels[self.order[self.starts[-node]:self.starts[-node] + self.sizes[-node]]] = i
+            result[n_clusters] = labels
+        return result
+
+
+def adjacent_ward_tree(X):
+    """
+    Computes the ward merge tree of the samples, only merging adjacent samples.
+
+    :param X: the features with the shape (n_samples, n_features)
+    :return: a MergeTree
+    """
+    children, n_components, n_leaves, parents = ward_tree(X, connectivity=chain_connectivity(X.shape[0]))
+    return MergeTree(children, n_leaves)
+
+
+def cluster_adjacently(X, cluster_sizes):
+    """
+    Clusters the samples with ward linkage, only merging adjacent samples.
+    The merge tree is computed once and cut for each number of clusters.
+
+    :param X: the features with the shape (n_samples, n_features)
+    :param cluster_sizes: the numbers of clusters
+    :return: a dict mapping each number of clusters to the labels of the samples
+    """
+    if len(cluster_sizes) == 0:
+        return dict()
+    return adjacent_ward_tree(X).cut_levels(cluster_sizes)
@@ -17,6 +17,7 @@ from core.visualization.palette_plot import *
 
 import librosa
 from core.analysis.misc import preprocess_frame
+from core.data.frame_source import FrameSource
 
 """
 array Structure: 
@@ -61,41 +62,35 @@ class OpticalFlowAnalysis(IAnalysisJob):
         movie_path = self.movie_path
         margins = self.margins
 
-        cap = cv2.VideoCapture(movie_path)
-        length = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        with FrameSource(movie_path) as source:
+            length = source.get(cv2.CAP_PROP_FRAME_COUNT)
 
-        start = 0
-        stop = int(length)
-        prvs = None
+            start = 0
+            stop = int(length)
+            prvs = None
 
-        magnitudes = np.zeros(shape=int(np.ceil(stop / self.resolution)))
-        idx = 0
-        for i in range(start, stop, self.resolution):
-            sign_progress((i - start) / ((stop - start) + 1))
+            magnitudes = np.zeros(shape=int(np.ceil(stop / self.resolution)))
+            idx = 0
+            for i, frame in source.read_frames(range(start, stop, self.resolution)):
+                sign_progress((i - start) / ((stop - start) + 1))
 
-            cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-            ret, frame = cap.read()
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-            if frame is None:
-                break
+                if margins is not None:
+                    frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
 
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                preprocess_frame(frame, self.max_width)
 
-            if margins is not None:
-                frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
+                if prvs is None:
+                    prvs = frame
 
-            preprocess_frame(frame, self.max_width)
+                flow = cv2.calcOpticalFlowFarneback(prvs, frame, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+                mag, ang = cv2.cartToPolar(flow[..., 0], flow[..., 1])
 
-            if prvs is None:
-                prvs = frame
-
-            flow = cv2.calcOpticalFlowFarneback(prvs, frame, None, 0.5, 3, 15, 3, 5, 1.2, 0)
-            mag, ang = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+                magnitudes[idx] = np.mean(mag)
+                idx += 1
 
-            magnitudes[idx] = np.mean(mag)
-            idx += 1
-
-            prvs = frame
+                prvs = frame
 
         magnitudes[magnitudes == np.inf] = 0
         magnitudes = np.nan_to_num(magnitudes)
@@ -20,6 +20,7 @@ from core.analysis.deep_learning.models import *
 from core.data.interfaces import IAnalysisJob, VisualizationTab, ParameterWidget
 from core.data.enums import DataSerialization
 from core.container.hdf5_manager import vian_analysis
+from core.data.frame_source import FrameSource
 
 # from matplotlib import cm
 # from matplotlib.colors import ListedColormap, LinearSegmentedColormap
@@ -28,6 +29,9 @@ from core.container.hdf5_manager import vian_analysis
 
 @vian_analysis
 class SemanticSegmentationAnalysis(IAnalysisJob):
+    # The model and its graph are loaded once and shared between the tasks
+    thread_only = True
+
     def __init__(self, resolution=30, model_name = "LIP", model = None, graph = None, session = None):
         super(SemanticSegmentationAnalysis, self).__init__("Semantic Segmentation", [SCREENSHOT, SCREENSHOT_GROUP],
                                                            dataset_name="SemanticSegementations",
@@ -87,29 +91,32 @@ class SemanticSegmentationAnalysis(IAnalysisJob):
             else:
                 raise Exception("Model not Found")
 
-            for arg in args:
-                start = arg['start']
-                movie_path = arg['movie_path']
-
-                cap = cv2.VideoCapture(movie_path)
-                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
-                c = start
-
-                sign_progress(counter / tot)
-                counter += 1
-
-                cap.set(cv2.CAP_PROP_POS_FRAMES, c)
-                ret, frame = cap.read()
-                masks = model.forward(frame)
-
-                results.append(SemanticSegmentationAnalysisContainer(
-                    name="Semantic Segmentation",
-                    results=np.argmax(masks, axis=2).astype(np.uint8),
-                    analysis_job_class=self.__class__,
-                    parameters=dict(model = self.model_name, resolution=self.resolution),
-                    container=arg['target'],
-                    dataset=model_name
-                ))
+            source = None
+            try:
+                for arg in args:
+                    start = arg['start']
+                    movie_path = arg['movie_path']
+
+                    if source is None:
+                        source = FrameSource(movie_path)
+
+                    sign_progress(counter / tot)
+                    counter += 1
+
+                    frame = source.read_frame(start)
+                    masks = model.forward(frame)
+
+                    results.append(SemanticSegmentationAnalysisContainer(
+                        name="Semantic Segmentation",
+                        results=np.argmax(masks, axis=2).astype(np.uint8),
+                        analysis_job_class=self.__class__,
+                        parameters=dict(model = self.model_name, resolution=self.resolution),
+                        container=arg['target'],
+                        dataset=model_name
+                    ))
+            finally:
+                if source is not None:
+                    source.release()
 
         sign_progress(1.0)
         return results
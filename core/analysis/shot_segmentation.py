@@ -16,8 +16,9 @@ from core.data.computation import floatify_img, frame2ms
 
 
 import cv2
-from core.analysis.colorimetry.computation import calculate_histogram
-from sklearn.cluster import AgglomerativeClustering
+from core.analysis.colorimetry.computation import calculate_histograms
+from core.data.frame_source import FrameSource
+from core.analysis.misc import cluster_adjacently
 
 MAX_CLUSTER = 500
 MAX_DEPTH = 500
@@ -47,6 +48,7 @@ class ShotSegmentationAnalysis(IAnalysisJob):
         self.return_frames = return_frames
         self.frame_width_clamp = frame_width_clamp
         self.return_hdf5_compatible = return_hdf5_compatible
+        self.histogram_batch_size = 64
 
     def prepare(self, project: VIANProject, targets: List[Segmentation], fps, class_objs=None):
         """
@@ -71,57 +73,58 @@ class ShotSegmentationAnalysis(IAnalysisJob):
         # Signal the Progress
         sign_progress(0.0)
 
-        video_capture = cv2.VideoCapture(args['movie_path'])
-
-        duration = video_capture.get(cv2.CAP_PROP_FRAME_COUNT)
-        resize_f = 192.0 / video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
-        resize_clamp = self.frame_width_clamp / video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
-        width = video_capture.get(cv2.CAP_PROP_FRAME_WIDTH)
-        height = video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT)
-
-        n = int(np.floor(duration / self.resolution))
-        X = np.zeros(shape=(n, 16**3), dtype=np.float16)
-        frame_pos = np.zeros(shape=n, dtype=np.int32)
-
-        frames = []
-        for i in range(int(n)):
-            if self.aborted:
-                return None
-
-            idx = int(i * self.resolution)
-            video_capture.set(cv2.CAP_PROP_POS_FRAMES, idx)
-
-            ret, frame = video_capture.read()
-            if frame is None:
-                continue
-
-            if self.return_frames and i % self.frame_resolution == 0:
-                frames.append(cv2.resize(frame, None, None, resize_f, resize_f, cv2.INTER_CUBIC))
-
-            if resize_clamp < 1.0:
-                frame = cv2.resize(frame, None, None, resize_clamp, resize_clamp, cv2.INTER_CUBIC)
-            frame = cv2.cvtColor(floatify_img(frame), cv2.COLOR_BGR2LAB)
-            X[i] = np.resize(calculate_histogram(frame, lab_mode=True), new_shape=16 ** 3) / (width * height)
-            frame_pos[i] = idx
-            sign_progress(round(i / n, 4))
-
-        connectivity = np.zeros(shape=(n, n), dtype=np.uint8)
-        for i in range(1, n - 1, 1):
-            connectivity[i][i - 1] = 1
-            connectivity[i][i] = 1
-            connectivity[i][i + 1] = 1
+        source = FrameSource(args['movie_path'])
+
+        try:
+            duration = source.get(cv2.CAP_PROP_FRAME_COUNT)
+            resize_f = 192.0 / source.get(cv2.CAP_PROP_FRAME_WIDTH)
+            resize_clamp = self.frame_width_clamp / source.get(cv2.CAP_PROP_FRAME_WIDTH)
+            width = source.get(cv2.CAP_PROP_FRAME_WIDTH)
+            height = source.get(cv2.CAP_PROP_FRAME_HEIGHT)
+            fps = source.get(cv2.CAP_PROP_FPS)
+
+            n = int(np.floor(duration / self.resolution))
+            X = np.zeros(shape=(n, 16**3), dtype=np.float16)
+            frame_pos = np.zeros(shape=n, dtype=np.int32)
+
+            frames = []
+            batch = None
+            batch_indices = []
+            for idx, frame in source.read_frames(range(0, n * self.resolution, self.resolution)):
+                if self.aborted:
+                    return None
+
+                i = idx // self.resolution
+                if self.return_frames and i % self.frame_resolution == 0:
+                    frames.append(cv2.resize(frame, None, None, resize_f, resize_f, cv2.INTER_CUBIC))
+
+                if resize_clamp < 1.0:
+                    frame = cv2.resize(frame, None, None, resize_clamp, resize_clamp, cv2.INTER_CUBIC)
+                frame = cv2.cvtColor(floatify_img(frame), cv2.COLOR_BGR2LAB)
+
+                # The histograms are computed for a whole batch of frames at once
+                if batch is None:
+                    batch = np.zeros(shape=(self.histogram_batch_size,) + frame.shape, dtype=np.uint8)
+                np.copyto(batch[len(batch_indices)], frame, casting="unsafe")
+                batch_indices.append(i)
+                if len(batch_indices) == self.histogram_batch_size:
+                    self._add_histograms(X, batch, batch_indices, width * height)
+                frame_pos[i] = idx
+                sign_progress(round(i / n, 4))
+        finally:
+            source.release()
+        if len(batch_indices) > 0:
+            self._add_histograms(X, batch, batch_indices, width * height)
+
         clusterings = []
 
-        cluster_sizes = range(self.cluster_range[0], self.cluster_range[1], 1)
+        # The merge tree is computed once and cut at each level
+        cluster_sizes = [k for k in range(self.cluster_range[0], self.cluster_range[1], 1) if X.shape[0] > k]
+        labels = cluster_adjacently(X, cluster_sizes)
         for i, n_cluster in enumerate(cluster_sizes):
             sign_progress(i / len(cluster_sizes))
-            if X.shape[0] > n_cluster:
-                model = AgglomerativeClustering(linkage="ward",
-                                                connectivity=connectivity,
-                                                n_clusters=n_cluster, compute_full_tree=True)
-                model.fit(X)
-                timestamps = self._generate_segments(model.labels_, frame_pos, video_capture.get(cv2.CAP_PROP_FPS))
-                clusterings.append(timestamps)
+            timestamps = self._generate_segments(labels[n_cluster], frame_pos, fps)
+            clusterings.append(timestamps)
 
         if self.return_hdf5_compatible:
             result = np.zeros(shape=self.dataset_shape, dtype=self.dataset_dtype)
@@ -138,6 +141,19 @@ class ShotSegmentationAnalysis(IAnalysisJob):
         sign_progress(1.0)
         return analysis
 
+    def _add_histograms(self, X, batch, batch_indices, n_pixels):
+        """
+        Computes the histograms of the frames collected in batch and writes them to X at batch_indices.
+
+        :param X: the feature matrix with one flattened histogram per row
+        :param batch: the uint8 Lab frames, the first len(batch_indices) are used
+        :param batch_indices: the rows of X the frames belong to, it is emptied afterwards
+        :param n_pixels: the number of pixels the histograms are divided by
+        """
+        hists = calculate_histograms(batch[:len(batch_indices)], lab_mode=True)
+        X[batch_indices] = np.reshape(hists, (len(batch_indices), 16 ** 3)) / n_pixels
+        batch_indices.clear()
+
     def _generate_segments(self, clustering, timestamps, fps):
         result_dict = []
         current_lbl = -1
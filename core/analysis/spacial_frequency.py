@@ -45,77 +45,131 @@ def get_heatmap_rgb(img, to_blend = None):
         return result
 
 
-def get_spacial_frequency_heatmap(input_img, blur = False, x2=20, x3=20, method = "edge-mean", normalize = True, norm_factor = None):
-    # input_img = cv2.resize(input_img, None, None, 0.5,0.5, cv2.INTER_CUBIC)
+SPACIAL_FREQUENCY_METHODS = ["edge-mean", "color-var", "hue-var", "luminance-var"]
+
+
+def get_spacial_frequency_maps(input_img, methods = None, blur = False, x2=20, x3=20,
+                               normalize = True, norm_factors = None, raw_only = False):
+    """
+    Computes the spatial frequency maps of all given methods at once.
+    The Lab conversion is done once for all methods, the float Lab and LCh only if hue-var is requested,
+    and the local means and variances of all channels are filtered together.
+
+    :param input_img: the BGR image
+    :param methods: a list of SPACIAL_FREQUENCY_METHODS, all if None
+    :param normalize: if the maps should be divided by their norm factor
+    :param norm_factors: a dict method -> norm factor, the maximum of the raw map is used if not given
+    :param raw_only: if True, only the raw maps are computed and the normalized maps are None
+    :return: a dict method -> (normalized map, raw map)
+    """
+    if methods is None:
+        methods = SPACIAL_FREQUENCY_METHODS
+    if norm_factors is None:
+        norm_factors = dict()
+
     lab = cv2.cvtColor(input_img, cv2.COLOR_BGR2LAB)
-    if method == "edge-mean":
+
+    # Stack all channels whose local variance is needed and filter them in one pass
+    channels = []
+    if "color-var" in methods:
+        channels.extend([lab[:, :, 1], lab[:, :, 2]])
+    if "luminance-var" in methods:
+        channels.append(lab[:, :, 0])
+    if "hue-var" in methods:
+        lab_f = cv2.cvtColor(input_img.astype(np.float32) / 255, cv2.COLOR_BGR2LAB)
+        channels.append(img_lab_to_lch(lab_f)[:, :, 1])
+
+    variances = []
+    if len(channels) > 0:
+        stacked = np.dstack(channels).astype(np.float32)
+        kernel = cv2.getGaussianKernel(20, 20)
+        wmean = cv2.filter2D(stacked, -1, kernel, borderType=cv2.BORDER_REFLECT)
+        wsqrmean = cv2.filter2D(stacked * stacked, -1, kernel, borderType=cv2.BORDER_REFLECT)
+        if len(wmean.shape) == 2:
+            wmean = np.reshape(wmean, newshape=wmean.shape + (1,))
+            wsqrmean = np.reshape(wsqrmean, newshape=wsqrmean.shape + (1,))
+        variances = wsqrmean - wmean ** 2
+
+    raws = dict()
+    c = 0
+    if "color-var" in methods:
+        raws["color-var"] = np.sum(variances[:, :, c:c + 2], axis=2) / 255 ** 2
+        c += 2
+    if "luminance-var" in methods:
+        raws["luminance-var"] = np.sum(variances[:, :, c:c + 1], axis=2) / 255 ** 2
+        c += 1
+    if "hue-var" in methods:
+        raws["hue-var"] = np.sum(variances[:, :, c:c + 1], axis=2) / 255 ** 2
+    if "edge-mean" in methods:
         edges = cv2.Canny(lab, x2, x3).astype(np.float32)
         edges = np.clip(cv2.GaussianBlur(edges, (1, 1), 0), 0, 1.0)
-        edge_mean = neighborhood_mean_cv(edges, 20)
-        raw = edge_mean
-        if normalize:
-            if norm_factor is None:
-                norm_factor = np.amax(edge_mean)
-            result = edge_mean / norm_factor
+        raws["edge-mean"] = neighborhood_mean_cv(edges, 20)
+
+    result = dict()
+    for method in methods:
+        raw = raws[method]
+        if raw_only:
+            result[method] = (None, raw)
+            continue
+
+        norm_factor = norm_factors.get(method, None)
+        if normalize and norm_factor is None:
+            norm_factor = np.amax(raw)
+
+        if method == "edge-mean":
+            if normalize:
+                m = raw / norm_factor
+            else:
+                m = raw.copy()
+            if blur:
+                m *= 255
+                m = cv2.fastNlMeansDenoising((m * 255).astype(np.uint8), h = 10)
+                m = cv2.blur(m.astype(np.float32) / 255, (12, 12))
+                m = np.clip(m, 0, 1.0)
+
+        elif method == "hue-var":
+            m = raw.copy()
+            if normalize:
+                m = m / norm_factor
+            m = m / np.amax(m)
+            hcut = np.percentile(m, 95)
+            m = m / hcut
+            m[np.where(m > 0.95)] = np.mean(m)
+            m = cv2.blur(m, (12, 12))
+
+        elif method == "color-var":
+            m = raw.copy()
+            if normalize:
+                m = m / norm_factor
+            hcut = np.percentile(m, 95)
+            m[np.where(m > 0.95)] = np.mean(m)
+            m = cv2.blur(m, (12, 12))
+            m = m / hcut
+
         else:
-            result = raw.copy()
+            m = raw.copy()
+            if normalize:
+                m = m / norm_factor
+            hcut = np.percentile(m, 95)
+            m = m / hcut
+            m[np.where(m > 0.95)] = np.mean(m)
+            m = cv2.blur(m, (12, 12))
+
+        result[method] = (m, raw)
+    return result
 
-        if blur:
-            result *= 255
-            result = cv2.fastNlMeansDenoising((result * 255).astype(np.uint8), h = 10)
-            result = cv2.blur(result.astype(np.float32) / 255, (12, 12))
-            result = np.clip(result, 0, 1.0)
 
-        color_img, heatm = get_heatmap_rgb(result, input_img)
-        result *= 255
-        return color_img, result.astype(np.uint8), raw
-    elif method == "color-var":
-        col_var = neighborhood_var_cv(lab.astype(np.float32), 20, channels=(1, 2))
-        raw = col_var.copy()
-        if normalize:
-            if norm_factor is None:
-                norm_factor = np.amax(col_var)
-            col_var = col_var / norm_factor
-        hcut = np.percentile(col_var, 95)
-        col_var[np.where(col_var > 0.95)] = np.mean(col_var)
-        col_var = cv2.blur(col_var, (12, 12))
-        col_var = col_var / hcut
-        color_img, heatm = get_heatmap_rgb(col_var, input_img)
-        return color_img, col_var, raw
-
-    elif method == "hue-var":
-        lab = cv2.cvtColor(input_img.astype(np.float32) / 255, cv2.COLOR_BGR2LAB)
-        lch = img_lab_to_lch(lab)
-        hue_var = neighborhood_var_cv(lch.astype(np.float32), 20, channels=(1))
-        raw = hue_var.copy()
-        if normalize:
-            if norm_factor is None:
-                norm_factor = np.amax(hue_var)
-            hue_var = hue_var / norm_factor
-        hue_var = hue_var / np.amax(hue_var)
-        hcut = np.percentile(hue_var, 95)
-        hue_var = hue_var / hcut
-        hue_var[np.where(hue_var > 0.95)] = np.mean(hue_var)
-        hue_var = cv2.blur(hue_var, (12, 12))
-        color_img, heatm = get_heatmap_rgb(hue_var, input_img)
-        return color_img, hue_var, raw
-
-    elif method == "luminance-var":
-        lum_var = neighborhood_var_cv(lab.astype(np.float32), 20, channels=(0))
-        raw = lum_var.copy()
-        if normalize:
-            if norm_factor is None:
-                norm_factor = np.amax(lum_var)
-            lum_var = lum_var / norm_factor
-        hcut = np.percentile(lum_var, 95)
-        lum_var = lum_var / hcut
-        lum_var[np.where(lum_var > 0.95)] = np.mean(lum_var)
-        lum_var = cv2.blur(lum_var, (12, 12))
-        color_img, heatm = get_heatmap_rgb(lum_var, input_img)
-        return color_img, lum_var, raw
-    else:
+def get_spacial_frequency_heatmap(input_img, blur = False, x2=20, x3=20, method = "edge-mean", normalize = True, norm_factor = None):
+    if method not in SPACIAL_FREQUENCY_METHODS:
         return input_img, np.zeros_like(input_img), np.zeros_like(input_img)
 
+    m, raw = get_spacial_frequency_maps(input_img, [method], blur=blur, x2=x2, x3=x3,
+                                        normalize=normalize, norm_factors={method: norm_factor})[method]
+    color_img, heatm = get_heatmap_rgb(m, input_img)
+    if method == "edge-mean":
+        return color_img, (m * 255).astype(np.uint8), raw
+    return color_img, m, raw
+
 
 def convolve_segmentation(values, segmentation):
     for t in np.unique(segmentation).tolist():
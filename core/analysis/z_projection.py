@@ -13,6 +13,7 @@ from PyQt5.QtWidgets import *
 from core.visualization.basic_vis import HistogramVis
 from core.data.interfaces import IAnalysisJob, ParameterWidget, VisualizationTab
 from core.container.hdf5_manager import vian_analysis
+from core.data.frame_source import FrameSource
 
 @vian_analysis
 class ZProjectionAnalysis(IAnalysisJob):
@@ -69,42 +70,31 @@ class ZProjectionAnalysis(IAnalysisJob):
         margins = args["margins"]
         semseg = args["semseg"]
 
-        cap = cv2.VideoCapture(movie_path)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
-        r, frame = cap.read()
-        if margins is not None:
-            frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
-        c = start
-        z_projection = np.zeros(shape=frame.shape, dtype = np.float32)
-
-        bin_mask = None
-        if semseg is not None:
-            name, labels = self.target_class_obj.semantic_segmentation_labels
-            mask = semseg.get_adata()
-            bin_mask = labels_to_binary_mask(mask, labels)
-
-        n = 0
-        while c < stop + self.resolution:
-            if c % self.resolution != 0:
-                c += 1
-                continue
-            sign_progress((c - start) / ((stop - start) + 1))
-
-            cap.set(cv2.CAP_PROP_POS_FRAMES, c)
-            ret, frame = cap.read()
-
-            if frame is None:
-                break
-
-            # Get sub frame if there are any margins
+        with FrameSource(movie_path) as source:
+            frame = source.read_frame(start)
             if margins is not None:
                 frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
-
-            # frame = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
-            # z_projection += floatify_img(frame)
-            z_projection += frame
-            c += 1
-            n += 1
+            z_projection = np.zeros(shape=frame.shape, dtype = np.float32)
+
+            bin_mask = None
+            if semseg is not None:
+                name, labels = self.target_class_obj.semantic_segmentation_labels
+                mask = semseg.get_adata()
+                bin_mask = labels_to_binary_mask(mask, labels)
+
+            n = 0
+            frame_indices = [c for c in range(start, stop + self.resolution) if c % self.resolution == 0]
+            for c, frame in source.read_frames(frame_indices):
+                sign_progress((c - start) / ((stop - start) + 1))
+
+                # Get sub frame if there are any margins
+                if margins is not None:
+                    frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
+
+                # frame = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
+                # z_projection += floatify_img(frame)
+                z_projection += frame
+                n += 1
 
         z_projection = np.divide(z_projection, n)
         z_projection -= np.amin(z_projection)
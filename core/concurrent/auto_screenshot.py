@@ -6,7 +6,9 @@ from core.analysis.informative import select_rows
 from core.data.computation import ms_to_frames
 from core.container.project import *
 from core.concurrent.auto_segmentation import ApplySegmentationWindow
-from core.analysis.colorimetry.computation import calculate_histogram
+from core.analysis.colorimetry.computation import calculate_histograms
+
+HISTOGRAM_BATCH_SIZE = 32
 
 
 def auto_screenshot(project:VIANProject, method, distribution, n, segmentation, hdf5_manager, sign_progress):
@@ -51,6 +53,7 @@ def auto_screenshot(project:VIANProject, method, distribution, n, segmentation,
             n_hists = int(np.ceil((idx_end - idx_start) / res))
             hists = np.zeros(shape=(n_hists, 16,16,16))
             frame_indices = []
+            batch, batch_indices = [], []
             for h_idx, i in enumerate(range(idx_start, idx_end, res)):
                 cap.set(cv2.CAP_PROP_POS_FRAMES, i)
                 ret, frame = cap.read()
@@ -60,7 +63,13 @@ def auto_screenshot(project:VIANProject, method, distribution, n, segmentation,
 
                 frame_indices.append(i)
                 frame_lab = cv2.cvtColor(frame.astype(np.float32) / 255, cv2.COLOR_BGR2Lab)
-                hists[h_idx] = np.divide(calculate_histogram(frame_lab, 16), (width * height))
+                batch.append(frame_lab.astype(np.uint8))
+                batch_indices.append(h_idx)
+                if len(batch) == HISTOGRAM_BATCH_SIZE:
+                    hists[batch_indices] = np.divide(calculate_histograms(np.stack(batch), 16), (width * height))
+                    batch, batch_indices = [], []
+            if len(batch) > 0:
+                hists[batch_indices] = np.divide(calculate_histograms(np.stack(batch), 16), (width * height))
 
             hists = np.reshape(hists, newshape=(hists.shape[0], hists.shape[1]* hists.shape[2] * hists.shape[3]))
             hists /= np.sqrt(np.sum(hists ** 2, axis=1, keepdims=True))
@@ -1,4 +1,3 @@
-from sklearn.cluster import AgglomerativeClustering
 import numpy as np
 
 from core.gui.ewidgetbase import *
@@ -6,7 +5,8 @@ from PyQt5.QtCore import QRect, Qt
 from core.data.interfaces import IConcurrentJob
 from core.data.enums import *
 from core.container.project import VIANProject
-from core.analysis.misc import preprocess_frame
+from core.analysis.misc import preprocess_frame, adjacent_ward_tree
+from core.analysis.colorimetry.computation import get_histogram_ranges
 from core.data.computation import frame2ms, floatify_img, ms_to_frames
 
 from core.gui.misc.utils import dialog_with_margin
@@ -16,17 +16,7 @@ AUTO_SEGM_CHIST = 1
 
 
 def cluster_histograms_adjacently(x, n_clusters = 2):
-    connectivity = np.zeros(shape=(x.shape[0], x.shape[0]), dtype=np.uint8)
-    for i in range(1, x.shape[0] - 1, 1):
-        connectivity[i][i - 1] = 1
-        connectivity[i][i] = 1
-        connectivity[i][i + 1] = 1
-
-    model = AgglomerativeClustering(linkage="ward",
-                                    connectivity=connectivity,
-                                    n_clusters=n_clusters, compute_full_tree=True)
-    model.fit(x)
-    return model.labels_
+    return adjacent_ward_tree(x).cut(n_clusters)
 
 
 def auto_segmentation(project:VIANProject, mode, main_window, n_segment = -1, segm_width = 10000, nth_frame = 4, n_cluster_lb =1, n_cluster_hb = 100, resolution=30):
@@ -136,7 +126,6 @@ class AutoSegmentingJobHistogram(IConcurrentJob):
         frame_resolution = args[5]
         n_cluster_range = args[6]
         alt_resolution = args[7]
-        cluster_sizes = range(n_cluster_range[0], n_cluster_range[1] + 1, 1)
         histograms = []
         frames = []
 
@@ -159,61 +148,37 @@ class AutoSegmentingJobHistogram(IConcurrentJob):
                     pos=i)
                 )
 
-        data_idx = 0
-        read_img = -1 # We only want to read every second image
         if indices is None:
             indices = []
             resolution = alt_resolution
-        for i in range(int(length)):
-            if self.aborted:
-                return None
-            if i % resolution == 0:
-                read_img += 1
-                if in_hists is not None and data_idx >= len(in_hists):
-                    break
+
+        if in_hists is not None:
+            # The stored colorimetry histograms are read as one slice
+            n_rows = int(np.clip(len(range(0, int(length), resolution)), None, len(in_hists)))
+            histograms = np.reshape(in_hists[:n_rows], (n_rows, 16 ** 3))
+        else:
+            for i in range(0, int(length), resolution):
+                if self.aborted:
+                    return None
 
                 sign_progress(i / length)
-                if in_hists is not None:
-                    histograms.append(np.resize(in_hists[data_idx], new_shape=16 ** 3))
-                else:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-                    ret, frame = cap.read()
-                    if frame is None:
-                        break
-
-                    frame = preprocess_frame(frame, self.max_width)
-                    frame = cv2.cvtColor(floatify_img(frame), cv2.COLOR_BGR2LAB)
-                    data = np.resize(frame, (frame.shape[0] * frame.shape[1], 3))
-                    hist = cv2.calcHist([data[:, 0], data[:, 1], data[:, 2]], [0, 1, 2], None,
-                                        [16, 16, 16],
-                                        [0, 100, -128, 128,
-                                         -128, 128])
-                    indices.append(i)
-                    histograms.append(np.resize(hist, new_shape=16 ** 3))
-                data_idx += 1
-
-        connectivity = np.zeros(shape=(len(histograms), len(histograms)), dtype=np.uint8)
-        for i in range(1, len(histograms) - 1, 1):
-            connectivity[i][i - 1] = 1
-            connectivity[i][i] = 1
-            connectivity[i][i + 1] = 1
-
-        clusterings = []
-        for i, n_cluster in enumerate(cluster_sizes):
-            sign_progress(i / len(cluster_sizes))
-
-            if len(histograms) > n_cluster:
-                model = AgglomerativeClustering(linkage="ward",
-                                                connectivity=connectivity,
-                                                n_clusters=n_cluster, compute_full_tree=True)
-                model.fit(histograms)
-                clusterings.append(model.labels_)
-
-        frames_total = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-        pcounter, p_max = 0, len(np.unique(clusterings[0])) * 30
+                cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+                ret, frame = cap.read()
+                if frame is None:
+                    break
+
+                frame = preprocess_frame(frame, self.max_width)
+                frame = cv2.cvtColor(floatify_img(frame), cv2.COLOR_BGR2LAB)
+                hist = cv2.calcHist([frame], [0, 1, 2], None, [16, 16, 16], get_histogram_ranges(lab_mode=True))
+                indices.append(i)
+                histograms.append(np.reshape(hist, 16 ** 3))
+
+        # The merge tree is computed once, ApplySegmentationWindow cuts it at the selected number of clusters
+        sign_progress(1.0)
+        tree = adjacent_ward_tree(np.array(histograms))
 
         cap.release()
-        return dict(clusterings=clusterings, frames=frames, indices=indices, fps=fps, frame_resolution=frame_resolution, cluster_range=n_cluster_range)
+        return dict(tree=tree, frames=frames, indices=indices, fps=fps, frame_resolution=frame_resolution, cluster_range=n_cluster_range)
 
     def modify_project(self, project, result, sign_progress=None, main_window = None):
         if result is not None:
@@ -235,7 +200,6 @@ class AutoSegmentingJobAudio(IConcurrentJob):
         frame_resolution = args[5]
         n_cluster_range = args[6]
         alt_resolution = args[7]
-        cluster_sizes = range(n_cluster_range[0], n_cluster_range[1], 1)
         histograms = []
         frames = []
 
@@ -257,60 +221,36 @@ class AutoSegmentingJobAudio(IConcurrentJob):
                 pos=i)
             )
 
-        data_idx = 0
-        read_img = -1 # We only want to read every second image
         if indices is None:
             indices = []
             resolution = alt_resolution
-        for i in range(int(length)):
-            if self.aborted:
-                return None
-            if i % resolution == 0:
-                read_img += 1
-                if in_hists is not None and data_idx >= len(in_hists):
-                    break
+
+        if in_hists is not None:
+            # The stored colorimetry histograms are read as one slice
+            n_rows = int(np.clip(len(range(0, int(length), resolution)), None, len(in_hists)))
+            histograms = np.reshape(in_hists[:n_rows], (n_rows, 16 ** 3))
+        else:
+            for i in range(0, int(length), resolution):
+                if self.aborted:
+                    return None
 
                 sign_progress(i / length)
-                if in_hists is not None:
-                    histograms.append(np.resize(in_hists[data_idx], new_shape=16 ** 3))
-                else:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, i)
-                    ret, frame = cap.read()
-                    if frame is None:
-                        break
-
-                    frame = cv2.cvtColor(floatify_img(frame), cv2.COLOR_BGR2LAB)
-                    data = np.resize(frame, (frame.shape[0] * frame.shape[1], 3))
-                    hist = cv2.calcHist([data[:, 0], data[:, 1], data[:, 2]], [0, 1, 2], None,
-                                        [16, 16, 16],
-                                        [0, 100, -128, 128,
-                                         -128, 128])
-                    indices.append(i)
-                    histograms.append(np.resize(hist, new_shape=16 ** 3))
-                data_idx += 1
-
-        connectivity = np.zeros(shape=(len(histograms), len(histograms)), dtype=np.uint8)
-        for i in range(1, len(histograms) - 1, 1):
-            connectivity[i][i - 1] = 1
-            connectivity[i][i] = 1
-            connectivity[i][i + 1] = 1
-
-        clusterings = []
-        for i, n_cluster in enumerate(cluster_sizes):
-            sign_progress(i / len(cluster_sizes))
-
-            if len(histograms) > n_cluster:
-                model = AgglomerativeClustering(linkage="ward",
-                                                connectivity=connectivity,
-                                                n_clusters=n_cluster, compute_full_tree=True)
-                model.fit(histograms)
-                clusterings.append(model.labels_)
-
-        frames_total = cap.get(cv2.CAP_PROP_FRAME_COUNT)
-        pcounter, p_max = 0, len(np.unique(clusterings[0])) * 30
+                cap.set(cv2.CAP_PROP_POS_FRAMES, i)
+                ret, frame = cap.read()
+                if frame is None:
+                    break
+
+                frame = cv2.cvtColor(floatify_img(frame), cv2.COLOR_BGR2LAB)
+                hist = cv2.calcHist([frame], [0, 1, 2], None, [16, 16, 16], get_histogram_ranges(lab_mode=True))
+                indices.append(i)
+                histograms.append(np.reshape(hist, 16 ** 3))
+
+        # The merge tree is computed once, ApplySegmentationWindow cuts it at the selected number of clusters
+        sign_progress(1.0)
+        tree = adjacent_ward_tree(np.array(histograms))
 
         cap.release()
-        return dict(clusterings=clusterings, frames=frames, indices=indices, fps=fps, frame_resolution=frame_resolution, cluster_range=n_cluster_range)
+        return dict(tree=tree, frames=frames, indices=indices, fps=fps, frame_resolution=frame_resolution, cluster_range=n_cluster_range)
 
     def modify_project(self, project, result, sign_progress=None, main_window = None):
         if result is not None:
@@ -322,12 +262,15 @@ class AutoSegmentingJobAudio(IConcurrentJob):
 
 
 class ApplySegmentationWindow(QMainWindow):
-    def __init__(self, parent, clusterings, frames, indices, fps, frame_resolution, cluster_range):
+    def __init__(self, parent, tree, frames, indices, fps, frame_resolution, cluster_range):
+        """
+        :param tree: the MergeTree of the histograms, it is cut at the number of clusters selected by the slider
+        """
         super(ApplySegmentationWindow, self).__init__(parent)
         self.setWindowTitle("Apply Segmentation")
         self.setWindowFlags(Qt.Tool)
         self.project = parent.project
-        self.clusterings = clusterings
+        self.tree = tree
         self.frames = frames
         self.indices = indices
         self.fps = fps
@@ -339,7 +282,7 @@ class ApplySegmentationWindow(QMainWindow):
         self.view = EGraphicsView(self.w)
 
         self.slider = QSlider(Qt.Horizontal)
-        self.slider.setRange(cluster_range[0], np.clip(cluster_range[1] + 1, None, len(self.clusterings) + cluster_range[0]) - 1)
+        self.slider.setRange(cluster_range[0], np.clip(cluster_range[1], None, self.tree.n_leaves - 1))
         self.slider.valueChanged.connect(self.on_slider_changed)
 
         self.w_slider = QWidget(self)
@@ -375,12 +318,11 @@ class ApplySegmentationWindow(QMainWindow):
 
     def on_slider_changed(self):
         self.lbl_n_cluster.setText(str(self.slider.value()))
-        index = int(self.slider.value()) - self.cluster_range[0]
 
         segments = []
         curr_lbl = -1
         indices = []
-        for idx, lbl in enumerate(self.clusterings[index]):
+        for idx, lbl in enumerate(self.tree.cut(int(self.slider.value()))):
             if curr_lbl != lbl:
                 if len(indices) > 0:
                     start_index = self.indices[indices[0]]
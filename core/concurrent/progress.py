@@ -0,0 +1,161 @@
+"""
+Rate limited progress reporting for the workers.
+
+Analyses signal their progress once per frame. Turning every call into a cross-thread Qt signal
+which repaints the ConcurrentTaskDock costs a measurable share of the runtime of fast jobs.
+A TaskProgress therefore only becomes due to be sent if a minimal time has passed and the value
+has changed by a minimal delta since it has been sent last. The ProgressChannel collects the progress
+of all tasks, e.g. of parallel worker processes, and sends the due ones together in one batch.
+
+Besides the fraction, every report contains the throughput in frames per second, if the number
+of frames of the task is known, and the estimated remaining time in seconds.
+"""
+
+import time
+from threading import Lock
+
+# The minimal time in seconds between two reports of a task
+MIN_INTERVAL = 0.1
+
+# The minimal change of the progress between two reports of a task
+MIN_DELTA = 0.005
+
+
+class TaskProgress:
+    def __init__(self, n_items = None, clock = time.monotonic):
+        """
+        :param n_items: the number of frames the task processes, if known
+        :param clock: a function returning the current time in seconds
+        """
+        self.n_items = n_items
+        self.clock = clock
+        self.start_time = None
+        self.value = 0.0
+        self.sent_value = None
+        self.sent_time = None
+
+    def set(self, value):
+        # The timing starts with the first progress signal, tasks may wait in a queue before
+        if self.start_time is None:
+            self.start_time = self.clock()
+        self.value = float(value)
+
+    def is_due(self, min_interval = MIN_INTERVAL, min_delta = MIN_DELTA):
+        """
+        Returns True if the current value should be sent, the first and the final value are always due.
+        """
+        if self.sent_value is None:
+            return True
+        if self.value >= 1.0 > self.sent_value:
+            return True
+        return self.clock() - self.sent_time >= min_interval and abs(self.value - self.sent_value) >= min_delta
+
+    def mark_sent(self):
+        self.sent_value = self.value
+        self.sent_time = self.clock()
+
+    def items_per_second(self):
+        """
+        Returns the number of processed frames per second or None if unknown.
+        """
+        if self.n_items is None or self.start_time is None or self.clock() <= self.start_time:
+            return None
+        elapsed = self.clock() - self.start_time
+        return self.value * self.n_items / elapsed
+
+    def eta(self):
+        """
+        Returns the estimated remaining time in seconds or None if unknown.
+        """
+        if self.value <= 0 or self.start_time is None:
+            return None
+        return (self.clock() - self.start_time) * (1.0 - min(self.value, 1.0)) / self.value
+
+    def report(self):
+        """
+        Returns the tuple (fraction, frames per second, remaining seconds).
+        """
+        return self.value, self.items_per_second(), self.eta()
+
+
+class ProgressChannel:
+    """
+    Collects the progress of several tasks and sends the due reports together.
+
+    *Example*:
+
+    channel = ProgressChannel(lambda reports: signals.sign_progress_batch.emit(reports))
+    channel.add_task(task_id, n_items=1000)
+    channel.update(task_id, 0.5)
+    """
+    def __init__(self, send, min_interval = MIN_INTERVAL, min_delta = MIN_DELTA, clock = time.monotonic):
+        """
+        :param send: a function called with a dict task_id: (fraction, frames per second, remaining seconds)
+        :param min_interval: the minimal time in seconds between two reports of a task
+        :param min_delta: the minimal change of the progress between two reports of a task
+        :param clock: a function returning the current time in seconds
+        """
+        self.send = send
+        self.min_interval = min_interval
+        self.min_delta = min_delta
+        self.clock = clock
+        self.tasks = dict()
+        self._changed = set()
+        self._last_check = None
+        self.lock = Lock()
+
+    def add_task(self, task_id, n_items = None):
+        with self.lock:
+            self.tasks[task_id] = TaskProgress(n_items, self.clock)
+
+    def remove_task(self, task_id):
+        with self.lock:
+            self.tasks.pop(task_id, None)
+            self._changed.discard(task_id)
+
+    def update(self, task_id, value):
+        """
+        Sets the progress of a task, the reports of all due tasks are sent at most every min_interval seconds.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                task = self.tasks[task_id] = TaskProgress(None, self.clock)
+            task.set(value)
+            self._changed.add(task_id)
+
+            now = self.clock()
+            if task.value < 1.0 and self._last_check is not None and now - self._last_check < self.min_interval:
+                return
+            self._last_check = now
+            reports = self._collect(lambda t: t.is_due(self.min_interval, self.min_delta))
+        if len(reports) > 0:
+            self.send(reports)
+
+    def flush(self):
+        """
+        Sends the current progress of all tasks which have changed since they have been sent last.
+        """
+        with self.lock:
+            reports = self._collect(lambda t: t.value != t.sent_value)
+        if len(reports) > 0:
+            self.send(reports)
+
+    def _collect(self, is_due):
+        reports = dict()
+        for task_id in list(self._changed):
+            task = self.tasks[task_id]
+            if is_due(task):
+                reports[task_id] = task.report()
+                task.mark_sent()
+                self._changed.discard(task_id)
+        return reports
+
+    def total(self):
+        """
+        Returns the mean progress of all tasks.
+        """
+        with self.lock:
+            if len(self.tasks) == 0:
+                return 0.0
+            return sum(t.value for t in self.tasks.values()) / len(self.tasks)
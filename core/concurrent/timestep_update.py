@@ -3,7 +3,7 @@ import cv2
 from PyQt5.QtGui import QPainter, QPainterPath, QColor
 from typing import Dict
 from core.data.computation import *
-from core.analysis.spacial_frequency import get_spacial_frequency_heatmap, get_spacial_frequency_heatmap2
+from core.analysis.spacial_frequency import get_spacial_frequency_maps, get_heatmap_rgb, get_spacial_frequency_heatmap2
 from core.container.project import VIANProject, IAnalysisJobAnalysis
 from core.data.interfaces import SpatialOverlayDataset
 
@@ -128,6 +128,7 @@ class TimestepUpdateWorkerSingle(QObject):
 
         self.overlay_frame_width = settings.OVERLAY_RESOLUTION_WIDTH
         self.overlay_colormap = cm.get_cmap(settings.OVERLAY_VISUALIZATION_COLORMAP)
+        self.use_proxy_frames = settings.USE_PROXY_FRAMES
 
         self.movie_path = ""
         self.video_capture = None
@@ -170,7 +171,7 @@ class TimestepUpdateWorkerSingle(QObject):
         self.spatial_datasets = dict()
 
         self.project.onAnalysisAdded.connect(self.on_analysis_added)
-        for a in project.analysis:
+        for a in project.get_loaded_analyses():
             self.on_analysis_added(a)
 
     @pyqtSlot(object)
@@ -188,6 +189,7 @@ class TimestepUpdateWorkerSingle(QObject):
     def on_settings_changed(self, settings):
         self.overlay_frame_width = settings.OVERLAY_RESOLUTION_WIDTH
         self.overlay_colormap = cm.get_cmap(settings.OVERLAY_VISUALIZATION_COLORMAP)
+        self.use_proxy_frames = settings.USE_PROXY_FRAMES
         self.run()
 
     @pyqtSlot(str)
@@ -247,13 +249,21 @@ class TimestepUpdateWorkerSingle(QObject):
     def get_opencv_frame(self, time_frame):
         """
         Returns the exact frame of the current visualization.
+        If proxy frames are enabled and available, the closest proxy frame is used instead.
         
         :param time_frame:
         :return:
         """
         if self.video_capture is not None:
-            self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, time_frame)
-            ret, frame = self.video_capture.read()
+            frame = None
+            if self.use_proxy_frames:
+                proxy_cache = self.project.get_proxy_cache()
+                if proxy_cache is not None:
+                    frame = proxy_cache.get_padded_frame(time_frame)
+
+            if frame is None:
+                self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, time_frame)
+                ret, frame = self.video_capture.read()
             if frame is None:
                 return None
 
@@ -280,8 +290,9 @@ class TimestepUpdateWorkerSingle(QObject):
                         f = self.project.hdf5_manager.get_colorimetry_spatial_max()['luminance']
                 if f == 0.0:
                     f = None
-                heatmap, mask, denorm = get_spacial_frequency_heatmap(frame, method=self.spacial_frequency_method, normalize=True, norm_factor=f)
-                frame = heatmap
+                method = self.spacial_frequency_method
+                maps = get_spacial_frequency_maps(frame, [method], normalize=True, norm_factors={method: f})
+                frame, heatm = get_heatmap_rgb(maps[method][0], frame)
 
             if self.current_spatial_dataset is not None:
                 frame = self.current_spatial_dataset.get_overlay(frame2ms(time_frame, self.fps), frame, fx, self.overlay_colormap)
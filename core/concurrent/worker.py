@@ -2,10 +2,18 @@ from PyQt5.QtCore import QRunnable, QObject, Qt, QThread
 from PyQt5.QtCore import pyqtSignal, pyqtSlot
 from random import randint
 import traceback, sys
+import pickle
+import multiprocessing
+from queue import Empty
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 import cv2
-from core.data.log import log_info, log_error
+from core.data.log import log_info, log_warning, log_error
 from core.data.computation import numpy_to_pixmap, generate_id
 from core.data.interfaces import IProjectChangeNotify
+from core.concurrent.progress import TaskProgress, ProgressChannel
+from core.container.analysis_cache import AnalysisResultCache
 
 
 class WorkerSignals(QObject):
@@ -14,11 +22,12 @@ class WorkerSignals(QObject):
     sign_result = pyqtSignal(object)
     sign_progress = pyqtSignal(tuple)
     sign_aborted = pyqtSignal(int)
-    sign_task_manager_progress = pyqtSignal(int, float)
+    sign_task_manager_progress = pyqtSignal(object)
     sign_create_progress_bar = pyqtSignal(int, str, object, object)
     sign_remove_progress_bar = pyqtSignal(int)
     analysisStarted = pyqtSignal()
     analysisEnded = pyqtSignal()
+    analysisFinished = pyqtSignal()
 
 
 class Worker(QRunnable):
@@ -33,6 +42,7 @@ class Worker(QRunnable):
         self.setAutoDelete(True)
         self.task_id = randint(100000, 999999)
         self.target_id = target_id
+        self.progress = TaskProgress()
 
         self.signals = WorkerSignals()
         self.signals.sign_progress.connect(main_window.worker_progress,Qt.AutoConnection)
@@ -72,7 +82,10 @@ class Worker(QRunnable):
             self.signals.sign_finished.emit((self.task_id, self.message_finished))  # Done
 
     def on_progress(self, float_value):
-        self.signals.sign_progress.emit((self.task_id, float_value))
+        self.progress.set(float_value)
+        if self.progress.is_due():
+            self.progress.mark_sent()
+            self.signals.sign_progress.emit((self.task_id,) + self.progress.report())
 
 
 class MinimalWorkerSignals(QObject):
@@ -116,8 +129,42 @@ class MinimalThreadWorker(QRunnable):
         self.aborted = True
 
 
+def split_merged_args(args, n):
+    """
+    Splits the targets of a merged_decoding analysis into n tasks of neighbouring targets,
+    each task decodes the union of the frames of its targets.
+
+    :param args: the list of arguments as returned by IAnalysisJob.prepare()
+    :param n: the number of tasks
+    :return: a list of lists of arguments
+    """
+    if not isinstance(args, list) or len(args) < 2:
+        return [args]
+    args = sorted(args, key=lambda a: a['start'])
+    n = min(n, len(args))
+    bounds = [round(i * len(args) / n) for i in range(n + 1)]
+    return [args[bounds[i]:bounds[i + 1]] for i in range(n)]
+
+
+def count_frames(analysis, args):
+    """
+    Returns the number of frames a task decodes, or None if it isn't known.
+
+    :param analysis: the IAnalysisJob
+    :param args: the arguments of the task, a target or a list of targets as packed in IAnalysisJob.prepare()
+    """
+    frames = set()
+    try:
+        for a in (args if isinstance(args, list) else [args]):
+            frames.update(analysis.get_frame_indices(a))
+    except (AttributeError, KeyError, TypeError):
+        return None
+    return len(frames)
+
+
 class WorkerManager(QObject, IProjectChangeNotify):
     onPushTask = pyqtSignal(object, object)
+    onPushTasks = pyqtSignal(object, object, int)
     onStartWorker = pyqtSignal()
 
     def __init__(self, main_window):
@@ -128,6 +175,12 @@ class WorkerManager(QObject, IProjectChangeNotify):
         self.queue_identify = []
         self.running = None
 
+        # Cache keys of the targets of the running analysis which have to be computed
+        self.cache_keys = dict()
+        self.result_cache = None
+        if self.main_window.settings.USE_ANALYSIS_CACHE:
+            self.result_cache = AnalysisResultCache(self.main_window.settings.DIR_CACHE)
+
         self.worker = AnalysisWorker(self)
         self.execution_thread = QThread()
         self.execution_thread.exit()
@@ -135,11 +188,12 @@ class WorkerManager(QObject, IProjectChangeNotify):
         self.execution_thread.start()
 
         self.onPushTask.connect(self.worker.push_task)
+        self.onPushTasks.connect(self.worker.push_tasks)
         self.onStartWorker.connect(self.worker.run_worker)
 
         self.worker.signals.sign_create_progress_bar.connect(self.main_window.concurrent_task_viewer.add_task)
         self.worker.signals.sign_remove_progress_bar.connect(self.main_window.concurrent_task_viewer.remove_task)
-        self.worker.signals.sign_task_manager_progress.connect(self.main_window.concurrent_task_viewer.update_progress)
+        self.worker.signals.sign_task_manager_progress.connect(self.main_window.concurrent_task_viewer.update_progress_batch)
         self.worker.signals.analysisStarted.connect(self.main_window.pipeline_toolbar.progress_widget.on_start_analysis)
         self.worker.signals.analysisEnded.connect(self.main_window.pipeline_toolbar.progress_widget.on_stop_analysis)
 
@@ -163,18 +217,40 @@ class WorkerManager(QObject, IProjectChangeNotify):
             self.queue_identify.pop(0)
             self.running = analysis
             args = analysis.prepare(*params)
-            if analysis.multiple_result:
-                for arg in args:
-                    self.onPushTask.emit(analysis, arg)
+
+            # Targets which have been computed before with the same inputs are taken from the cache
+            self.cache_keys = dict()
+            if self.result_cache is not None:
+                hits, args, self.cache_keys = self.result_cache.split(analysis, args,
+                                                                      self.project.movie_descriptor.get_fingerprint_key(),
+                                                                      params[3])
+                if len(hits) > 0:
+                    log_info("Analysis Cache:", len(hits), "Results of", analysis.name, "restored")
+                    self.on_worker_result({-1: (analysis, hits)})
+                if args is None:
+                    self.on_worker_finished()
+                    return
+
+            # With several processes, merged decoding is split such that each process decodes a part of the targets
+            n_processes = self.main_window.settings.ANALYSIS_PROCESSES
+            if analysis.multiple_result and not analysis.merged_decoding:
+                tasks = list(args)
+            elif analysis.merged_decoding and n_processes > 1 and not analysis.thread_only:
+                tasks = split_merged_args(args, n_processes)
             else:
-                self.onPushTask.emit(analysis, args)
+                tasks = [args]
+            self.onPushTasks.emit(analysis, tasks, n_processes)
             # self.onStartWorker.emit()
         else:
             self.running = None
 
     @pyqtSlot(object)
-    def on_worker_finished(self, finished_tasks):
+    def on_worker_result(self, finished_tasks):
+        """
+        Adds the results of finished tasks to the project, called for each task as soon as it is done.
+        """
         for task_id, (analysis, result) in finished_tasks.items():
+            self.cache_result(analysis, result)
             try:
                 if isinstance(result, list):
                     for r in result:
@@ -191,6 +267,26 @@ class WorkerManager(QObject, IProjectChangeNotify):
                 raise e
                 print("Exception in AnalysisWorker.analysis_result", str(e))
 
+    def cache_result(self, analysis, result):
+        """
+        Stores computed results in the analysis cache, has to be called before they are added to the project.
+        """
+        if self.result_cache is None:
+            return
+        for r in (result if isinstance(result, list) else [result]):
+            if r is None:
+                continue
+            key = self.cache_keys.pop(r.target_container, None)
+            if key is not None:
+                self.result_cache.put(key, analysis, r)
+
+    @pyqtSlot()
+    def on_worker_finished(self):
+        """
+        Called once all scheduled tasks are done, starts the next analysis in the queue.
+        """
+        if self.project.hdf5_manager is not None:
+            self.project.hdf5_manager.flush()
         self.project.dispatch_changed(item=self.project)
         self._start()
 
@@ -217,6 +313,151 @@ class WorkerManager(QObject, IProjectChangeNotify):
         self.worker.abort()
 
 
+# The state of an analysis worker process, set by _init_analysis_worker()
+_worker_state = None
+
+
+def _init_analysis_worker(progress_queue, abort_event):
+    global _worker_state
+    _worker_state = dict(progress_queue=progress_queue, abort_event=abort_event)
+
+
+def _uses_semseg(args):
+    """
+    Returns True if the arguments of a task, a target or a list of targets, reference a semantic segmentation.
+    """
+    for a in (args if isinstance(args, list) else [args]):
+        if isinstance(a, dict) and a.get('semseg') is not None:
+            return True
+    return False
+
+
+def _run_analysis_task(task_id, payload):
+    """
+    Runs one task in a worker process. The progress is sent back through the progress queue,
+    once the abort event is set the analysis is aborted at its next progress signal.
+
+    :param payload: the pickled tuple (analysis, args) as created in ProcessTaskExecutor.run()
+    """
+    analysis, args = pickle.loads(payload)
+    progress_queue = _worker_state['progress_queue']
+    abort_event = _worker_state['abort_event']
+    progress = TaskProgress()
+
+    def on_progress(float_value):
+        if abort_event.is_set():
+            analysis.aborted = True
+        progress.set(float_value)
+        if progress.is_due():
+            progress.mark_sent()
+            progress_queue.put((task_id, float_value))
+
+    if analysis.merged_decoding:
+        return analysis.process_merged(args, on_progress)
+    return analysis.process(args, on_progress)
+
+
+class ProcessTaskExecutor:
+    """
+    Runs the tasks of the AnalysisWorker in a pool of worker processes, such that CPU-bound analyses
+    use several cores and don't compete with the GUI for the GIL.
+
+    Tasks of analyses which are thread_only, tasks which use a semantic segmentation and tasks
+    which can't be pickled are left to the AnalysisWorker.
+    The pool is kept alive between runs, since spawning the processes takes a while.
+    """
+    def __init__(self, n_processes):
+        self.n_processes = n_processes
+        self.broken = False
+
+        # Spawn instead of fork, the parent holds Qt threads and an open HDF5 file.
+        context = multiprocessing.get_context("spawn")
+        self.progress_queue = context.Queue()
+        self.abort_event = context.Event()
+        self.pool = ProcessPoolExecutor(max_workers=n_processes,
+                                        mp_context=context,
+                                        initializer=_init_analysis_worker,
+                                        initargs=(self.progress_queue, self.abort_event))
+
+    def can_run(self, analysis, args):
+        """
+        Returns True if the task should be handed to a worker process.
+        """
+        return not analysis.thread_only and not _uses_semseg(args)
+
+    def run(self, tasks, on_result, on_progress, on_error, aborted):
+        """
+        Runs the tasks in the worker processes and reports their results in the order they complete.
+
+        :param tasks: a list of (task_id, analysis, args, on_progress) as scheduled in the AnalysisWorker
+        :param on_result: called with (task_id, analysis, result) for each finished task
+        :param on_progress: called with (task_id, progress)
+        :param on_error: called with (exctype, value, traceback) if a task raised an exception
+        :param aborted: a callable, if it returns True the remaining tasks are cancelled
+        :return: the tasks which have to run in the thread instead
+        """
+        local, remote = [], deque()
+        for t in tasks:
+            if self.can_run(t[1], t[2]):
+                remote.append(t)
+            else:
+                local.append(t)
+
+        self.abort_event.clear()
+        pending = dict()
+        try:
+            while len(remote) > 0 or len(pending) > 0:
+                # Keep a bounded number of tasks in flight, such that an abort doesn't have to cancel all of them
+                while len(remote) > 0 and len(pending) < 2 * self.n_processes and not aborted():
+                    task = remote.popleft()
+                    task_id, analysis, args, _ = task
+                    try:
+                        payload = pickle.dumps((analysis, args), protocol=pickle.HIGHEST_PROTOCOL)
+                    except (pickle.PicklingError, TypeError, AttributeError) as e:
+                        log_warning("Analysis task can't be pickled, it runs in the thread:", e)
+                        local.append(task)
+                        continue
+                    pending[self.pool.submit(_run_analysis_task, task_id, payload)] = (task_id, analysis)
+
+                if aborted():
+                    self.abort_event.set()
+                    remote.clear()
+                    for future in pending.keys():
+                        future.cancel()
+
+                done, not_done = wait(list(pending.keys()), timeout=0.1, return_when=FIRST_COMPLETED)
+                self._poll_progress(on_progress)
+                for future in done:
+                    task_id, analysis = pending.pop(future)
+                    if future.cancelled():
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        if isinstance(e, BrokenProcessPool):
+                            self.broken = True
+                        log_error("Exception in Analysis Process:", e)
+                        on_error((type(e), e, "".join(traceback.format_exception(type(e), e, e.__traceback__))))
+                        continue
+                    if result is not None and not aborted():
+                        on_result(task_id, analysis, result)
+        finally:
+            self._poll_progress(on_progress)
+        return local
+
+    def _poll_progress(self, on_progress):
+        while True:
+            try:
+                task_id, float_value = self.progress_queue.get_nowait()
+            except Empty:
+                return
+            on_progress(task_id, float_value)
+
+    def shutdown(self):
+        self.abort_event.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
 class AnalysisWorker(QObject):
 
     def __init__(self, worker_manager):
@@ -225,11 +466,16 @@ class AnalysisWorker(QObject):
         self.signals = WorkerSignals()
         self.signals.sign_progress.connect(worker_manager.on_signal_progress, Qt.AutoConnection)
         self.signals.sign_error.connect(worker_manager.on_signal_error, Qt.AutoConnection)
-        self.signals.sign_result.connect(worker_manager.on_worker_finished, Qt.AutoConnection)
+        self.signals.sign_result.connect(worker_manager.on_worker_result, Qt.AutoConnection)
+        self.signals.analysisFinished.connect(worker_manager.on_worker_finished, Qt.AutoConnection)
 
         self.scheduled_task = dict()
-        self.finished_tasks = dict()
         self.current_task_id = 0
+        self.progress = ProgressChannel(self.signals.sign_task_manager_progress.emit)
+
+        # Number of worker processes, 1 runs all tasks in this thread
+        self.n_processes = 1
+        self.executor = None
 
         self.done = []
         self.aborted = False
@@ -237,9 +483,23 @@ class AnalysisWorker(QObject):
 
     @pyqtSlot(object, object)
     def push_task(self, analysis, args):
-        task_id = generate_id(self.scheduled_task.keys())
-        self.scheduled_task[task_id] = (task_id, analysis, args, self._on_progress)
-        self.signals.sign_create_progress_bar.emit(task_id, analysis.__class__.__name__, None, None)
+        self.push_tasks(analysis, [args], self.n_processes)
+
+    @pyqtSlot(object, object, int)
+    def push_tasks(self, analysis, args_list, n_processes):
+        """
+        Schedules one task for each entry of args_list and runs them.
+
+        :param analysis: the IAnalysisJob
+        :param args_list: a list of arguments, each is handed to one IAnalysisJob.process() call
+        :param n_processes: the number of worker processes to run the tasks in
+        """
+        self.n_processes = n_processes
+        for args in args_list:
+            task_id = generate_id(self.scheduled_task.keys())
+            self.scheduled_task[task_id] = (task_id, analysis, args, self._on_progress)
+            self.progress.add_task(task_id, count_frames(analysis, args))
+            self.signals.sign_create_progress_bar.emit(task_id, analysis.__class__.__name__, None, None)
         if not self._running:
             self.run_worker()
 
@@ -249,31 +509,49 @@ class AnalysisWorker(QObject):
         self.aborted = False
         
         self.signals.analysisStarted.emit()
-        print("Scheduled", self.scheduled_task)
-        for i, (task_id, args) in enumerate(self.scheduled_task.items()):
-            print("Performing", ) #, self.aborted, (task_id, args))
+        tasks = list(self.scheduled_task.values())
+        task_ids = list(self.scheduled_task.keys())
+        print("Scheduled", len(tasks))
+        if self.n_processes > 1:
+            tasks = self._run_in_processes(tasks)
 
+        for task_id, analysis, args, on_progress in tasks:
             if self.aborted:
                 break
             self.current_task_id = task_id
-            result = self._run_task(*args)
+            result = self._run_task(task_id, analysis, args, on_progress)
             if result is not None and not self.aborted:
-                self.finished_tasks[task_id] = (args[1], result)
-        self.signals.sign_result.emit(self.finished_tasks)
+                self._on_result(task_id, analysis, result)
 
-        for i, (task_id, args) in enumerate(self.scheduled_task.items()):
+        self.progress.flush()
+        for task_id in task_ids:
+            self.progress.remove_task(task_id)
             self.signals.sign_remove_progress_bar.emit(task_id)
         
         # Clean up
         self.scheduled_task = dict()
-        self.finished_tasks = dict()
         self.signals.analysisEnded.emit()
+        self.signals.analysisFinished.emit()
         self.aborted = False
         self._running = False
 
+    def _run_in_processes(self, tasks):
+        """
+        Runs the tasks which can be pickled in the ProcessTaskExecutor and returns the remaining ones.
+        """
+        if self.executor is not None and (self.executor.n_processes != self.n_processes or self.executor.broken):
+            self.executor.shutdown()
+            self.executor = None
+        if self.executor is None:
+            self.executor = ProcessTaskExecutor(self.n_processes)
+        return self.executor.run(tasks, self._on_result, self._on_task_progress,
+                                 self.signals.sign_error.emit, lambda: self.aborted)
+
     def _run_task(self, task_id, analysis, args, on_progress):
         log_info("Running Analysis", analysis.__class__)
         try:
+            if analysis.merged_decoding:
+                return analysis.process_merged(args, on_progress)
             return analysis.process(args, on_progress)
         except Exception as e:
             traceback.print_exc()
@@ -282,13 +560,17 @@ class AnalysisWorker(QObject):
             self.signals.sign_error.emit((exctype, value, traceback.format_exc()))
             return None
 
+    def _on_result(self, task_id, analysis, result):
+        self.signals.sign_result.emit({task_id: (analysis, result)})
+
     def _on_progress(self, float_value):
-        self.signals.sign_task_manager_progress.emit(self.current_task_id, float_value)
+        self.progress.update(self.current_task_id, float_value)
+
+    def _on_task_progress(self, task_id, float_value):
+        self.progress.update(task_id, float_value)
 
     def abort(self):
         self.scheduled_task = dict()
-        self.finished_tasks = dict()
         self.signals.analysisEnded.emit()
 
         self.aborted = True
-
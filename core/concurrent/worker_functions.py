@@ -1,3 +1,4 @@
+import os
 import json
 
 from PyQt5 import QtGui
@@ -10,6 +11,7 @@ from core.data.computation import *
 from core.container.screenshot import *
 from core.data.computation import frame2ms
 from core.container.project import VIAN_PROJECT_EXTENSION
+from core.data.proxy_cache import ProxyFrameCache
 
 
 def create_screenshot(args, sign_progress):
@@ -33,8 +35,19 @@ def create_screenshot(args, sign_progress):
 
 
 def store_project_concurrent(args, sign_progress):
+    try:
+        _store_project(args, sign_progress)
+    except Exception:
+        # The changes collected by VIANProject.begin_full_store() are not stored anywhere
+        args[0].abort_full_store()
+        raise
+
+
+def _store_project(args, sign_progress):
     project = args[0]
     path = args[1]
+    # The offset of the journal when the store has been started, see VIANProject.begin_full_store()
+    journal_offset = args[2] if len(args) > 2 else None
 
     a_layer = []
     screenshots = []
@@ -71,11 +84,12 @@ def store_project_concurrent(args, sign_progress):
     for g in project.experiments:
         experiments.append(g.serialize())
 
-    for d in project.analysis:
+    for d in project.get_loaded_analyses():
         try:
             analyses.append(d.serialize())
         except Exception as e:
             print("Exception in Analysis.serialize()", e)
+    analyses.extend(project.get_pending_analyses())
 
     print("HDG5 MANAGER", project.hdf5_manager)
     if project.hdf5_manager is None:
@@ -129,8 +143,10 @@ def store_project_concurrent(args, sign_progress):
 
     sign_progress(0.8)
     try:
-        with open(project_path, 'w') as f:
+        with open(project_path + ".tmp", 'w') as f:
             json.dump(data, f)
+        os.replace(project_path + ".tmp", project_path)
+        project.compact_journal(project_path, journal_offset)
         project.path = project_path
     except Exception as e:
         print("Exception during Storing: ", str(e))
@@ -202,9 +218,35 @@ class LoadScreenshotsJob(IConcurrentJob):
         #
         # # sign_progress(100)
 
+        # The timestamps have been recomputed from the frame positions
+        project.sort_screenshots()
         main_window.screenshots_manager.set_loading(False)
 
 
+class CreateProxyFramesJob(IConcurrentJob):
+    """
+    Decodes the movie once and stores the letterbox-cropped and downscaled proxy frames
+    in the data directory of the project.
+    """
+
+    def run_concurrent(self, args, sign_progress):
+        movie_path = args[0]
+        directory = args[1]
+        margins = args[2]
+        stride = args[3]
+        width = args[4]
+        fingerprint = args[5]
+
+        ProxyFrameCache(directory).create(movie_path, margins, stride, width,
+                                          sign_progress=sign_progress, aborted=lambda: self.aborted,
+                                          fingerprint=fingerprint)
+        return None
+
+    def modify_project(self, project, result, sign_progress=None, main_window=None):
+        if project.proxy_cache is not None:
+            project.proxy_cache.load()
+
+
 class CreateScreenshotJob(IConcurrentJob):
     def run_concurrent(self, args, sign_progress):
         frame_pos = args[0]
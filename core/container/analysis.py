@@ -9,9 +9,11 @@ import bisect
 from uuid import uuid4
 from typing import List
 import traceback
+from threading import Lock
 
 from core.data.enums import ANALYSIS_NODE_SCRIPT, ANALYSIS_JOB_ANALYSIS, DataSerialization
-from .container_interfaces import IProjectContainer, IHasName, ISelectable, _VIAN_ROOT, deprecation_serialization
+from .container_interfaces import IProjectContainer, IHasName, ISelectable, _VIAN_ROOT, deprecation_serialization, \
+    restore_qobject
 from core.data.computation import *
 from .hdf5_manager import get_analysis_by_name
 
@@ -112,6 +114,12 @@ class IAnalysisJobAnalysis(AnalysisContainer):
         self.target_classification_object = target_classification_object
         self.a_class = None
 
+    def __reduce__(self):
+        """
+        Results are pickled when they are computed in a worker process, before they have been added to a project.
+        """
+        return restore_qobject, (self.__class__, dict(self.__dict__))
+
     def get_name(self):
         return "{n} ({c})".format(n=self.name,
                                   c=self.target_classification_object.name if self.target_classification_object is not None else "Default")
@@ -231,9 +239,17 @@ class IAnalysisJobAnalysis(AnalysisContainer):
         if self.a_class is None:
             self.a_class = get_analysis_by_name(self.analysis_job_class)
         if self.a_class().data_serialization == DataSerialization.HDF5_MULTIPLE:
-            return self.a_class().from_hdf5(self.project.hdf5_manager.load(self.unique_id))
+            return self.adata_from_hdf5(self.project.hdf5_manager.load(self.unique_id))
         else:
-            return self.a_class().from_hdf5(self.project.hdf5_manager.load_single(self.unique_id))
+            return self.adata_from_hdf5(self.project.hdf5_manager.load_single(self.unique_id))
+
+    def adata_from_hdf5(self, db_data):
+        """
+        Formats the stored row of this analysis, see VIANProject.get_analyses_data().
+        """
+        if self.a_class is None:
+            self.a_class = get_analysis_by_name(self.analysis_job_class)
+        return self.a_class().from_hdf5(db_data)
 
     def get_data_raw(self):
         if self.a_class is None:
@@ -302,7 +318,10 @@ class SemanticSegmentationAnalysisContainer(IAnalysisJobAnalysis):
         if self.a_class is None:
             # self.a_class = self.project.main_window.eval_class(self.analysis_job_class)
             self.a_class = get_analysis_by_name(self.analysis_job_class)
-        data = self.a_class().from_hdf5(self.project.hdf5_manager.load(self.unique_id))
+        return self.adata_from_hdf5(self.project.hdf5_manager.load(self.unique_id))
+
+    def adata_from_hdf5(self, db_data):
+        data = super(SemanticSegmentationAnalysisContainer, self).adata_from_hdf5(db_data)
         return data[0:self.entry_shape[0], 0:self.entry_shape[1]]
 
     def set_adata(self, d):
@@ -349,6 +368,9 @@ class ColormetryAnalysis(AnalysisContainer):
         self.resolution = resolution
         self.has_finished = False
 
+        # The key of the movie fingerprint the colorimetry has been computed for
+        self.fingerprint = None
+
         self.current_idx = 0
         self.current_junk_idx = 0
 
@@ -362,6 +384,42 @@ class ColormetryAnalysis(AnalysisContainer):
 
         self.last_idx = 0
 
+        # The times, spatial frequencies and features are kept in memory and extended by append_data(),
+        # such that get_update() only reads the palette and histogram of one entry.
+        # The generation is incremented by clear(), such that consumers know their entries are outdated.
+        self._arrays = None
+        self._arrays_lock = Lock()
+        self.generation = 0
+
+    def get_arrays(self):
+        """
+        Returns a dict with the times, spatial frequencies and features of all entries, loaded on first access.
+        """
+        with self._arrays_lock:
+            if self._arrays is None:
+                hdf5_manager = self.project.hdf5_manager
+                spatial = hdf5_manager.get_colorimetry_spatial()
+                self._arrays = dict(times=np.array(hdf5_manager.get_colorimetry_times()),
+                                    features=np.array(hdf5_manager.get_colorimetry_feat()),
+                                    spatial={k: np.array(v) for k, v in spatial.items()})
+            return self._arrays
+
+    def _append_arrays(self, idx, data):
+        with self._arrays_lock:
+            if self._arrays is None:
+                return
+            arrays = self._arrays
+            if idx >= arrays['times'].shape[0]:
+                size = max(idx + 1, arrays['times'].shape[0] * 2)
+                arrays['times'] = np.resize(arrays['times'], size)
+                arrays['features'] = np.resize(arrays['features'], (size, ) + arrays['features'].shape[1:])
+                for k, v in arrays['spatial'].items():
+                    arrays['spatial'][k] = np.resize(v, (size, ) + v.shape[1:])
+            arrays['times'][idx] = data['time_ms']
+            arrays['features'][idx] = data['features']
+            for k in arrays['spatial'].keys():
+                arrays['spatial'][k][idx] = data['spatial_' + k]
+
     def get_histogram(self):
         return self.project.hdf5_manager.col_histograms()
         pass
@@ -370,8 +428,8 @@ class ColormetryAnalysis(AnalysisContainer):
         pass
 
     def get_frame_pos(self):
-        times = self.project.hdf5_manager.get_colorimetry_times()
-        frames = np.multiply(np.divide(times, 1000), self.project.movie_descriptor.fps).astype(np.int).tolist()
+        times = self.get_arrays()['times']
+        frames = np.multiply(np.divide(times, 1000), self.project.movie_descriptor.fps).astype(int).tolist()
         return frames
 
     def append_data(self, data):
@@ -379,12 +437,35 @@ class ColormetryAnalysis(AnalysisContainer):
             self.current_idx = len(self.time_ms)
             self.time_ms.append(data['time_ms'])
             self.project.hdf5_manager.dump_colorimetry(data, self.current_idx, self.end_idx)
+            self._append_arrays(self.current_idx, data)
             self.check_finished()
 
         except Exception as e:
             print("ColormetryAnalysis.append_data() raised ", str(e))
 
-    def get_update(self, time_ms):
+    def get_spatial(self, since = 0):
+        """
+        Returns the times and spatial frequencies of the computed entries from since on.
+
+        :param since: the number of entries the caller already has
+        :return: a dict with the keys times, spatial, spatial_start and generation
+        """
+        arrays = self.get_arrays()
+        end = min(self.current_idx + 1, arrays['times'].shape[0])
+        start = min(since, end)
+        return dict(times=arrays['times'][start:end],
+                    spatial={k: v[start:end] for k, v in arrays['spatial'].items()},
+                    spatial_start=start,
+                    generation=self.generation)
+
+    def get_update(self, time_ms, since = None):
+        """
+        Returns the palette and histogram at time_ms.
+
+        :param time_ms: the time in ms
+        :param since: if given, the times and spatial frequencies from this entry on are included, see get_spatial()
+        :return: a dict, or None if the entry at time_ms has already been returned or is not computed yet
+        """
         try:
             frame_idx = int(np.floor(ms_to_frames(time_ms, self.project.movie_descriptor.fps) / self.resolution))
             if frame_idx == self.last_idx or frame_idx > self.current_idx:
@@ -392,38 +473,41 @@ class ColormetryAnalysis(AnalysisContainer):
             self.last_idx = frame_idx
             d = self.project.hdf5_manager.get_colorimetry_pal(frame_idx)
             hist = self.project.hdf5_manager.get_colorimetry_hist(frame_idx)
-            spatial = self.project.hdf5_manager.get_colorimetry_spatial()
-            times = self.project.hdf5_manager.get_colorimetry_times()
             layers = [
-                d[:, 1].astype(np.int),
+                d[:, 1].astype(int),
                 d[:, 2:5].astype(np.uint8),
-                d[:, 5].astype(np.int)
+                d[:, 5].astype(int)
             ]
-            return dict(palette = layers,
-                        histogram=hist,
-                        spatial=spatial,
-                        times=times,
-                        frame_idx = frame_idx,
-                        current_idx = self.current_idx
-                        )
+
+            update = dict(palette = layers,
+                          histogram=hist,
+                          frame_idx = frame_idx,
+                          current_idx = self.current_idx
+                          )
+            if since is not None:
+                update.update(self.get_spatial(since))
+            return update
         except Exception as e:
             print(e)
             pass
 
     def get_time_palette(self):
         time_palette_data = []
-        d = self.project.hdf5_manager.get_colorimetry_pal()
-        palette_layers = d[:, :, 1].astype(np.int)
-        palette_cols = d[:, :, 2:5].astype(np.uint8)
-        palette_bins = d[:, :, 5].astype(np.int)
-        for t in range(palette_layers.shape[0] - 1):
+        palettes = self.project.hdf5_manager.get_colorimetry_pal()
+        for d in palettes[:-1]:
             time_palette_data.append([
-                np.array(palette_layers[t]),
-                np.array(palette_cols[t]),
-                np.array(palette_bins[t])
+                d[:, 1].astype(int),
+                d[:, 2:5].astype(np.uint8),
+                d[:, 5].astype(int)
             ])
         return [time_palette_data, self.time_ms]
 
+    def matches_movie(self, fingerprint):
+        """
+        Returns False if the colorimetry has been computed for another movie file than the given fingerprint key.
+        """
+        return None in (fingerprint, self.fingerprint) or fingerprint == self.fingerprint
+
     def check_finished(self):
         log_info("Status Colorimetry", int(self.current_idx), int(self.end_idx - 1))
         if int(self.current_idx) >= int(self.end_idx - 10):
@@ -435,6 +519,7 @@ class ColormetryAnalysis(AnalysisContainer):
         n_frames = int(np.floor(ms_to_frames(self.project.movie_descriptor.duration, self.project.movie_descriptor.fps) / self.resolution))
 
         self.project.hdf5_manager.initialize_colorimetry(n_frames)
+        self.fingerprint = self.project.movie_descriptor.get_fingerprint_key()
         self.end_idx = n_frames
         self.curr_location = 0
         self.time_ms = []
@@ -443,6 +528,10 @@ class ColormetryAnalysis(AnalysisContainer):
         self.has_finished = False
         self.current_idx = 0
 
+        with self._arrays_lock:
+            self._arrays = None
+        self.generation += 1
+
     def serialize(self, bake=False):
         serialization = dict(
             name=self.name,
@@ -453,7 +542,8 @@ class ColormetryAnalysis(AnalysisContainer):
             time_ms = self.time_ms,
             end_idx = self.end_idx,
             notes=self.notes,
-            has_finished = self.has_finished
+            has_finished = self.has_finished,
+            fingerprint = self.fingerprint
         )
         return serialization
 
@@ -468,6 +558,7 @@ class ColormetryAnalysis(AnalysisContainer):
             self.time_ms = serialization['time_ms']
             self.current_idx = len(self.time_ms)
             self.end_idx = serialization['end_idx']
+            self.fingerprint = serialization.get('fingerprint')
         except Exception as e:
             log_error("Exception in Loading Analysis", str(e))
         self.current_idx = project.hdf5_manager.get_colorimetry_length() - 1
@@ -490,7 +581,7 @@ class ColormetryAnalysis(AnalysisContainer):
         """
         _iter_idx  = 0
         while _iter_idx < len(self.time_ms):
-            yield self.get_update(self.time_ms[_iter_idx])
+            yield self.get_update(self.time_ms[_iter_idx], since=0)
             _iter_idx += 1
 
     def iter_avg_color(self):
@@ -499,7 +590,7 @@ class ColormetryAnalysis(AnalysisContainer):
             time_ms = self.time_ms[_iter_idx]
             hdf5_idx = _iter_idx
             print(hdf5_idx)
-            l,a,b = tuple(self.project.hdf5_manager.get_colorimetry_feat(hdf5_idx)[:3])
+            l,a,b = tuple(self.get_arrays()['features'][hdf5_idx][:3])
             _,c,h = tuple(lab_to_lch([l,a,b]))
             yield dict(
                 time_ms=time_ms,
@@ -0,0 +1,224 @@
+"""
+A content-addressed cache of analysis results, shared between all projects.
+
+A result is stored under a key derived from everything it depends on: the analysis class, its version
+and parameters, the frame range of the target, the letterbox margins, the proxy frames,
+the semantic segmentation mask labels and the movie fingerprint. Re-running an analysis whose inputs haven't changed,
+e.g. when a pipeline is re-run or a template is re-applied, materializes the result
+from the stored HDF5 data instead of recomputing it.
+"""
+
+import os
+import json
+import hashlib
+from threading import Lock
+
+import h5py
+import numpy as np
+
+from core.data.enums import DataSerialization
+from core.data.log import log_info, log_warning, log_error
+from core.data.proxy_cache import ProxyFrameCache
+from core.container.analysis import IAnalysisJobAnalysis
+
+ANALYSIS_CACHE_VERSION = 1
+ANALYSIS_CACHE_FILE = "analysis_cache.hdf5"
+
+# Attributes of an IAnalysisJob which are not parameters of its results
+_NON_PARAMETERS = {"aborted", "hdf5_manager", "target_class_obj", "name", "menu", "help_path", "author",
+                   "dataset_dtype", "data_serialization"}
+
+
+def _plain(value):
+    """
+    Returns True if the value can be serialized to json without loosing information.
+    """
+    try:
+        json.dumps(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def analysis_cache_key(analysis, args, movie_key, class_obj = None):
+    """
+    Computes the cache key of one target of an analysis.
+
+    :param analysis: the IAnalysisJob
+    :param args: the arguments of one target as packed in IAnalysisJob.prepare()
+    :param movie_key: the key of the movie fingerprint, as returned by MovieDescriptor.get_fingerprint_key()
+    :param class_obj: the ClassificationObject the analysis is performed for
+    :return: the key as hex string, or None if the result can't be cached
+    """
+    if movie_key is None or not isinstance(args, dict) or not all(k in args for k in ("start", "end", "target")):
+        return None
+    if analysis.data_serialization not in (DataSerialization.HDF5_MULTIPLE, DataSerialization.HDF5_SINGLE):
+        return None
+
+    # Parameters which can't be serialized would not distinguish the keys of different results
+    parameters = {k: v for k, v in vars(analysis).items() if k not in _NON_PARAMETERS}
+    if not _plain(parameters):
+        return None
+
+    proxy = None
+    if args.get('proxy') is not None:
+        proxy_cache = ProxyFrameCache(args['proxy'])
+        if proxy_cache.meta is None:
+            return None
+        proxy = [proxy_cache.meta[k] for k in ("version", "margins", "stride", "width")]
+        proxy_cache.release()
+
+    mask = None
+    if args.get('semseg') is not None:
+        semseg = args['semseg']
+        if class_obj is None:
+            return None
+        mask = [semseg.analysis_job_class, semseg.parameters, list(class_obj.semantic_segmentation_labels)]
+        if not _plain(mask):
+            return None
+
+    margins = args.get('margins')
+    key = dict(
+        version=ANALYSIS_CACHE_VERSION,
+        analysis=analysis.__class__.__name__,
+        analysis_version=analysis.version,
+        parameters=parameters,
+        start=int(args['start']),
+        end=int(args['end']),
+        margins=[int(m) for m in margins] if margins is not None else None,
+        proxy=proxy,
+        mask=mask,
+        movie=movie_key
+    )
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+class AnalysisResultCache:
+    """
+    Stores analysis results in an HDF5 file, one dataset per key holding the result as
+    returned by IAnalysisJob.to_hdf5().
+    """
+    def __init__(self, directory):
+        self.path = os.path.join(directory, ANALYSIS_CACHE_FILE)
+        self.h5_file = None
+        self.lock = Lock()
+
+    def _open(self):
+        if self.h5_file is None:
+            try:
+                if not os.path.isdir(os.path.dirname(self.path)):
+                    os.makedirs(os.path.dirname(self.path))
+                self.h5_file = h5py.File(self.path, "a")
+            except Exception as e:
+                log_warning("Could not open the analysis cache:", self.path, e)
+                return False
+        return True
+
+    def get(self, key, analysis, target = None):
+        """
+        Materializes a cached result.
+
+        :param key: the key as returned by analysis_cache_key()
+        :param analysis: the IAnalysisJob
+        :param target: the unique id of the target container
+        :return: an IAnalysisJobAnalysis or None if the key is not cached
+        """
+        if key is None:
+            return None
+        with self.lock:
+            if not self._open() or key not in self.h5_file:
+                return None
+            try:
+                dataset = self.h5_file[key]
+                data = analysis.from_hdf5(dataset[()])
+                return IAnalysisJobAnalysis(
+                    name=dataset.attrs['name'],
+                    results=data,
+                    analysis_job_class=analysis.__class__,
+                    parameters=json.loads(dataset.attrs['parameters']),
+                    container=target
+                )
+            except Exception as e:
+                log_error("Could not read the cached analysis:", key, e)
+                return None
+
+    def put(self, key, analysis, result):
+        """
+        Stores a result which has just been computed, before it is added to the project.
+
+        :param key: the key as returned by analysis_cache_key()
+        :param analysis: the IAnalysisJob
+        :param result: the IAnalysisJobAnalysis as returned from IAnalysisJob.process()
+        """
+        if key is None or result.data is None or not _plain(result.parameters):
+            return
+        with self.lock:
+            if not self._open():
+                return
+            try:
+                data = np.asarray(analysis.to_hdf5(result.data), dtype=analysis.dataset_dtype)
+                if key in self.h5_file:
+                    del self.h5_file[key]
+                dataset = self.h5_file.create_dataset(key, data=data)
+                dataset.attrs['name'] = result.name
+                dataset.attrs['parameters'] = json.dumps(result.parameters)
+                self.h5_file.flush()
+            except Exception as e:
+                log_error("Could not cache the analysis:", key, e)
+
+    def split(self, analysis, args, movie_key, class_obj = None):
+        """
+        Splits the prepared arguments of an analysis into the targets which are cached and those which have to be computed.
+
+        :param analysis: the IAnalysisJob
+        :param args: the arguments as returned by IAnalysisJob.prepare(), a list or a single target
+        :param movie_key: the key of the movie fingerprint
+        :param class_obj: the ClassificationObject the analysis is performed for
+        :return: a list of cached results, the remaining arguments (None if there are none left) and
+        a dict target: key of the remaining targets
+        """
+        hits = []
+        misses = []
+        keys = dict()
+        for a in (args if isinstance(args, list) else [args]):
+            key = analysis_cache_key(analysis, a, movie_key, class_obj)
+            result = None
+            if key is not None:
+                result = self.get(key, analysis, a['target'])
+            if result is not None:
+                hits.append(result)
+            else:
+                misses.append(a)
+                if key is not None:
+                    keys[a['target']] = key
+
+        if not isinstance(args, list):
+            misses = misses[0] if len(misses) > 0 else None
+        elif len(misses) == 0:
+            misses = None
+        return hits, misses, keys
+
+    def __contains__(self, key):
+        with self.lock:
+            return key is not None and self._open() and key in self.h5_file
+
+    def __len__(self):
+        with self.lock:
+            if not self._open():
+                return 0
+            return len(self.h5_file.keys())
+
+    def clear(self):
+        """
+        Removes all cached results.
+        """
+        self.close()
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+            log_info("Analysis Cache cleared")
+
+    def close(self):
+        with self.lock:
+            if self.h5_file is not None:
+                self.h5_file.close()
+                self.h5_file = None
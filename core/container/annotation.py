@@ -5,6 +5,7 @@ from core.container.media_objects import FileMediaObject, DataMediaObject
 from core.data.enums import AnnotationType, MediaObjectType, ANNOTATION, ANNOTATION_LAYER
 from .container_interfaces import IProjectContainer, ITimeRange, IHasName, ISelectable, ILockable, IClassifiable, \
     IHasMediaObject, ITimelineItem
+from .interval_index import IntervalIndex
 
 
 class Annotation(IProjectContainer, ITimeRange, IHasName, ISelectable, ILockable, IClassifiable, IHasMediaObject):
@@ -111,11 +112,13 @@ class Annotation(IProjectContainer, ITimeRange, IHasName, ISelectable, ILockable
     def set_start(self, start):
         self.project.undo_manager.to_undo((self.set_start, [start]), (self.set_start, [self.t_start]))
         self.t_start = start
+        self.invalidate_index()
         self.dispatch_on_changed(item=self)
 
     def set_end(self, end):
         self.project.undo_manager.to_undo((self.set_end, [end]), (self.set_end, [self.t_end]))
         self.t_end = end
+        self.invalidate_index()
         self.dispatch_on_changed(item=self)
 
     def get_start(self):
@@ -128,9 +131,14 @@ class Annotation(IProjectContainer, ITimeRange, IHasName, ISelectable, ILockable
         self.project.undo_manager.to_undo((self.move, [start, end]), (self.move, [self.t_start, self.t_end]))
         self.t_start = start
         self.t_end = end
+        self.invalidate_index()
         if dispatch:
             self.dispatch_on_changed(item=self)
 
+    def invalidate_index(self):
+        if self.annotation_layer is not None:
+            self.annotation_layer.invalidate_index()
+
     def set_color(self, color):
         self.project.undo_manager.to_undo((self.set_color, [color]), (self.set_color, [self.color]))
         self.color = color
@@ -371,6 +379,7 @@ class AnnotationLayer(IProjectContainer, ITimeRange, IHasName, ISelectable, ITim
         self.t_start = t_start
         self.t_end = t_end
         self.annotations = []
+        self._index = IntervalIndex(lambda: self.annotations)
         self.is_current_layer = False
         self.is_visible = True
         self.timeline_visibility = True
@@ -424,6 +433,7 @@ class AnnotationLayer(IProjectContainer, ITimeRange, IHasName, ISelectable, ITim
 
     def add_annotation(self, annotation):
         self.annotations.append(annotation)
+        self._index.add(annotation)
         annotation.annotation_layer = self
         self.project.undo_manager.to_undo((self.add_annotation, [annotation]),
                                           (self.remove_annotation, [annotation]))
@@ -435,6 +445,7 @@ class AnnotationLayer(IProjectContainer, ITimeRange, IHasName, ISelectable, ITim
         if annotation in self.annotations:
             annotation.widget.close()
             self.annotations.remove(annotation)
+            self._index.remove(annotation)
             self.project.undo_manager.to_undo((self.remove_annotation, [annotation]),
                                               (self.add_annotation, [annotation]))
             self.dispatch_on_changed(item=self)
@@ -443,6 +454,18 @@ class AnnotationLayer(IProjectContainer, ITimeRange, IHasName, ISelectable, ITim
     def set_is_current_layer(self, bool):
         self.is_current_layer = bool
 
+    def get_annotations_of_time(self, time_ms):
+        """
+        Returns all Annotations visible at the given time, including their start and end.
+        """
+        return self._index.at(time_ms, closed=True)
+
+    def invalidate_index(self):
+        """
+        Has to be called if the start or end of an Annotation has been changed.
+        """
+        self._index.invalidate()
+
     def serialize(self):
         s_annotations = []
         for a in self.annotations:
@@ -482,6 +505,7 @@ class AnnotationLayer(IProjectContainer, ITimeRange, IHasName, ISelectable, ITim
 
             new.annotation_layer = self
             self.annotations.append(new)
+        self._index.invalidate()
 
         try:
             self.is_visible = serialization['is_visible']
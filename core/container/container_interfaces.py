@@ -47,6 +47,20 @@ class IClassifiable():
             self.onClassificationChanged.emit(self.tag_keywords)
 
 
+def restore_qobject(cls, state):
+    """
+    Recreates a QObject pickled by its __reduce__(), the Qt object is initialized
+    without calling the __init__ of the subclass.
+
+    :param cls: the class of the object
+    :param state: the attributes of the object
+    """
+    obj = cls.__new__(cls)
+    QObject.__init__(obj)
+    obj.__dict__.update(state)
+    return obj
+
+
 class IProjectContainer(QObject):
     onAnalysisAdded = pyqtSignal(object)
     onAnalysisRemoved = pyqtSignal(object)
@@ -63,6 +77,23 @@ class IProjectContainer(QObject):
 
         self.connected_analyses = []
 
+    @property
+    def connected_analyses(self):
+        # The analyses of a lazily loaded project are deserialized when they are first accessed
+        if self.project is not None and self.unique_id in self.project.pending_analyses:
+            self.project.materialize_analyses(self.unique_id)
+        return self._connected_analyses
+
+    @connected_analyses.setter
+    def connected_analyses(self, value):
+        self._connected_analyses = value
+
+    def get_loaded_analyses(self):
+        """
+        Returns the connected analyses which have already been deserialized, without loading pending ones.
+        """
+        return self._connected_analyses
+
     def get_id(self):
         return self.unique_id
 
@@ -145,6 +145,29 @@ class Corpus(QObject, IHasName):
         for p in self.projects_loaded.values(): #type:VIANProject
             p.hdf5_manager.on_close()
 
+    def relink_movies(self, movie_index):
+        """
+        Sets the movie path of all projects whose movie can't be found to
+        the movie with the same fingerprint in the given MovieIndex.
+
+        :param movie_index: a MovieIndex
+        :return: the number of relinked projects
+        """
+        self.reload()
+        n = 0
+        for p in self.projects_loaded.values(): #type:VIANProject
+            if os.path.isfile(p.movie_descriptor.get_movie_path()):
+                continue
+            path = movie_index.find(p.movie_descriptor.fingerprint)
+            if path is None:
+                log_warning("Could not relink the movie of", p.name)
+                continue
+            p.movie_descriptor.set_movie_path(path)
+            p.store_project()
+            n += 1
+        log_info("Relinked", n, "Projects")
+        return n
+
     def get_name(self):
         return self.name
 
@@ -1086,6 +1086,8 @@ class Experiment(IProjectContainer, IHasName):
             if container not in keyword.tagged_containers:
                 keyword.tagged_containers.append(container)
                 container.add_word(keyword)
+            if self.project is not None:
+                self.project.mark_tagged(self, container, keyword, True)
 
     def remove_tag(self, container: IClassifiable, keyword: UniqueKeyword):
         try:
@@ -1093,11 +1095,15 @@ class Experiment(IProjectContainer, IHasName):
             if container in keyword.tagged_containers:
                 keyword.tagged_containers.remove(container)
                 container.remove_word(keyword)
+            if self.project is not None:
+                self.project.mark_tagged(self, container, keyword, False)
         except Exception as e:
             log_error("Exception in remove_tag", e)
 
     def remove_all_tags_with_container(self, container):
         self.classification_results[:] = [tup for tup in self.classification_results if not tup[0] is container]
+        if self.project is not None:
+            self.project.mark_changed(self)
 
     def emit_change(self):
         self.onExperimentChanged.emit(self)
@@ -1,7 +1,9 @@
 from threading import Lock
+from collections import OrderedDict
 import h5py
 import os
 import gc
+import time
 import numpy as np
 
 from core.data.enums import DataSerialization
@@ -35,23 +37,324 @@ DS_COL_SPATIAL_COLOR = "col_spatial_color"
 DS_COL_SPATIAL_HUE = "col_spatial_hue"
 DS_COL_SPATIAL_LUMINANCE = "col_spatial_luminance"
 
+# A ragged dataset stores samples with a varying number of rows, e.g. palettes. The rows of all samples
+# are appended to the dataset itself, the dataset name + RAGGED_OFFSETS holds (start, count) per sample.
+# The position the next rows are written to is derived from the offsets when the dataset is written first,
+# it is not stored with the indices of the project, which may be older than the file.
+# Indices of older versions may contain it as dataset name + RAGGED_END, it is ignored.
+RAGGED_OFFSETS = "_offsets"
+RAGGED_END = "_end"
+
+DS_COLORIMETRY = [DS_COL_FEAT, DS_COL_HIST, DS_COL_PAL, DS_COL_PAL + RAGGED_OFFSETS, DS_COL_TIME,
+                  DS_COL_SPATIAL_EDGE, DS_COL_SPATIAL_LUMINANCE, DS_COL_SPATIAL_HUE, DS_COL_SPATIAL_COLOR]
+
+# Datasets are chunked along their first axis, such that a chunk holds about CHUNK_BYTES uncompressed bytes,
+# and compressed with the filter of DEFAULT_STORAGE unless an analysis declares its own by get_hdf5_storage()
+CHUNK_BYTES = 256 * 1024
+DEFAULT_STORAGE = dict(compression="lzf", shuffle=True)
+
+# Palettes use few of their up to 1000 rows and are stored ragged, most histogram bins are empty
+COLORIMETRY_STORAGE = {
+    DS_COL_PAL: dict(ragged=True, compression="gzip", compression_opts=4, shuffle=True),
+    DS_COL_HIST: dict(compression="gzip", compression_opts=4, shuffle=True),
+}
+
+# Default flush policy of the write buffer, whichever limit is reached first
+FLUSH_ROWS = 512
+FLUSH_BYTES = 64 * 1024 * 1024
+FLUSH_SECONDS = 5.0
+
+# The maximal size of the arrays kept by the read cache of load() and load_single()
+READ_CACHE_BYTES = 128 * 1024 * 1024
+
+# load_many() reads the whole range between the first and last position if it holds
+# at most READ_SPAN_FACTOR times the requested rows, else only the requested rows.
+# The values of ragged samples are read the same way, else as the ranges of the requested samples.
+READ_SPAN_FACTOR = 4
+
 
 HDF5_WRITE_LOCK = Lock()
 HDF5_FILE_LOCK = Lock()
 
+def get_storage(shape, dtype, storage = None):
+    """
+    Returns the keyword arguments of h5py.File.create_dataset() which define the layout of a dataset.
+
+    :param shape: the initial shape of the dataset, the first axis can be resized
+    :param dtype: the dtype of the dataset
+    :param storage: a dict overriding DEFAULT_STORAGE, e.g. returned by IAnalysisJob.get_hdf5_storage(),
+    with the keys chunks, compression, compression_opts and shuffle. The key ragged is ignored.
+    :return: a dict
+    """
+    result = dict(DEFAULT_STORAGE)
+    if storage is not None:
+        result.update(storage)
+    result.pop('ragged', None)
+
+    if result.get('chunks') is None or result['chunks'] is True:
+        row_bytes = max(1, int(np.prod(shape[1:], dtype=np.int64)) * np.dtype(dtype).itemsize)
+        result['chunks'] = (max(1, CHUNK_BYTES // row_bytes), ) + tuple(shape[1:])
+    if result.get('compression') is None:
+        result.pop('compression', None)
+        result.pop('compression_opts', None)
+    result['maxshape'] = (None, ) + tuple(shape[1:])
+    return result
+
+
+def get_storage_of(ds):
+    """
+    Returns the storage of an existing dataset in the format of get_storage().
+    """
+    return dict(chunks=ds.chunks, compression=ds.compression,
+                compression_opts=ds.compression_opts, shuffle=ds.shuffle)
+
+
+def get_dataset_storage(name):
+    """
+    Returns the storage declared for a dataset, by the analysis writing it or the colorimetry defaults.
+    """
+    if name in COLORIMETRY_STORAGE:
+        return COLORIMETRY_STORAGE[name]
+    for a in ALL_REGISTERED_ANALYSES.values():
+        c = a()
+        if c.dataset_name == name:
+            return c.get_hdf5_storage()
+    return None
+
+
+def copy_dataset(ds, h5_file, name, storage = None):
+    """
+    Copies a dataset including its attributes into another file, one slab of chunks at a time.
+
+    :param ds: the source h5py.Dataset
+    :param h5_file: the destination h5py.File
+    :param name: the name of the new dataset
+    :param storage: the storage of the copy as passed to get_storage(), by default the one of the source
+    :return: the new h5py.Dataset
+    """
+    if storage is None:
+        storage = get_storage_of(ds)
+    if storage.get('ragged', False) and not ds.attrs.get('ragged', False) and len(ds.shape) > 2:
+        return copy_dataset_to_ragged(ds, h5_file, name, storage)
+    nds = h5_file.create_dataset(name, ds.shape, ds.dtype, **get_storage(ds.shape, ds.dtype, storage))
+    step = max(1, nds.chunks[0] if nds.chunks is not None else 1) * 64
+    for start in range(0, ds.shape[0], step):
+        stop = min(ds.shape[0], start + step)
+        rows = ds[start:stop]
+        # Chunks which have never been written are not allocated, they are kept unallocated
+        if np.any(rows != nds.fillvalue):
+            nds[start:stop] = rows
+    for k, v in ds.attrs.items():
+        nds.attrs[k] = v
+    return nds
+
+
+def create_ragged_dataset(h5_file, name, n_samples, shape, dtype, storage = None):
+    """
+    Creates a ragged dataset with rows of the given shape and the offsets of n_samples samples.
+
+    :return: the h5py.Dataset of the rows
+    """
+    ds = h5_file.create_dataset(name, shape=DEFAULT_SIZE + tuple(shape), dtype=dtype,
+                                **get_storage(DEFAULT_SIZE + tuple(shape), dtype, storage))
+    ds.attrs['ragged'] = True
+    h5_file.create_dataset(name + RAGGED_OFFSETS, shape=(n_samples, 2), dtype=np.int64,
+                           **get_storage((n_samples, 2), np.int64))
+    return ds
+
+
+def copy_dataset_to_ragged(ds, h5_file, name, storage = None):
+    """
+    Copies a dataset of padded samples, e.g. palettes of shape (1000, 6), into a ragged dataset.
+    The trailing rows of a sample which are zero are dropped.
+
+    :return: the h5py.Dataset of the rows
+    """
+    nds = create_ragged_dataset(h5_file, name, ds.shape[0], ds.shape[2:], ds.dtype, storage)
+    offsets = np.zeros(shape=(ds.shape[0], 2), dtype=np.int64)
+    end = 0
+    step = 256
+    for start in range(0, ds.shape[0], step):
+        samples = ds[start:start + step]
+        used = np.any(samples != 0, axis=tuple(range(2, len(ds.shape))))
+        rows = []
+        for i in range(samples.shape[0]):
+            nonzero = np.nonzero(used[i])[0]
+            count = nonzero[-1] + 1 if nonzero.shape[0] > 0 else 0
+            offsets[start + i] = (end, count)
+            rows.append(samples[i, :count])
+            end += count
+        rows = np.concatenate(rows)
+        if rows.shape[0] > 0:
+            nds.resize((end, ) + nds.shape[1:])
+            nds[end - rows.shape[0]:end] = rows
+    nds.resize((end, ) + nds.shape[1:])
+    h5_file[name + RAGGED_OFFSETS][:] = offsets
+    for k, v in ds.attrs.items():
+        nds.attrs[k] = v
+    return nds
+
+
 def print_registered_analyses():
     log_info("Registered Analyses:")
     for k,v in ALL_REGISTERED_ANALYSES.items():
         log_info("\t--- " + v.__name__)
 
 
+class HDF5WriteBuffer:
+    """
+    Accumulates rows per dataset in memory, such that they can be written as contiguous slabs
+    instead of one row at a time.
+    The buffer is due to be flushed if it holds more than max_rows rows or max_bytes bytes,
+    or if the oldest row has been buffered for longer than max_seconds.
+    The rows of a sample of a ragged dataset are put as one block, which counts as one row.
+    """
+    def __init__(self, max_rows = FLUSH_ROWS, max_bytes = FLUSH_BYTES, max_seconds = FLUSH_SECONDS):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+        self._rows = dict()
+        self._n_rows = 0
+        self._n_bytes = 0
+        self._first_put = None
+
+    def put(self, dataset_name, pos, row):
+        self.put_block(dataset_name, pos, np.asarray(row)[np.newaxis])
+
+    def put_block(self, dataset_name, pos, rows):
+        """
+        Puts consecutive rows starting at pos.
+        """
+        rows = np.asarray(rows)
+        self._rows.setdefault(dataset_name, dict())[pos] = rows
+        self._n_rows += 1
+        self._n_bytes += rows.nbytes
+        if self._first_put is None:
+            self._first_put = time.time()
+
+    def is_due(self):
+        if self._n_rows == 0:
+            return False
+        return self._n_rows >= self.max_rows \
+               or self._n_bytes >= self.max_bytes \
+               or time.time() - self._first_put >= self.max_seconds
+
+    def has_rows(self, dataset_names = None):
+        if dataset_names is None:
+            return self._n_rows > 0
+        return any(n in self._rows for n in dataset_names)
+
+    def slabs(self):
+        """
+        Yields (dataset_name, start, rows) for all runs of consecutive positions.
+        """
+        for name, blocks in self._rows.items():
+            positions = sorted(blocks.keys())
+            start = 0
+            for i in range(1, len(positions) + 1):
+                if i == len(positions) or positions[i] != positions[i - 1] + blocks[positions[i - 1]].shape[0]:
+                    yield name, positions[start], np.concatenate([blocks[p] for p in positions[start:i]])
+                    start = i
+
+    def discard(self, dataset_names = None):
+        if dataset_names is None:
+            dataset_names = list(self._rows.keys())
+        for n in dataset_names:
+            rows = self._rows.pop(n, dict())
+            self._n_rows -= len(rows)
+            self._n_bytes -= sum(r.nbytes for r in rows.values())
+        if self._n_rows == 0:
+            self._first_put = None
+
+
+class HDF5ReadCache:
+    """
+    Keeps the arrays last loaded by unique id, until they hold more than max_bytes bytes,
+    then the least recently used are removed.
+    Copies are returned, such that callers modifying an array don't change the cached one.
+    """
+    def __init__(self, max_bytes = READ_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._arrays = OrderedDict()
+        self._n_bytes = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def get(self, unique_id):
+        """
+        Returns a copy of the cached array or None, and counts the hit or miss.
+        """
+        with self._lock:
+            arr = self._arrays.get(unique_id)
+            if arr is None:
+                self.misses += 1
+                return None
+            self._arrays.move_to_end(unique_id)
+            self.hits += 1
+            return arr.copy()
+
+    def put(self, unique_id, arr):
+        """
+        Caches an array, arrays larger than max_bytes are not cached.
+        """
+        if not isinstance(arr, np.ndarray) or arr.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(unique_id)
+            self._arrays[unique_id] = arr.copy()
+            self._n_bytes += arr.nbytes
+            while self._n_bytes > self.max_bytes:
+                self._remove(next(iter(self._arrays)))
+
+    def invalidate(self, unique_id = None):
+        """
+        Removes the array of a unique id, or all arrays if unique_id is None.
+        """
+        with self._lock:
+            if unique_id is None:
+                self._arrays.clear()
+                self._n_bytes = 0
+            else:
+                self._remove(unique_id)
+
+    def _remove(self, unique_id):
+        arr = self._arrays.pop(unique_id, None)
+        if arr is not None:
+            self._n_bytes -= arr.nbytes
+
+    def stats(self):
+        """
+        Returns a dict with the keys hits, misses, entries and bytes.
+        """
+        return dict(hits=self.hits, misses=self.misses, entries=len(self._arrays), bytes=self._n_bytes)
+
+
 class HDF5Manager():
-    def __init__(self):
+    def __init__(self, flush_rows = FLUSH_ROWS, flush_bytes = FLUSH_BYTES, flush_seconds = FLUSH_SECONDS,
+                 read_cache_bytes = READ_CACHE_BYTES):
         self.path = None
         self.h5_file = None
         self._index = dict()
         self._uid_index = dict()
 
+        # Rows written by dump() and dump_colorimetry() are buffered until flush() is called
+        # or the flush policy is met, reading a buffered dataset flushes it first.
+        self._buffer = HDF5WriteBuffer(flush_rows, flush_bytes, flush_seconds)
+        self._colorimetry_initialized = False
+        self._ragged = dict()
+
+        # The positions the next rows of the ragged datasets are written to, see _ragged_end()
+        self._ragged_ends = dict()
+
+        # The arrays returned by load() and load_single(), invalidated when they are dumped again
+        self._cache = HDF5ReadCache(read_cache_bytes)
+
         #Cached
         self.col_edge_max = None
         self.col_hue_max = None
@@ -61,6 +364,8 @@ class HDF5Manager():
     #region -- Generic --
     def set_path(self, path):
         self.path = path
+        self._ragged = dict()
+        self._ragged_ends = dict()
         init = False
         log_info("HDF5: ", self.path)
         if not os.path.isfile(self.path):
@@ -70,7 +375,7 @@ class HDF5Manager():
         log_info("Datasets in HDF5 File:")
         for k in self.h5_file.keys():
             log_info("\t-- ", k)
-            if k == "ColorPalettes" and self.h5_file["ColorPalettes"].shape[1] != 1024:
+            if k == "ColorPalettes" and not self.is_ragged(k) and self.h5_file["ColorPalettes"].shape[1] != 1024:
                 log_info("Deleting Palettes")
                 del self.h5_file["ColorPalettes"]
         return init
@@ -84,12 +389,23 @@ class HDF5Manager():
                 continue
             c = a()
             self.initialize_dataset(c.dataset_name, DEFAULT_SIZE + c.dataset_shape,
-                                    c.dataset_dtype, c.get_hdf5_description())
+                                    c.dataset_dtype, c.get_hdf5_description(), c.get_hdf5_storage())
+
+    def initialize_dataset(self, name, shape, dtype, attrs, storage = None):
+        """
+        Creates a dataset if it doesn't exist yet and sets its attributes.
 
-    def initialize_dataset(self, name, shape, dtype, attrs):
+        :param storage: the chunks and compression of the dataset, see get_storage()
+        """
         if name not in self.h5_file:
             log_info("Init:", name, shape, dtype)
-            self.h5_file.create_dataset(name=name, shape=shape, dtype=dtype, maxshape=(None, ) + shape[1:], chunks=True)
+            if storage is not None and storage.get('ragged', False):
+                # The samples of shape[1:] are stored as their rows of shape[2:]
+                create_ragged_dataset(self.h5_file, name, shape[0], shape[2:], dtype, storage)
+                self._ragged_ends[name] = 0
+                self._ragged.pop(name, None)
+            else:
+                self.h5_file.create_dataset(name=name, shape=shape, dtype=dtype, **get_storage(shape, dtype, storage))
             self._index[name] = 0
 
         for k, v in attrs.items():
@@ -104,28 +420,119 @@ class HDF5Manager():
             if not dataset_name in self._index:
                 self._index[dataset_name] = 0
 
+            self._cache.invalidate(unique_id)
             pos = self._index[dataset_name]
-            if pos > 0 and pos % DEFAULT_SIZE[0] == 0:
-                self.h5_file[dataset_name].resize((pos + DEFAULT_SIZE[0], ) + self.h5_file[dataset_name].shape[1:])
-            self.h5_file[dataset_name][pos] = d
+            if self.is_ragged(dataset_name):
+                self._put_ragged(dataset_name, pos, d)
+            else:
+                self._buffer.put(dataset_name, pos, self._pad_rows(d, self.h5_file[dataset_name].shape[1:]))
 
             self._uid_index[unique_id] = (dataset_name, pos)
             self._index[dataset_name] += 1
-            self.h5_file.flush()
+            if self._buffer.is_due():
+                self._flush()
+
+    def is_ragged(self, dataset_name):
+        """
+        Returns True if the dataset stores samples with a varying number of rows, see RAGGED_OFFSETS.
+        """
+        if dataset_name not in self._ragged:
+            self._ragged[dataset_name] = dataset_name in self.h5_file \
+                                         and bool(self.h5_file[dataset_name].attrs.get('ragged', False))
+        return self._ragged[dataset_name]
+
+    def _pad_rows(self, d, shape):
+        # Samples stored ragged in new files are padded with zeros for fixed datasets of older files
+        d = np.asarray(d)
+        if len(shape) > 1 and d.ndim == len(shape) and d.shape[0] < shape[0] and d.shape[1:] == shape[1:]:
+            padded = np.zeros(shape=shape, dtype=d.dtype)
+            padded[:d.shape[0]] = d
+            return padded
+        return d
+
+    def _ragged_end(self, dataset_name):
+        # Called with HDF5_WRITE_LOCK held
+        if dataset_name not in self._ragged_ends:
+            if self._buffer.has_rows([dataset_name, dataset_name + RAGGED_OFFSETS]):
+                self._flush()
+            offsets = self.h5_file[dataset_name + RAGGED_OFFSETS][:]
+            self._ragged_ends[dataset_name] = int(np.amax(offsets[:, 0] + offsets[:, 1])) \
+                if offsets.shape[0] > 0 else 0
+        return self._ragged_ends[dataset_name]
+
+    def _put_ragged(self, dataset_name, pos, d):
+        rows = np.reshape(d, (-1, ) + self.h5_file[dataset_name].shape[1:])
+        start = self._ragged_end(dataset_name)
+        if rows.shape[0] > 0:
+            self._buffer.put_block(dataset_name, start, rows)
+        self._buffer.put(dataset_name + RAGGED_OFFSETS, pos, np.array([start, rows.shape[0]], dtype=np.int64))
+        self._ragged_ends[dataset_name] = start + rows.shape[0]
+
+    def load_ragged(self, dataset_name, pos = None):
+        """
+        Returns the rows of a sample of a ragged dataset, or a list of the rows of all samples if pos is None.
+        """
+        self._flush_pending([dataset_name, dataset_name + RAGGED_OFFSETS])
+        ds = self.h5_file[dataset_name]
+        if pos is not None:
+            start, count = self.h5_file[dataset_name + RAGGED_OFFSETS][pos]
+            return ds[start:start + count]
+
+        # All rows are read at once and sliced in memory
+        offsets = self.h5_file[dataset_name + RAGGED_OFFSETS][:]
+        rows = ds[:int(np.amax(offsets[:, 0] + offsets[:, 1]))] if offsets.shape[0] > 0 else ds[:0]
+        return [rows[start:start + count] for start, count in offsets]
+
+    def flush(self):
+        """
+        Writes all buffered rows to the file.
+        """
+        with HDF5_WRITE_LOCK:
+            self._flush()
+
+    def _flush(self):
+        if self.h5_file is None or not self._buffer.has_rows():
+            return
+        for dataset_name, start, rows in self._buffer.slabs():
+            ds = self.h5_file[dataset_name]
+            stop = start + rows.shape[0]
+            if ds.shape[0] < stop:
+                # Grow in multiples of DEFAULT_SIZE, such that the dataset is resized once per slab
+                size = int(np.ceil(stop / DEFAULT_SIZE[0]) * DEFAULT_SIZE[0])
+                ds.resize((size, ) + ds.shape[1:])
+            ds[start:stop] = np.reshape(rows, (rows.shape[0], ) + ds.shape[1:])
+        self._buffer.discard()
+        self.h5_file.flush()
+
+    def _flush_pending(self, dataset_names):
+        if self._buffer.has_rows(dataset_names):
+            self.flush()
 
     def dump_single(self, d, dataset_name, unique_id):
         with HDF5_WRITE_LOCK:
             if self.h5_file is None:
                 raise IOError("HDF5 File not opened yet")
 
+            self._cache.invalidate(unique_id)
             self.initialize_dataset(unique_id, d.shape, d.dtype, dict(dataset_name=dataset_name))
             self.h5_file[unique_id][:] = d
             self.h5_file.flush()
 
     def load_single(self, unique_id):
+        """
+        Returns the dataset of unique_id as array, datasets too large for the read cache are returned as h5py.Dataset.
+        """
         if self.h5_file is None:
             raise IOError("HDF5 File not opened yet")
-        return self.h5_file[unique_id]
+        res = self._cache.get(unique_id)
+        if res is not None:
+            return res
+        ds = self.h5_file[unique_id]
+        if ds.size * ds.dtype.itemsize > self._cache.max_bytes:
+            return ds
+        res = ds[()]
+        self._cache.put(unique_id, res)
+        return res
 
     def location_of(self, uuid):
         try:
@@ -138,10 +545,101 @@ class HDF5Manager():
     def load(self, unique_id):
         if self.h5_file is None:
             raise IOError("HDF5 File not opened yet")
+        res = self._cache.get(str(unique_id))
+        if res is not None:
+            return res
         pos = self._uid_index[str(unique_id)]
-        res = self.h5_file[pos[0]][pos[1]]
+        if self.is_ragged(pos[0]):
+            res = self.load_ragged(pos[0], pos[1])
+        else:
+            self._flush_pending([pos[0]])
+            res = self.h5_file[pos[0]][pos[1]]
+        self._cache.put(str(unique_id), res)
         return res
 
+    def load_many(self, unique_ids):
+        """
+        Loads the rows of several unique ids with one read per dataset, the positions are sorted before reading.
+        Unknown unique ids are skipped.
+
+        :param unique_ids: a list of unique ids, stored in datasets with the same row shape
+        :return: a tuple (rows, ids), the stacked rows in the order of ids,
+        for ragged datasets rows is a list of arrays
+        """
+        if self.h5_file is None:
+            raise IOError("HDF5 File not opened yet")
+
+        ids = []
+        by_dataset = dict()
+        for uid in unique_ids:
+            pos = self._uid_index.get(str(uid))
+            if pos is None:
+                continue
+            by_dataset.setdefault(pos[0], []).append((pos[1], len(ids)))
+            ids.append(str(uid))
+
+        self._flush_pending(list(by_dataset.keys()) + [n + RAGGED_OFFSETS for n in by_dataset.keys()])
+        rows = [None] * len(ids)
+        ragged = False
+        for dataset_name, entries in by_dataset.items():
+            positions = np.array([e[0] for e in entries], dtype=np.int64)
+            if self.is_ragged(dataset_name):
+                ragged = True
+                data = self._read_ragged_rows(dataset_name, positions)
+            else:
+                data = self._read_rows(self.h5_file[dataset_name], positions)
+            for (p, i), r in zip(entries, data):
+                rows[i] = r
+
+        if ragged:
+            return rows, ids
+        if len(rows) == 0:
+            return np.array(rows), ids
+        return np.stack(rows), ids
+
+    def _read_rows(self, ds, positions):
+        # Returns the rows at positions in their order, reading each position once in increasing order
+        unique, inverse = np.unique(positions, return_inverse=True)
+        if unique[-1] - unique[0] + 1 <= READ_SPAN_FACTOR * unique.shape[0]:
+            data = ds[unique[0]:unique[-1] + 1][unique - unique[0]]
+        else:
+            data = ds[unique.tolist()]
+        return data[inverse]
+
+    def _read_ragged_rows(self, dataset_name, positions):
+        # Returns the samples at positions, reading the values of the samples as few ranges
+        offsets = self._read_rows(self.h5_file[dataset_name + RAGGED_OFFSETS], positions)
+        runs = np.unique(offsets, axis=0)
+        first = int(runs[0, 0])
+        end = int(np.amax(runs[:, 0] + runs[:, 1]))
+        if end - first <= READ_SPAN_FACTOR * max(int(np.sum(runs[:, 1])), 1):
+            ranges = [[first, end]]
+        else:
+            # Runs which overlap or touch are merged, each merged range is read separately
+            ranges = []
+            for start, count in runs:
+                start, stop = int(start), int(start + count)
+                if len(ranges) > 0 and start <= ranges[-1][1]:
+                    ranges[-1][1] = max(ranges[-1][1], stop)
+                else:
+                    ranges.append([start, stop])
+
+        ds = self.h5_file[dataset_name]
+        range_starts = np.array([r[0] for r in ranges])
+        values = [ds[a:b] for a, b in ranges]
+        result = []
+        for start, count in offsets:
+            i = int(np.searchsorted(range_starts, start, side="right")) - 1
+            offset = start - ranges[i][0]
+            result.append(values[i][offset:offset + count])
+        return result
+
+    def get_cache_stats(self):
+        """
+        Returns the hits and misses of the read cache of load() and load_single(), see HDF5ReadCache.stats().
+        """
+        return self._cache.stats()
+
     def get_location(self, unique_id):
         if self.h5_file is None:
             raise IOError("HDF5 File not opened yet")
@@ -149,7 +647,11 @@ class HDF5Manager():
         return pos
 
     def set_indices(self, d):
+        self._cache.invalidate()
+        self._ragged_ends = dict()
         for k, v in dict(d['curr_pos']).items():
+            if k.endswith(RAGGED_END):
+                continue
             self._index[k] = v
 
         for k, v in dict(d['uidmapping']).items():
@@ -165,54 +667,55 @@ class HDF5Manager():
 
     def initialize_colorimetry(self, length, remove = True):
         if remove:
-            for n in [DS_COL_FEAT,
-                      DS_COL_HIST,
-                      DS_COL_PAL,
-                      DS_COL_TIME,
-                      DS_COL_SPATIAL_EDGE,
-                      DS_COL_SPATIAL_LUMINANCE,
-                      DS_COL_SPATIAL_HUE,
-                      DS_COL_SPATIAL_COLOR]:
+            with HDF5_WRITE_LOCK:
+                self._buffer.discard(DS_COLORIMETRY)
+            for n in DS_COLORIMETRY:
                 if n in self.h5_file:
                     del self.h5_file[n]
             self._index['col'] = 0
+            self._ragged_ends.pop(DS_COL_PAL, None)
 
             gc.collect()
             self.h5_file.flush()
             self.cleanup()
 
-        if DS_COL_HIST not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_HIST, shape=(length, 16, 16, 16), dtype=np.float16)
-        if DS_COL_FEAT not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_FEAT, shape=(length, 8), dtype=np.float16)
         if DS_COL_PAL not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_PAL, shape=(length, 1000, 6), dtype=np.float16)
-        if DS_COL_TIME not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_TIME, shape=(length, 1), dtype=np.uint64)
-
-        if DS_COL_SPATIAL_COLOR not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_SPATIAL_COLOR, shape=(length, 2), dtype=np.float32)
-        if DS_COL_SPATIAL_EDGE not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_SPATIAL_EDGE, shape=(length, 2), dtype=np.float32)
-        if DS_COL_SPATIAL_HUE not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_SPATIAL_HUE, shape=(length, 2), dtype=np.float32)
-        if DS_COL_SPATIAL_LUMINANCE not in self.h5_file:
-            self.h5_file.create_dataset(DS_COL_SPATIAL_LUMINANCE, shape=(length, 2), dtype=np.float32)
-
+            create_ragged_dataset(self.h5_file, DS_COL_PAL, length, (6, ), np.float16, COLORIMETRY_STORAGE[DS_COL_PAL])
+            self._ragged_ends[DS_COL_PAL] = 0
+        self._ragged.pop(DS_COL_PAL, None)
+
+        for name, shape, dtype in [(DS_COL_HIST, (16, 16, 16), np.float16),
+                                   (DS_COL_FEAT, (8, ), np.float16),
+                                   (DS_COL_TIME, (1, ), np.uint64),
+                                   (DS_COL_SPATIAL_COLOR, (2, ), np.float32),
+                                   (DS_COL_SPATIAL_EDGE, (2, ), np.float32),
+                                   (DS_COL_SPATIAL_HUE, (2, ), np.float32),
+                                   (DS_COL_SPATIAL_LUMINANCE, (2, ), np.float32)]:
+            if name not in self.h5_file:
+                shape = (length, ) + shape
+                self.h5_file.create_dataset(name, shape=shape, dtype=dtype,
+                                            **get_storage(shape, dtype, COLORIMETRY_STORAGE.get(name)))
+
+        self._colorimetry_initialized = True
         self.h5_file.flush()
 
     def dump_colorimetry(self, d, idx, length):
-        self.initialize_colorimetry(length, remove=False)
-        self.h5_file[DS_COL_PAL][idx] = d['palette']
-        self.h5_file[DS_COL_HIST][idx] = d['hist']
-        self.h5_file[DS_COL_FEAT][idx] = d['features']
-        self.h5_file[DS_COL_TIME][idx] = d['time_ms']
-        self.h5_file[DS_COL_SPATIAL_EDGE][idx] = d['spatial_edge']
-        self.h5_file[DS_COL_SPATIAL_COLOR][idx] = d['spatial_color']
-        self.h5_file[DS_COL_SPATIAL_HUE][idx] = d['spatial_hue']
-        self.h5_file[DS_COL_SPATIAL_LUMINANCE][idx] = d['spatial_luminance']
-
-        self.h5_file.flush()
+        if not self._colorimetry_initialized:
+            self.initialize_colorimetry(length, remove=False)
+        with HDF5_WRITE_LOCK:
+            if self.is_ragged(DS_COL_PAL):
+                self._put_ragged(DS_COL_PAL, idx, d['palette'])
+            else:
+                self._buffer.put(DS_COL_PAL, idx, self._pad_rows(d['palette'], self.h5_file[DS_COL_PAL].shape[1:]))
+            self._buffer.put(DS_COL_HIST, idx, d['hist'])
+            self._buffer.put(DS_COL_FEAT, idx, d['features'])
+            self._buffer.put(DS_COL_TIME, idx, d['time_ms'])
+            self._buffer.put(DS_COL_SPATIAL_EDGE, idx, d['spatial_edge'])
+            self._buffer.put(DS_COL_SPATIAL_COLOR, idx, d['spatial_color'])
+            self._buffer.put(DS_COL_SPATIAL_HUE, idx, d['spatial_hue'])
+            self._buffer.put(DS_COL_SPATIAL_LUMINANCE, idx, d['spatial_luminance'])
+            if self._buffer.is_due():
+                self._flush()
 
     def dump_audio(self, data):
         self.initialize_dataset("audio", data.shape, data.dtype, dict(
@@ -229,31 +732,42 @@ class HDF5Manager():
             return None
 
     def get_colorimetry_length(self):
+        self._flush_pending(DS_COLORIMETRY)
         return np.where(np.array(self.h5_file[DS_COL_TIME])> 0)[0].shape[0] + 1
 
     def get_colorimetry_times(self):
+        self._flush_pending(DS_COLORIMETRY)
         t = np.reshape(self.h5_file[DS_COL_TIME], newshape=self.h5_file[DS_COL_TIME].shape[0])
         return t
 
     def get_colorimetry_feat(self, idx = None):
+        self._flush_pending(DS_COLORIMETRY)
         if idx is not None:
             return self.h5_file[DS_COL_FEAT][idx]
         else:
             return self.h5_file[DS_COL_FEAT]
 
     def get_colorimetry_pal(self, idx = None):
+        """
+        Returns the palette rows of a sample, or a list of the palettes of all samples if idx is None.
+        """
+        self._flush_pending(DS_COLORIMETRY)
+        if self.is_ragged(DS_COL_PAL):
+            return self.load_ragged(DS_COL_PAL, idx)
         if idx is not None:
             return self.h5_file[DS_COL_PAL][idx]
         else:
-            return self.h5_file[DS_COL_PAL]
+            return list(self.h5_file[DS_COL_PAL][:])
 
     def get_colorimetry_hist(self, idx):
+        self._flush_pending(DS_COLORIMETRY)
         return self.h5_file[DS_COL_HIST][idx]
 
     def get_colorimetry_spatial_max(self):
         if self.h5_file is None:
             return None
         if self.col_edge_max is None:
+            self._flush_pending(DS_COLORIMETRY)
             if DS_COL_SPATIAL_EDGE in self.h5_file:
                 self.col_edge_max = np.amax(self.h5_file[DS_COL_SPATIAL_EDGE][:, 0])
                 self.col_color_max = np.amax(self.h5_file[DS_COL_SPATIAL_COLOR][:, 0])
@@ -265,6 +779,7 @@ class HDF5Manager():
                     luminance=self.col_lum_max)
 
     def get_colorimetry_spatial(self, idx = None):
+        self._flush_pending(DS_COLORIMETRY)
         if idx is None:
             col_edge =self.h5_file[DS_COL_SPATIAL_EDGE]
             col_color = self.h5_file[DS_COL_SPATIAL_COLOR]
@@ -282,30 +797,36 @@ class HDF5Manager():
                     luminance=col_lum)
 
     def col_histograms(self):
+        self._flush_pending(DS_COLORIMETRY)
         return self.h5_file[DS_COL_HIST]
     # endregion
 
     def cleanup(self):
+        self.flush()
+        self._cache.invalidate()
         with HDF5_FILE_LOCK:
             new_file = h5py.File(self.path.replace("analyses", "temp"), mode="w")
             for name in self.h5_file.keys():
-                ds = self.h5_file[name]
-                nds = new_file.create_dataset(name, ds.shape, ds.dtype, maxshape=(None, ) + ds.shape[1:], chunks = True)
-                nds[:] = ds[:]
+                # Datasets keep their layout, get_storage_of() returns their chunks and compression
+                copy_dataset(self.h5_file[name], new_file, name)
             new_file.close()
             self.h5_file.close()
             os.remove(self.path)
             os.rename(self.path.replace("analyses", "temp"), self.path)
             self.h5_file = h5py.File(self.path, "r+")
+            self._ragged = dict()
 
     def get_indices(self):
+        self.flush()
         return dict(curr_pos=self._index, uidmapping=self._uid_index)
 
     def on_close(self):
         if self.h5_file is None:
             return
 
+        self.flush()
         self.h5_file.close()
+        self._cache.invalidate()
 
         self.col_edge_max = None
         self.col_hue_max = None
@@ -316,5 +837,8 @@ class HDF5Manager():
         self.h5_file = None
         self._index = dict()
         self._uid_index = dict()
+        self._colorimetry_initialized = False
+        self._ragged = dict()
+        self._ragged_ends = dict()
         log_info("Closed HDF")
 
@@ -0,0 +1,157 @@
+"""
+A sorted index of the time ranges of segments, screenshots and annotations.
+
+Looking up the segment at the current time or the screenshots of a segment used to scan all
+containers on every timestep. The IntervalIndex keeps the start and end times of its items
+in arrays sorted by the start, such that these queries bisect instead.
+
+The containers are added and removed incrementally, if the time range of a container changes
+the index is invalidated and sorted again on the next query.
+"""
+
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex:
+    """
+    Indexes items which implement ITimeRange.get_start() and get_end().
+
+    *Example*:
+
+    index = IntervalIndex(lambda: segmentation.segments)
+    index.at(1000)
+    """
+    def __init__(self, source):
+        """
+        :param source: a function returning all items, used to rebuild the index once it has been invalidated
+        """
+        self.source = source
+        self._items = []
+        self._starts = []
+        self._ends = []
+
+        # The maximal end of all items up to an index, valid for the first _n_max_ends items
+        self._max_ends = []
+        self._n_max_ends = 0
+        self._valid = False
+
+    def __len__(self):
+        self._update()
+        return len(self._items)
+
+    def invalidate(self):
+        """
+        Has to be called if the time range of an item has changed.
+        """
+        self._valid = False
+
+    def rebuild(self):
+        entries = sorted(((i.get_start(), i.get_end(), i) for i in self.source()), key=lambda e: e[0])
+        self._starts = [e[0] for e in entries]
+        self._ends = [e[1] for e in entries]
+        self._items = [e[2] for e in entries]
+        self._max_ends = []
+        self._n_max_ends = 0
+        self._valid = True
+
+    def add(self, item):
+        """
+        Inserts an item at the position of its start.
+        """
+        if not self._valid:
+            return
+        i = bisect_right(self._starts, item.get_start())
+        self._starts.insert(i, item.get_start())
+        self._ends.insert(i, item.get_end())
+        self._items.insert(i, item)
+        self._n_max_ends = min(self._n_max_ends, i)
+
+    def remove(self, item):
+        """
+        Removes an item, the index is rebuilt on the next query if it can't be found at its start.
+        """
+        if not self._valid:
+            return
+        i = bisect_left(self._starts, item.get_start())
+        while i < len(self._items) and self._starts[i] == item.get_start():
+            if self._items[i] is item:
+                del self._starts[i], self._ends[i], self._items[i]
+                self._n_max_ends = min(self._n_max_ends, i)
+                return
+            i += 1
+        self._valid = False
+
+    def _update(self):
+        if not self._valid:
+            self.rebuild()
+        if self._n_max_ends < len(self._items):
+            n = self._n_max_ends
+            del self._max_ends[n:]
+            m = self._max_ends[-1] if n > 0 else None
+            for e in self._ends[n:]:
+                if m is None or e > m:
+                    m = e
+                self._max_ends.append(m)
+            self._n_max_ends = len(self._items)
+
+    def _overlapping_before(self, i, time, closed):
+        # All items before i with an end after time, the ends up to i are bounded by _max_ends
+        result = []
+        i -= 1
+        if closed:
+            while i >= 0 and self._max_ends[i] >= time:
+                if self._ends[i] >= time:
+                    result.append(self._items[i])
+                i -= 1
+        else:
+            while i >= 0 and self._max_ends[i] > time:
+                if self._ends[i] > time:
+                    result.append(self._items[i])
+                i -= 1
+        result.reverse()
+        return result
+
+    def at(self, time, closed = False):
+        """
+        Returns all items containing a point in time, ordered by their start.
+
+        :param time: the time in ms
+        :param closed: if True, items ending at time are included, else the ranges are half open [start, end)
+        :return: a list of items
+        """
+        self._update()
+        return self._overlapping_before(bisect_right(self._starts, time), time, closed)
+
+    def overlapping(self, start, end, closed = False):
+        """
+        Returns all items overlapping a time range, ordered by their start.
+
+        :param start: the start of the range in ms
+        :param end: the end of the range in ms
+        :param closed: if True, items touching the range are included
+        :return: a list of items
+        """
+        self._update()
+        i = bisect_right(self._starts, end) if closed else bisect_left(self._starts, end)
+        return self._overlapping_before(i, start, closed)
+
+    def starting_in(self, start, end):
+        """
+        Returns all items which start within [start, end), e.g. the screenshots of a segment.
+        """
+        self._update()
+        return self._items[bisect_left(self._starts, start):bisect_left(self._starts, end)]
+
+    def nearest(self, time):
+        """
+        Returns the item with the start closest to time, or None if the index is empty.
+        """
+        self._update()
+        if len(self._items) == 0:
+            return None
+        i = bisect_left(self._starts, time)
+        if i == len(self._items):
+            return self._items[-1]
+        if i > 0 and time - self._starts[i - 1] <= self._starts[i] - time:
+            return self._items[i - 1]
+        return self._items[i]
@@ -0,0 +1,228 @@
+"""
+An append-only journal of the changes made to a VIANProject since it has been stored completely.
+
+VIANProject.store_project() serializes all containers and rewrites the whole .eext file.
+Instead, the project collects the containers which have been changed, and VIANProject.store_journal()
+only appends their serializations to the journal next to the project file. When the project is loaded,
+the journal is replayed onto the stored json. Once the journal has become large, the project is stored
+completely, which compacts the journal.
+
+Every record is a json object on its own line:
+
+    {"op": "set", "section": "segmentation", "unique_id": ..., "data": {...}}
+    {"op": "set", "section": "segmentation", "parent": ..., "key": "segments", "unique_id": ..., "data": {...}}
+    {"op": "remove", "section": "screenshots", "unique_id": ...}
+    {"op": "tag", "experiment": ..., "target": ..., "keyword": ...}
+    {"op": "untag", "experiment": ..., "target": ..., "keyword": ...}
+    {"op": "update", "data": {...}}
+    {"op": "indices", "curr_pos": {...}, "uidmapping": {...}}
+
+All records describe the state after the change, replaying a record twice has no further effect.
+"""
+
+import os
+import json
+
+from core.data.log import log_info, log_warning
+
+JOURNAL_EXTENSION = ".journal"
+
+# The journal is compacted if it has more records than COMPACT_RECORDS
+# or if it is larger than COMPACT_RATIO times the size of the project file.
+COMPACT_RECORDS = 20000
+COMPACT_RATIO = 0.5
+
+
+class ProjectJournal:
+    def __init__(self, path):
+        """
+        :param path: the path of the .journal file
+        """
+        self.path = path
+        self._n_records = None
+
+    def __len__(self):
+        if self._n_records is None:
+            self._n_records = len(self.read())
+        return self._n_records
+
+    def size(self):
+        """
+        Returns the size of the journal in bytes, which is also the offset the next record is written to.
+        """
+        if not os.path.isfile(self.path):
+            return 0
+        return os.path.getsize(self.path)
+
+    def append(self, records):
+        """
+        Appends a list of records to the journal.
+        """
+        if len(records) == 0:
+            return
+        lines = "".join(json.dumps(r) + "\n" for r in records)
+        n = len(self)
+        with open(self.path, "a") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._n_records = n + len(records)
+
+    def read(self):
+        """
+        Returns all records of the journal. A partially written last record, e.g. after a crash, is ignored.
+        """
+        records = []
+        if not os.path.isfile(self.path):
+            return records
+        with open(self.path, "r") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    log_warning("Ignoring incomplete record at the end of", self.path)
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    log_warning("Ignoring corrupt record in", self.path)
+                    break
+        return records
+
+    def truncate(self, offset = None):
+        """
+        Removes all records which have been written before offset. Records appended after the
+        offset has been taken, e.g. while the project has been stored in the background, are kept.
+
+        :param offset: a size as returned by ProjectJournal.size(), if None the journal is removed completely
+        """
+        size = self.size()
+        if size == 0:
+            return
+        if offset is None or offset >= size:
+            os.remove(self.path)
+            self._n_records = 0
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+        with open(self.path + ".tmp", "wb") as f:
+            f.write(tail)
+        os.replace(self.path + ".tmp", self.path)
+        self._n_records = None
+
+    def needs_compaction(self, project_size):
+        """
+        Returns True if the journal has grown large compared to the project file.
+
+        :param project_size: the size of the .eext file in bytes
+        """
+        return len(self) > COMPACT_RECORDS or self.size() > COMPACT_RATIO * project_size
+
+    def replay(self, data):
+        """
+        Applies all records of the journal to a project serialization.
+
+        :param data: the dict loaded from the .eext file, modified in place
+        :return: the number of records applied
+        """
+        records = self.read()
+        if len(records) == 0:
+            return 0
+
+        replay = _Replay(data)
+        for r in records:
+            replay.apply(r)
+        replay.finish()
+
+        log_info("Replayed", len(records), "journal records of", self.path)
+        return len(records)
+
+
+def _result_key(entry):
+    # Classification results are stored as dicts, old projects contain [target, keyword] lists
+    if isinstance(entry, dict):
+        return entry['target'], entry['keyword']
+    return entry[0], entry[1]
+
+
+class _Replay:
+    """
+    Applies records to a project serialization. The lists of entries which are touched
+    are indexed by their unique_id once and written back by finish().
+    """
+    def __init__(self, data):
+        self.data = data
+        self.lists = dict()     # (section, parent, key): (owner dict, key, {unique_id: entry})
+        self.results = dict()   # experiment unique_id: (experiment dict, {(target, keyword): entry})
+
+        # Renaming the old analyzes to analyses due to a typo, as in VIANProject.load_project()
+        if "analyses" not in data and "analyzes" in data:
+            data['analyses'] = data.pop("analyzes")
+
+    def entries(self, section, parent = None, key = None):
+        k = (section, parent, key)
+        if k not in self.lists:
+            if parent is None:
+                owner, name = self.data, section
+            else:
+                owner, name = self.entries(section).get(parent), key
+                if owner is None:
+                    return None
+            self.lists[k] = (owner, name, dict((e['unique_id'], e) for e in owner.get(name, [])))
+        return self.lists[k][2]
+
+    def apply(self, r):
+        op = r['op']
+        if op == "set" or op == "remove":
+            entries = self.entries(r['section'], r.get('parent'), r.get('key'))
+            if entries is None:
+                return
+            if op == "set":
+                entries[r['unique_id']] = r['data']
+            else:
+                entries.pop(r['unique_id'], None)
+            # Indices of the children of a replaced entry are outdated
+            if r.get('parent') is None:
+                for k in [k for k in self.lists.keys() if k[0] == r['section'] and k[1] == r['unique_id']]:
+                    self.lists.pop(k)
+                if r['section'] == "experiments":
+                    self.results.pop(r['unique_id'], None)
+
+        elif op == "tag" or op == "untag":
+            results = self.classification_results(r['experiment'])
+            if results is None:
+                return
+            key = (r['target'], r['keyword'])
+            if op == "tag":
+                if key not in results:
+                    results[key] = dict(target=r['target'], keyword=r['keyword'])
+            else:
+                results.pop(key, None)
+
+        elif op == "update":
+            self.data.update(r['data'])
+
+        elif op == "indices":
+            indices = self.data.setdefault('hdf_indices', dict(curr_pos=dict(), uidmapping=dict()))
+            indices['curr_pos'].update(r['curr_pos'])
+            indices['uidmapping'].update(r['uidmapping'])
+
+    def classification_results(self, experiment_id):
+        if experiment_id not in self.results:
+            experiment = self.entries("experiments").get(experiment_id)
+            if experiment is None:
+                return None
+            results = dict((_result_key(e), e) for e in experiment.get('classification_results', []))
+            self.results[experiment_id] = (experiment, results)
+        return self.results[experiment_id][1]
+
+    def _write_back(self, entry):
+        owner, name, entries = entry
+        owner[name] = list(entries.values())
+
+    def finish(self):
+        for experiment, results in self.results.values():
+            experiment['classification_results'] = list(results.values())
+        # Children are written into their parent entries before the parents are written back
+        for k in sorted(self.lists.keys(), key=lambda k: k[1] is None):
+            self._write_back(self.lists[k])
@@ -8,6 +8,7 @@ from core.data.computation import ms_to_string, ms_to_frames
 from core.data.enums import MOVIE_DESCRIPTOR
 
 from core.data.log import log_error
+from core.data.fingerprint import movie_fingerprint, fingerprint_key
 from .container_interfaces import IProjectContainer, ISelectable, IHasName, ITimeRange, \
     AutomatedTextSource, IClassifiable
 
@@ -30,6 +31,8 @@ class MovieDescriptor(IProjectContainer, ISelectable, IHasName, ITimeRange, Auto
     :var duration: Duration of the Movie in MS
     :var notes: Additinoal notes added in the Inspector
     :var fps: The float FPS
+    :var fingerprint: The fingerprint of the movie file as returned by movie_fingerprint()
+    :var fingerprint_stat: The size and mtime of the movie file when the fingerprint has been computed
 
     """
     def __init__(self, project, movie_name="No Movie Name", movie_path="", movie_id="0_0_0", year=1800, source="",
@@ -48,6 +51,8 @@ class MovieDescriptor(IProjectContainer, ISelectable, IHasName, ITimeRange, Auto
         # self.is_relative = False
         self.meta_data = dict()
         self.letterbox_rect = None
+        self.fingerprint = None
+        self.fingerprint_stat = None
 
         self.display_width = None
         self.display_height = None
@@ -74,7 +79,9 @@ class MovieDescriptor(IProjectContainer, ISelectable, IHasName, ITimeRange, Auto
             notes=self.notes,
             # is_relative = self.is_relative,
             meta_data = self.meta_data,
-            letterbox_rect = self.letterbox_rect
+            letterbox_rect = self.letterbox_rect,
+            fingerprint = self.fingerprint,
+            fingerprint_stat = self.fingerprint_stat
         )
 
         return data
@@ -130,14 +137,29 @@ class MovieDescriptor(IProjectContainer, ISelectable, IHasName, ITimeRange, Auto
         """
 
         self.movie_path = os.path.normpath(path)
+        self.fingerprint = None
         self.parse_movie()
         return self.movie_path
 
+    def get_fingerprint_key(self):
+        """
+        Returns the key of the movie fingerprint, used to key the caches derived from the movie.
+        """
+        return fingerprint_key(self.fingerprint)
+
     def parse_movie(self):
         if os.path.isfile(self.get_movie_path()):
             cap = cv2.VideoCapture(self.get_movie_path())
             self.fps = cap.get(cv2.CAP_PROP_FPS)
             self.display_width, self.display_height = self.get_frame_dimensions()
+
+            # Projects keep the fingerprint if the movie is moved,
+            # it is only recomputed if the size or mtime of the file have changed
+            stat = os.stat(self.get_movie_path())
+            fingerprint_stat = dict(size=stat.st_size, mtime=int(stat.st_mtime))
+            if self.fingerprint is None or self.fingerprint_stat != fingerprint_stat:
+                self.fingerprint = movie_fingerprint(self.get_movie_path())
+                self.fingerprint_stat = fingerprint_stat
         else:
             self.fps = 30
             self.display_height = None
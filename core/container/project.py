@@ -1,7 +1,7 @@
 # from core.node_editor.node_editor import *
 from shutil import copy2
 from typing import Union
-from threading import Lock
+from threading import Lock, RLock
 from uuid import uuid4
 
 from PyQt5.QtCore import QObject
@@ -14,7 +14,11 @@ from core.data.enums import *
 
 from .media_descriptor import MovieDescriptor
 from .hdf5_manager import HDF5Manager
+from core.data.proxy_cache import ProxyFrameCache
+from core.data.frame_source import FrameSource
 from .undo_redo_manager import UndoRedoManager
+from .journal import ProjectJournal, JOURNAL_EXTENSION
+from .interval_index import IntervalIndex
 from .annotation import *
 from .segmentation import *
 from .screenshot import *
@@ -115,6 +119,16 @@ class VIANProject(QObject, IHasName, IClassifiable):
         IClassifiable.__init__(self)
         QObject.__init__(self)
         self.undo_manager = UndoRedoManager()
+
+        # The containers changed since the project has been stored, written to the journal by store_journal()
+        self._journal = None                    # type: Union[ProjectJournal|None]
+        self._journal_changes = dict()
+        self._journal_tags = []
+        self._journal_project_changed = False
+        self._journal_incomplete = False
+        self._journal_enabled = True
+        self.undo_manager.on_operation.connect(self._on_undo_operation)
+
         # self.streamer = main_window.project_streamer
         self.inhibit_dispatch = True
 
@@ -131,11 +145,17 @@ class VIANProject(QObject, IHasName, IClassifiable):
         self.uuid = str(uuid4())
         self.id_list = dict()
 
+        # Serializations of the analyses a lazily loaded project hasn't deserialized yet, by the id of their container
+        self.pending_analyses = dict()
+        self._pending_analysis_ids = dict()
+        self._pending_lock = RLock()
+
         self.meta_data = dict()
 
         self.annotation_layers = []             # type: List[AnnotationLayer]
         self.current_annotation_layer = None    # type: AnnotationLayer
         self.screenshots = []                   # type: List[Screenshot]
+        self._screenshot_index = IntervalIndex(lambda: self.screenshots)
         self.segmentation = []                  # type: List[Segmentation]
         self.main_segmentation_index = 0
         self.movie_descriptor = MovieDescriptor(project=self)
@@ -166,6 +186,9 @@ class VIANProject(QObject, IHasName, IClassifiable):
 
         self.hdf5_manager = None
         self.hdf5_indices_loaded = dict(curr_pos=dict(), uidmapping=dict())
+        self.proxy_cache = None                 # type: Union[ProxyFrameCache|None]
+        self._frame_source = None               # type: Union[FrameSource|None]
+        self._frame_source_lock = Lock()
 
         self.inhibit_dispatch = False
         self.selected = []
@@ -219,6 +242,8 @@ class VIANProject(QObject, IHasName, IClassifiable):
             return os.path.join(directory, str(entity.unique_id) + file_extension)
 
     def get_all_containers(self, types = None):
+        if len(self.pending_analyses) > 0:
+            self.materialize_analyses()
         result = []
         if types is None:
             for itm in self.id_list.values():
@@ -269,8 +294,49 @@ class VIANProject(QObject, IHasName, IClassifiable):
         needs_init = self.hdf5_manager.set_path(self.hdf5_path)
         if needs_init:
             self.hdf5_manager.initialize_all()
+        self.proxy_cache = ProxyFrameCache(self.data_dir)
         return self.hdf5_manager
 
+    def get_proxy_cache(self, margins = None) -> ProxyFrameCache:
+        """
+        Returns the ProxyFrameCache of the project if it has been completely filled for the given 
+        letterbox margins, else None.
+
+        :param margins: The letterbox rect, if None the current one of the movie descriptor is used.
+        :return: a ProxyFrameCache instance or None
+        """
+        if margins is None:
+            margins = self.movie_descriptor.get_letterbox_rect()
+        if self.proxy_cache is not None and \
+                self.proxy_cache.is_valid(margins, fingerprint=self.movie_descriptor.get_fingerprint_key()):
+            return self.proxy_cache
+        return None
+
+    def read_movie_frame(self, frame_pos):
+        """
+        Reads a frame of the movie from a FrameSource kept open by the project, such that
+        e.g. screenshots can load their image when it is first needed.
+
+        :param frame_pos: The index of the frame
+        :return: the frame or None if it could not be read
+        """
+        movie_path = self.movie_descriptor.get_movie_path()
+        with self._frame_source_lock:
+            if self._frame_source is None or self._frame_source.movie_path != movie_path:
+                if self._frame_source is not None:
+                    self._frame_source.release()
+                self._frame_source = FrameSource(movie_path)
+            return self._frame_source.read_frame(frame_pos)
+
+    def release_frame_source(self):
+        """
+        Closes the movie opened by read_movie_frame().
+        """
+        with self._frame_source_lock:
+            if self._frame_source is not None:
+                self._frame_source.release()
+                self._frame_source = None
+
     def set_active_classification_object(self, cl_obj:ClassificationObject) -> ClassificationObject:
         """
         Set the currently active (therefore in the gui visualized) classification object.
@@ -510,6 +576,7 @@ class VIANProject(QObject, IHasName, IClassifiable):
 
         """
         self.segment_screenshot_mapping = dict()
+        self._screenshot_index.invalidate()
         if self.get_main_segmentation():
             self.get_main_segmentation().update_segment_ids()
             self.screenshots.sort(key=lambda x: x.movie_timestamp, reverse=False)
@@ -608,15 +675,7 @@ class VIANProject(QObject, IHasName, IClassifiable):
         :param segmentation:
         :return:
         """
-        result = []
-        start = segment.get_start()
-        end = segment.get_end()
-
-        for s in self.screenshots:
-            if start <= s.movie_timestamp < end:
-                result.append(s)
-
-        return result
+        return self._screenshot_index.starting_in(segment.get_start(), segment.get_end())
 
     def set_current_screenshot_group(self, grp) -> ScreenshotGroup:
         """
@@ -642,6 +701,62 @@ class VIANProject(QObject, IHasName, IClassifiable):
     #     self.add_analysis(analysis)
     #     return analysis
 
+    @property
+    def analysis(self) -> List[AnalysisContainer]:
+        # All analyses of a lazily loaded project are deserialized if the complete list is accessed
+        if len(self.pending_analyses) > 0:
+            self.materialize_analyses()
+        return self._analysis
+
+    @analysis.setter
+    def analysis(self, value):
+        self._analysis = value
+
+    def get_loaded_analyses(self) -> List[AnalysisContainer]:
+        """
+        Returns the AnalysisContainers which have already been deserialized, without loading pending ones.
+
+        :return: a list of AnalysisContainer instances
+        """
+        return self._analysis
+
+    def get_pending_analyses(self) -> List[dict]:
+        """
+        Returns the serializations of the analyses which have not been deserialized yet.
+
+        :return: a list of analysis serializations
+        """
+        result = []
+        for serializations in self.pending_analyses.values():
+            result.extend(serializations)
+        return result
+
+    def materialize_analyses(self, container_id = None):
+        """
+        Deserializes the analyses whose loading has been deferred by load_project(lazy=True).
+
+        :param container_id: The unique_id of the container whose analyses should be loaded, if None all are loaded.
+        :return: None
+        """
+        with self._pending_lock:
+            if container_id is None:
+                pending = list(self.pending_analyses.values())
+                self.pending_analyses = dict()
+            elif container_id in self.pending_analyses:
+                pending = [self.pending_analyses.pop(container_id)]
+            else:
+                return
+
+            with self.undo_manager.suspended():
+                for serializations in pending:
+                    for d in serializations:
+                        self._pending_analysis_ids.pop(d['unique_id'], None)
+                        try:
+                            t = deprecation_serialization(d, ['vian_serialization_type', 'analysis_container_class'])
+                            self.add_analysis(eval(t)().deserialize(d, self))
+                        except Exception as e:
+                            print("Exception in Load Analyses", str(e))
+
     def add_analysis(self, analysis:AnalysisContainer, dispatch = False) -> AnalysisContainer:
         """
         Adds an AnalysisContainer instance to the project.
@@ -652,7 +767,7 @@ class VIANProject(QObject, IHasName, IClassifiable):
         """
 
         analysis.set_project(self)
-        self.analysis.append(analysis)
+        self._analysis.append(analysis)
 
         # if the analysis has no target, it is global, thus we have to check such an analysis has
         # already been created before and replace it if so.
@@ -677,8 +792,8 @@ class VIANProject(QObject, IHasName, IClassifiable):
         :param analysis: The AnalysisContainer instance to remove.
         :return: None
         """
-        if analysis in self.analysis:
-            self.analysis.remove(analysis)
+        if analysis in self._analysis:
+            self._analysis.remove(analysis)
 
             if isinstance(analysis, IAnalysisJobAnalysis):
                 analysis.cleanup()
@@ -702,6 +817,38 @@ class VIANProject(QObject, IHasName, IClassifiable):
                 result.append(a)
         return result
 
+    def get_analyses_data(self, analyses:List[IAnalysisJobAnalysis]) -> List:
+        """
+        Returns the data of several analyses as returned by get_adata(), but reads the rows of each dataset at once,
+        see HDF5Manager.load_many().
+
+        :param analyses: a list of IAnalysisJobAnalysis, may contain None
+        :return: a list of the data in the order of analyses, None for analyses which are not stored
+        """
+        result = [None] * len(analyses)
+        by_dataset = dict()
+        for i, a in enumerate(analyses):
+            if a is None:
+                continue
+            if a.a_class is None:
+                a.a_class = get_analysis_by_name(a.analysis_job_class)
+            if a.a_class is not None and a.a_class().data_serialization == DataSerialization.HDF5_MULTIPLE:
+                by_dataset.setdefault(a.a_class().dataset_name, []).append(i)
+            else:
+                try:
+                    result[i] = a.get_adata()
+                except Exception as e:
+                    log_warning("Could not load analysis", a.unique_id, e)
+
+        for dataset_name, indices in by_dataset.items():
+            rows, ids = self.hdf5_manager.load_many([analyses[i].unique_id for i in indices])
+            rows = dict(zip(ids, rows))
+            for i in indices:
+                row = rows.get(str(analyses[i].unique_id))
+                if row is not None:
+                    result[i] = analyses[i].adata_from_hdf5(row)
+        return result
+
     # def has_analysis(self, class_name):
     #     for a in self.analysis:
     #         if isinstance(a, IAnalysisJobAnalysis):
@@ -979,19 +1126,31 @@ class VIANProject(QObject, IHasName, IClassifiable):
             )
         return result
 
+    def _get_analysis_keys(self, container):
+        """
+        Returns a list of (analysis_job_class, target_classification_object) of all analyses of a container,
+        pending analyses are read from their serialization instead of being deserialized.
+        """
+        result = [(a.analysis_job_class, a.target_classification_object) for a in container.get_loaded_analyses()]
+        for d in self.pending_analyses.get(container.unique_id, []):
+            result.append((deprecation_serialization(d, ['vian_analysis_type', 'analysis_job_class']),
+                           self.get_by_id(d['classification_obj'])))
+        return result
+
     def _get_missing_analyses_for_container(self, containers, requirements):
         missing_analyses = dict()
         n_analyses = len(containers) * len(requirements)
         n_analyses_done = 0
 
         for c in containers:
+            existing = self._get_analysis_keys(c)
             for (analysis_name, class_obj_name, priority) in requirements:
                 found = False
 
-                for a in c.connected_analyses:
-                    if a.target_classification_object is None:
+                for (job_class, class_obj) in existing:
+                    if class_obj is None:
                         continue
-                    if a.analysis_job_class == analysis_name and a.target_classification_object.name == class_obj_name:
+                    if job_class == analysis_name and class_obj.name == class_obj_name:
                         found = True
                         break
                 if found:
@@ -1049,8 +1208,12 @@ class VIANProject(QObject, IHasName, IClassifiable):
         for c in project.segmentation:
             segmentations.append(c.serialize())
 
-        for d in project.analysis:
+        # Pending analyses of a lazily loaded project are stored as they have been loaded
+        if bake:
+            project.materialize_analyses()
+        for d in project.get_loaded_analyses():
             analyses.append(d.serialize(bake=bake))
+        analyses.extend(project.get_pending_analyses())
 
         for e in project.screenshot_groups:
             screenshot_groups.append(e.serialize())
@@ -1102,19 +1265,27 @@ class VIANProject(QObject, IHasName, IClassifiable):
                     with open(self.get_bake_path(self.name, ".json"), 'w') as f:
                         json.dump(data, f)
                 else:
-                    with open(project_path, 'w') as f:
+                    # The file is replaced once it is written completely, the journal is compacted into it
+                    journal_offset = self.begin_full_store()
+                    with open(project_path + ".tmp", 'w') as f:
                         json.dump(data, f)
+                    os.replace(project_path + ".tmp", project_path)
+                    self.compact_journal(project_path, journal_offset)
             except Exception as e:
                 print("Exception during Storing: ", str(e))
+                if not bake:
+                    self.abort_full_store()
                 raise e
         log_info("Project Stored to", path)
 
-    def load_project(self, path=None, main_window = None, serialization = None, library=None):
+    def load_project(self, path=None, main_window = None, serialization = None, library=None, lazy = False):
         """
         Loads a project from a given file.
 
         :param settings:
         :param path:
+        :param lazy: if True, the analyses of segments, screenshots and annotations are kept serialized
+        and only deserialized when they are accessed, see materialize_analyses()
         :return:
         """
         if path is not None:
@@ -1129,10 +1300,15 @@ class VIANProject(QObject, IHasName, IClassifiable):
             print("Reading From", os.path.abspath(path))
             with open(path) as f:
                 my_dict = json.load(f)
+            # Applying the changes which have been journaled since the project has been stored
+            self.get_journal(path).replay(my_dict)
         else:
             has_file = False
             my_dict = serialization
 
+        # The containers are not changed by loading them
+        self._journal_enabled = False
+
         self.path = my_dict['path']
         self.path = path
         self.name = my_dict['name']
@@ -1223,6 +1399,7 @@ class VIANProject(QObject, IHasName, IClassifiable):
             except Exception as e:
                 print("Exception during hdf5_manager.set_indices(): ", e)
                 self.hdf5_manager.initialize_all()
+            self.proxy_cache = ProxyFrameCache(self.data_dir)
         else:
             print("No HDF5 File")
 
@@ -1295,6 +1472,11 @@ class VIANProject(QObject, IHasName, IClassifiable):
             analyses_fix = "analyzes"
         for d in my_dict[analyses_fix]:
             if d is not None:
+                container_id = d.get('container', -1)
+                if lazy and container_id in self.id_list:
+                    self.pending_analyses.setdefault(container_id, []).append(d)
+                    self._pending_analysis_ids[d['unique_id']] = container_id
+                    continue
                 try:
                     t = deprecation_serialization(d, ['vian_serialization_type', 'analysis_container_class'])
                     new = eval(t)().deserialize(d, self)
@@ -1314,7 +1496,9 @@ class VIANProject(QObject, IHasName, IClassifiable):
                     print("Exception in Load Analyses", str(e))
 
         if self.colormetry_analysis is not None:
-            if not self.hdf5_manager.has_colorimetry():
+            # The colorimetry is recomputed if it has been computed for another movie file
+            if not self.hdf5_manager.has_colorimetry() or \
+                    not self.colormetry_analysis.matches_movie(self.movie_descriptor.get_fingerprint_key()):
                 self.colormetry_analysis.clear()
         else:
             self.create_colormetry()
@@ -1324,6 +1508,8 @@ class VIANProject(QObject, IHasName, IClassifiable):
         if has_file:
             self.sanitize_paths()
 
+        self._reset_journal_changes()
+        self._journal_enabled = True
         return self
 
     def get_template(self, segm = True, voc = True, ann = True, scripts = False, experiment = True, pipeline=True):
@@ -1483,6 +1669,9 @@ class VIANProject(QObject, IHasName, IClassifiable):
     def close(self):
         if self.hdf5_manager is not None:
             self.hdf5_manager.on_close()
+        if self.proxy_cache is not None:
+            self.proxy_cache.release()
+        self.release_frame_source()
     #endregion
 
     #region Vocabularies
@@ -1765,6 +1954,9 @@ class VIANProject(QObject, IHasName, IClassifiable):
                     w.widget.close()
         if self.hdf5_manager is not None:
             self.hdf5_manager.on_close()
+        if self.proxy_cache is not None:
+            self.proxy_cache.release()
+        self.release_frame_source()
         # if self.hdf5_manager is not None:
         #     self.clean_hdf5()
 
@@ -1797,6 +1989,8 @@ class VIANProject(QObject, IHasName, IClassifiable):
                 print(e)
                 continue
 
+        new_h5.flush()
+        self.hdf5_manager.flush()
         self.hdf5_manager.h5_file.close()
         new_h5.h5_file.close()
         os.remove(self.hdf5_manager.path)
@@ -1849,6 +2043,8 @@ class VIANProject(QObject, IHasName, IClassifiable):
         :param id: IProjectContainer.unique_id
         :return: 
         """
+        if item_id in self._pending_analysis_ids:
+            self.materialize_analyses(self._pending_analysis_ids[item_id])
         if item_id in self.id_list:
             return self.id_list[item_id]
         else:
@@ -1906,8 +2102,206 @@ class VIANProject(QObject, IHasName, IClassifiable):
 
     #endregion
 
+    #region Journal
+    def get_journal(self, path = None) -> ProjectJournal:
+        """
+        Returns the journal next to a project file.
+
+        :param path: the path of the .eext file, by default the path of this project
+        :return: a ProjectJournal
+        """
+        if path is None:
+            path = self.path
+        journal_path = os.path.normpath(path.replace(VIAN_PROJECT_EXTENSION, "") + JOURNAL_EXTENSION)
+        if self._journal is None or self._journal.path != journal_path:
+            self._journal = ProjectJournal(journal_path)
+        return self._journal
+
+    def mark_changed(self, container):
+        """
+        Marks a container as changed, such that the next store_journal() writes it to the journal.
+
+        :param container: an IProjectContainer, the project or its MovieDescriptor
+        """
+        if not self._journal_enabled or container is None:
+            return
+        if container is self or isinstance(container, MovieDescriptor):
+            self._journal_project_changed = True
+        elif isinstance(container, IProjectContainer):
+            # Keyed by the object, since containers which have not been added yet have no unique_id
+            self._journal_changes[id(container)] = container
+
+    def mark_tagged(self, experiment, container, keyword, tagged = True):
+        """
+        Records that a container has been tagged with a keyword or that the tag has been removed.
+        """
+        if not self._journal_enabled:
+            return
+        self._journal_tags.append(dict(op="tag" if tagged else "untag", experiment=experiment.unique_id,
+                                       target=container.unique_id, keyword=keyword.unique_id))
+
+    def _on_undo_operation(self, redo, undo):
+        # Every undoable operation changes the containers it is called on or with
+        for func, args in (redo, undo):
+            self.mark_changed(getattr(func, "__self__", None))
+            for a in args:
+                self.mark_changed(a)
+
+    def _reset_journal_changes(self):
+        self._journal_changes = dict()
+        self._journal_tags = []
+        self._journal_project_changed = False
+        self._journal_incomplete = False
+
+    def begin_full_store(self):
+        """
+        Called before the complete project is serialized, the changes collected so far are contained in it.
+
+        :return: the offset of the journal to pass to compact_journal() once the project is stored
+        """
+        self._reset_journal_changes()
+        if self.path is None:
+            return None
+        return self.get_journal().size()
+
+    def abort_full_store(self):
+        """
+        Called if a store started by begin_full_store() has failed. The changes collected before
+        are neither in the project file nor in the journal, the next autosave stores the project completely.
+        """
+        self._journal_incomplete = True
+
+    def compact_journal(self, project_path, journal_offset):
+        """
+        Removes the records of the journal which are contained in the project file stored at project_path.
+
+        :param project_path: the path of the stored .eext file
+        :param journal_offset: the offset returned by begin_full_store()
+        """
+        journal = self.get_journal(project_path)
+        if self.path is not None and journal.path == self.get_journal().path:
+            journal.truncate(journal_offset)
+        else:
+            journal.truncate()
+
+    def store_journal(self):
+        """
+        Appends the changes made since the project has been stored to its journal, instead of storing
+        the complete project. If the changes can't be journaled or the journal has grown large,
+        the project has to be stored completely by store_project() or store_project_concurrent().
+
+        :return: True if the changes have been written to the journal
+        """
+        if self.path is None or not os.path.isfile(self.path) or self._journal_incomplete:
+            return False
+        journal = self.get_journal()
+        if journal.needs_compaction(os.path.getsize(self.path)):
+            return False
+
+        records = self._get_journal_records()
+        if records is None:
+            self._journal_incomplete = True
+            return False
+        journal.append(records)
+        self._journal_changes = dict()
+        self._journal_tags = []
+        self._journal_project_changed = False
+        return True
+
+    def _get_journal_records(self):
+        records = []
+        if self._journal_project_changed:
+            records.append(dict(op="update", data=dict(
+                name=self.name,
+                notes=self.notes,
+                corpus_id=self.corpus_id,
+                main_segmentation_index=self.main_segmentation_index,
+                meta_data=self.meta_data,
+                movie_descriptor=self.movie_descriptor.serialize()
+            )))
+
+        sections = dict()
+        analyses = []
+        for container in self._journal_changes.values():
+            record = self._get_journal_record(container, sections)
+            if record is None:
+                return None
+            records.append(record)
+            if record['section'] == "analyses" and record['op'] == "set":
+                analyses.append(container.unique_id)
+        records.extend(self._journal_tags)
+
+        # The positions of the analyses in the hdf5 file, which is flushed by get_indices()
+        if len(analyses) > 0 and self.hdf5_manager is not None:
+            indices = self.hdf5_manager.get_indices()
+            uidmapping = dict((uid, indices['uidmapping'][uid]) for uid in analyses if uid in indices['uidmapping'])
+            records.append(dict(op="indices", curr_pos=indices['curr_pos'], uidmapping=uidmapping))
+        return records
+
+    def _get_journal_record(self, container, sections):
+        """
+        Returns the record of a changed container, it is set if the container is part of the project and removed
+        otherwise. Returns None for containers which are not journaled.
+        """
+        def contains(section, items, c):
+            if section not in sections:
+                sections[section] = set(id(i) for i in items)
+            return id(c) in sections[section]
+
+        if isinstance(container, Segment):
+            parent, section, key, parents = container.segmentation, "segmentation", "segments", self.segmentation
+        elif isinstance(container, Annotation):
+            parent, section, key, parents = container.annotation_layer, "annotation_layers", "annotations", \
+                                            self.annotation_layers
+        else:
+            parent = None
+
+        if parent is not None:
+            record = dict(section=section, parent=parent.unique_id, key=key, unique_id=container.unique_id)
+            if contains(section, parents, parent) and contains((section, parent.unique_id), getattr(parent, key), container):
+                record.update(op="set", data=container.serialize())
+            else:
+                record.update(op="remove")
+            return record
+
+        # Words and classification objects are stored as part of their vocabulary and experiment
+        if isinstance(container, VocabularyWord):
+            container = container.vocabulary
+        elif isinstance(container, (ClassificationObject, UniqueKeyword)):
+            container = container.experiment
+
+        if isinstance(container, Segmentation):
+            section, items = "segmentation", self.segmentation
+        elif isinstance(container, Screenshot):
+            section, items = "screenshots", self.screenshots
+        elif isinstance(container, ScreenshotGroup):
+            section, items = "screenshot_groups", self.screenshot_groups
+        elif isinstance(container, AnnotationLayer):
+            section, items = "annotation_layers", self.annotation_layers
+        elif isinstance(container, Experiment):
+            section, items = "experiments", self.experiments
+        elif isinstance(container, Vocabulary):
+            section, items = "vocabularies", self.vocabularies
+        elif isinstance(container, AnalysisContainer):
+            section, items = "analyses", self._analysis
+        else:
+            return None
+
+        record = dict(section=section, unique_id=container.unique_id)
+        if contains(section, items, container):
+            data = container.serialize()
+            # Screenshots return their serialization together with their image
+            if isinstance(container, Screenshot):
+                data = data[0]
+            record.update(op="set", data=data)
+        else:
+            record.update(op="remove")
+        return record
+    #endregion
+
     #region Dispatchers
     def dispatch_changed(self, receiver = None, item = None):
+        self.mark_changed(item)
         if self.inhibit_dispatch is False:
             self.onProjectChanged.emit(receiver, item)
 
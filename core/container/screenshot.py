@@ -57,6 +57,7 @@ class Screenshot(IProjectContainer, IHasName, ITimeRange, ISelectable, ITimeline
         self.display_height = display_height
 
         self.img_movie = None
+        self._img_pending = False
         self.set_img_movie(image)
 
         # TODO this is related to containers.Annotations and no longer of any use,
@@ -123,6 +124,7 @@ class Screenshot(IProjectContainer, IHasName, ITimeRange, ISelectable, ITimeline
         return self.preview_cache
 
     def set_classification_object(self, clobj, recompute=False, hdf5_cache=None):
+        self.load_img_movie()
         if not recompute and clobj.unique_id in self.masked_cache:
             result = self.masked_cache[clobj.unique_id]
         elif clobj is None or clobj.semantic_segmentation_labels[0] == "":
@@ -149,7 +151,12 @@ class Screenshot(IProjectContainer, IHasName, ITimeRange, ISelectable, ITimeline
             self.onImageSet.emit(self, result, numpy_to_pixmap(result, cvt=cv2.COLOR_BGRA2RGBA, with_alpha=True))
         return result
 
-    def get_img_movie(self, ignore_cl_obj=False):
+    def get_img_movie(self, ignore_cl_obj=False, load=True):
+        """
+        :param load: if False, the placeholder is returned while the frame has not been read yet
+        """
+        if load:
+            self.load_img_movie()
         if not ignore_cl_obj:
             try:
                 return self.masked_cache[self.project.active_classification_object.unique_id]
@@ -173,6 +180,7 @@ class Screenshot(IProjectContainer, IHasName, ITimeRange, ISelectable, ITimeline
 
         # Resize the image to the CACHE_WIDTH (250px wide)
         self.img_movie = resize_with_aspect(img, width = CACHE_WIDTH)
+        self._img_pending = False
 
         if img.shape[2] == 3:
             self.onImageSet.emit(self, self.img_movie, numpy_to_pixmap(img))
@@ -263,7 +271,9 @@ class Screenshot(IProjectContainer, IHasName, ITimeRange, ISelectable, ITimeline
         self.notes = serialization['notes']
         self.frame_pos = serialization['frame_pos']
 
+        # The frame is read from the movie when the image is first needed, see load_img_movie()
         self.img_movie = np.zeros(shape=(30, 50, 3), dtype=np.uint8)
+        self._img_pending = True
         self.img_blend = None
 
         return self
@@ -285,11 +295,29 @@ class Screenshot(IProjectContainer, IHasName, ITimeRange, ISelectable, ITimeline
     def get_parent_container(self):
         return self.screenshot_group
 
+    def load_img_movie(self):
+        """
+        Reads the frame of a deserialized screenshot from the movie, if it hasn't been loaded yet.
+        """
+        if not self._img_pending or self.project is None or self.project.headless_mode:
+            return
+        self._img_pending = False
+        frame = self.project.read_movie_frame(self.frame_pos)
+        if frame is not None:
+            self.set_img_movie(frame)
+
+    def is_img_pending(self):
+        """
+        Returns True if the frame of a deserialized screenshot hasn't been read from the movie yet.
+        """
+        return self._img_pending
+
     def load_screenshots(self, cap: cv2.VideoCapture = None):
         if cap is None:
-            cap = cv2.VideoCapture(self.project.movie_descriptor.movie_path)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, self.frame_pos)
-        ret, frame = cap.read()
+            frame = self.project.read_movie_frame(self.frame_pos)
+        else:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.frame_pos)
+            ret, frame = cap.read()
         self.set_img_movie(frame)
 
 
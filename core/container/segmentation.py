@@ -3,6 +3,7 @@ from core.data.enums import SegmentCreationMode, SEGMENTATION, MediaObjectType,
 from core.container.container_interfaces import IProjectContainer, IHasName, ISelectable, ITimelineItem, ILockable, \
     AutomatedTextSource, ITimeRange, IClassifiable, IHasMediaObject, deprecation_serialization
 from core.data.log import log_error
+from core.container.interval_index import IntervalIndex
 from PyQt5.QtCore import pyqtSignal
 from .annotation_body import AnnotationBody, Annotatable
 
@@ -31,6 +32,7 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
             segments = []
 
         self.segments = segments
+        self._index = IntervalIndex(lambda: self.segments)
 
         self.notes = ""
         self.is_main_segmentation = False
@@ -48,11 +50,23 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
         :param time_ms:
         :return:
         """
-        for s in self.segments:
-            if s.get_start() <= time_ms < s.get_end():
-                return s
+        segments = self._index.at(time_ms)
+        if len(segments) > 0:
+            return segments[0]
         return None
 
+    def get_segments_in_range(self, start, end):
+        """
+        Returns all Segments overlapping the range [start, end) ms, ordered by their start.
+        """
+        return self._index.overlapping(start, end)
+
+    def invalidate_index(self):
+        """
+        Has to be called if the start or end of a Segment has been changed.
+        """
+        self._index.invalidate()
+
     def create_segment2(self, start, stop, mode:SegmentCreationMode = SegmentCreationMode.BACKWARD,
                         body = "",
                         dispatch  = True,
@@ -123,7 +137,8 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
         if self.project is not None:
             segment.set_project(self.project)
 
-        if len(self.segments) == 0:
+        # Segments are usually added in order, e.g. by the auto segmentation
+        if len(self.segments) == 0 or self.segments[-1].start <= segment.start:
             self.segments.append(segment)
         else:
             for i, s in enumerate(self.segments):
@@ -134,6 +149,7 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
                 if i == len(self.segments) - 1:
                     self.segments.append(segment)
                     break
+        self._index.add(segment)
 
         self.update_segment_ids()
         self.project.sort_screenshots()
@@ -146,6 +162,7 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
 
     def remove_segment(self, segment, dispatch = True):
         self.segments.remove(segment)
+        self._index.remove(segment)
 
         self.update_segment_ids()
         self.project.sort_screenshots()
@@ -165,6 +182,7 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
         if segm in self.segments:
             old_end = segm.get_end()
             segm.end = time
+            self._index.invalidate()
             # new = self.create_segment(time, old_end)
             new = self.create_segment2(time, old_end, mode=SegmentCreationMode.INTERVAL, dispatch=False)
             self.project.undo_manager.to_undo((self.cut_segment, [segm, time]), (self.merge_segments, [segm, new]))
@@ -213,7 +231,7 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
         for s in self.segments:
             if s.start >= s.end or s.end - s.start < length:
                 self.remove_segment(s, dispatch=False)
-        self.dispatch_on_changed()
+        self.dispatch_on_changed(item=self)
 
     def cleanup_borders(self):
         self.remove_unreal_segments(length = 1)
@@ -224,8 +242,9 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
                 center = int(round((start + end) / 2, 0))
                 s.end = center
                 self.segments[i + 1].start = center
+        self._index.invalidate()
 
-        self.dispatch_on_changed()
+        self.dispatch_on_changed(item=self)
 
     def set_name(self, name):
         self.project.undo_manager.to_undo((self.set_name, [name]), (self.set_name, [self.name]))
@@ -262,6 +281,7 @@ class Segmentation(IProjectContainer, IHasName, ISelectable, ITimelineItem, ILoc
             new.deserialize(s, self.project)
             new.segmentation = self
             self.segments.append(new)
+        self._index.invalidate()
 
         if 'locked' in serialization:
             self.locked = serialization['locked']
@@ -386,6 +406,7 @@ class Segment(IProjectContainer, ITimeRange, IHasName, ISelectable, ITimelineIte
             start = self.end - self.MIN_SIZE
         self.project.undo_manager.to_undo((self.set_start, [start]), (self.set_start, [self.start]))
         self.start = start
+        self.segmentation.invalidate_index()
         self.segmentation.update_segment_ids()
         self.project.sort_screenshots()
 
@@ -405,6 +426,7 @@ class Segment(IProjectContainer, ITimeRange, IHasName, ISelectable, ITimelineIte
         self.delete_analyses()
 
         self.end = end
+        self.segmentation.invalidate_index()
         self.segmentation.update_segment_ids()
         self.project.sort_screenshots()
         self.onSegmentChanged.emit(self)
@@ -420,6 +442,8 @@ class Segment(IProjectContainer, ITimeRange, IHasName, ISelectable, ITimelineIte
         self.project.undo_manager.to_undo((self.move, [start, end]), (self.move, [self.start, self.end]))
         self.start = start
         self.end = end
+        if self.segmentation is not None:
+            self.segmentation.invalidate_index()
 
         # Since the region has changed, we delete the analysis
         self.delete_analyses()
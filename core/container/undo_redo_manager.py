@@ -1,8 +1,12 @@
+from contextlib import contextmanager
 from PyQt5.QtCore import QObject, pyqtSignal
 
 class UndoRedoManager(QObject):
     on_changed = pyqtSignal()
 
+    # Emitted with the (function, args) tuples of every operation, including undone and redone ones
+    on_operation = pyqtSignal(object, object)
+
     def __init__(self):
         super(UndoRedoManager, self).__init__()
         self.undo_stack = []
@@ -10,6 +14,7 @@ class UndoRedoManager(QObject):
         self.is_undoing = False
         self.is_redoing = False
         self.has_changes = False
+        self._suspended = 0
 
     def has_modifications(self):
         return self.has_changes
@@ -20,7 +25,21 @@ class UndoRedoManager(QObject):
         # else:
         #     return False
 
+    @contextmanager
+    def suspended(self):
+        """
+        Operations are not recorded within this context, e.g. while loading data which already is in the project.
+        """
+        self._suspended += 1
+        try:
+            yield self
+        finally:
+            self._suspended -= 1
+
     def to_undo(self, redo, undo):
+        if self._suspended > 0:
+            return
+        self.on_operation.emit(redo, undo)
         self.has_changes = True
         if self.is_undoing:
             self.is_undoing = False
@@ -46,6 +46,8 @@ class ScreenshotExporter(ExportDevice):
     SemSeg_Filled = "Filled"
     SemSeg_OutlinesFilled = "Both"
 
+    # The number of screenshots whose masks are read at once
+    batch_size = 64
 
     def __init__(self, naming, selection = None, quality = 100, semantic_segmentation=SemSeg_None):
         self.naming = naming
@@ -63,19 +65,16 @@ class ScreenshotExporter(ExportDevice):
             if len(self.selection) == 0:
                 self.selection = project.screenshots
 
-        for s in self.selection:
+        for s, data in self.iter_semantic_segmentations(project, self.selection):
             name = self.build_file_name(self.naming, s, project.movie_descriptor)
             file_name = os.path.join(path, name)
 
             img = s.get_img_movie_orig_size()
             if self.semantic_segmentation == self.SemSeg_Filled or \
                     self.semantic_segmentation == self.SemSeg_OutlinesFilled:
-                semantic_segmentations = s.get_connected_analysis("SemanticSegmentationAnalysis")
-                print(semantic_segmentations)
-                if len(semantic_segmentations) > 0:
+                if data is not None:
                     n = 20
                     colormap = get_colormap(n)
-                    data = semantic_segmentations[0].get_adata()
                     mask = np.zeros(shape=data.shape + (3,), dtype=np.float32)
                     for i in range(n):
                         mask[data == i] = colormap[i][:3]
@@ -85,11 +84,9 @@ class ScreenshotExporter(ExportDevice):
 
             if self.semantic_segmentation == self.SemSeg_Outlines  or \
                     self.semantic_segmentation == self.SemSeg_OutlinesFilled:
-                semantic_segmentations = s.get_connected_analysis("SemanticSegmentationAnalysis")
-                if len(semantic_segmentations) > 0:
+                if data is not None:
                     n = 20
                     colormap = get_colormap(n)
-                    data = semantic_segmentations[0].get_adata()
                     data = cv2.resize(data, img.shape[:2][::-1], interpolation=cv2.INTER_NEAREST)
                     cnts = cv2.findContours(data, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
                     cnts = cnts[0] if len(cnts) == 2 else cnts[1]
@@ -110,6 +107,24 @@ class ScreenshotExporter(ExportDevice):
                 compression = int(np.clip(float(100 - self.quality) / 10,0,9))
                 cv2.imwrite(file_name + ".png", img, [cv2.IMWRITE_PNG_COMPRESSION, compression])
 
+    def iter_semantic_segmentations(self, project, screenshots):
+        """
+        Yields (screenshot, mask) with the semantic segmentation mask of each screenshot or None,
+        the masks of batch_size screenshots are read at once.
+        """
+        for i in range(0, len(screenshots), self.batch_size):
+            batch = screenshots[i:i + self.batch_size]
+            if self.semantic_segmentation == self.SemSeg_None:
+                masks = [None] * len(batch)
+            else:
+                analyses = []
+                for s in batch:
+                    semantic_segmentations = s.get_connected_analysis("SemanticSegmentationAnalysis")
+                    analyses.append(semantic_segmentations[0] if len(semantic_segmentations) > 0 else None)
+                masks = project.get_analyses_data(analyses)
+            for s, mask in zip(batch, masks):
+                yield s, mask
+
     def build_file_name(self, naming, screenshot:Screenshot, movie_descriptor:MovieDescriptor):
         """
         Generates a Filename for the Screenshots by a given naming convention
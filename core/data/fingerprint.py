@@ -0,0 +1,261 @@
+"""
+Movie fingerprints, a cheap identification of movie files which doesn't depend on their path.
+
+A fingerprint consists of:
+
+- a key, the hash of the file size, the container metadata and a few sampled byte ranges of the file.
+  It identifies the exact file and is used to key the caches derived from the movie.
+- perceptual hashes of a few decoded frames, which identify the same movie
+  if it has been re-encoded or remuxed.
+
+The MovieIndex maps fingerprints to the movie files found on this machine, such that
+projects whose movie has been moved can be relinked by a lookup.
+
+*Example*:
+
+index = MovieIndex(settings.DIR_CACHE)
+index.add_directory("/media/movies/")
+path = index.find(project.movie_descriptor.fingerprint)
+"""
+
+import os
+import json
+import hashlib
+from threading import RLock
+
+import cv2
+import numpy as np
+
+from core.data.log import log_info, log_warning, log_error
+from core.data.frame_source import FrameSource
+
+FINGERPRINT_VERSION = 1
+
+# The number and size of the byte ranges hashed into the key
+N_BYTE_SAMPLES = 16
+BYTE_SAMPLE_SIZE = 65536
+
+# The number of decoded frames which are perceptually hashed
+N_FRAME_HASHES = 5
+
+# The maximal mean hamming distance in bits of the frame hashes of two matching movies
+MATCH_DISTANCE = 10
+
+MOVIE_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi", ".m4v", ".mpg", ".mpeg", ".wmv", ".webm", ".mxf", ".flv")
+MOVIE_INDEX_FILE = "movie_index.json"
+
+
+def frame_hash(frame):
+    """
+    Computes the 64 bit difference hash of a frame.
+
+    :param frame: a BGR frame
+    :return: the hash as hex string
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return "{:016x}".format(int("".join("1" if b else "0" for b in bits), 2))
+
+
+def hash_distance(a, b):
+    """
+    Returns the hamming distance between two frame hashes.
+    """
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def _sample_bytes(movie_path, size):
+    """
+    Hashes N_BYTE_SAMPLES evenly distributed byte ranges of the file, including the first and the last one.
+    """
+    h = hashlib.sha1()
+    with open(movie_path, "rb") as f:
+        if size <= N_BYTE_SAMPLES * BYTE_SAMPLE_SIZE:
+            h.update(f.read())
+        else:
+            for offset in np.linspace(0, size - BYTE_SAMPLE_SIZE, N_BYTE_SAMPLES).astype(np.int64):
+                f.seek(int(offset))
+                h.update(f.read(BYTE_SAMPLE_SIZE))
+    return h.hexdigest()
+
+
+def movie_fingerprint(movie_path):
+    """
+    Computes the fingerprint of a movie file.
+
+    :param movie_path: the path to the movie
+    :return: a dict with the key, the container metadata and the frame hashes, or None if the movie can't be read
+    """
+    if not os.path.isfile(movie_path):
+        return None
+    try:
+        size = os.path.getsize(movie_path)
+        with FrameSource(movie_path) as source:
+            frame_count = int(source.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = round(float(source.get(cv2.CAP_PROP_FPS)), 3)
+            width = int(source.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(source.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+            # The frames are sampled relative to the length, such that re-encoded copies sample the same frames
+            indices = [int(frame_count * (i + 1) / (N_FRAME_HASHES + 1)) for i in range(N_FRAME_HASHES)]
+            frame_hashes = [frame_hash(frame) for idx, frame in source.read_frames(indices)]
+
+        key = hashlib.sha1(json.dumps([FINGERPRINT_VERSION, size, frame_count, fps, width, height,
+                                       _sample_bytes(movie_path, size)]).encode()).hexdigest()
+        return dict(
+            version=FINGERPRINT_VERSION,
+            key=key,
+            size=size,
+            frame_count=frame_count,
+            fps=fps,
+            width=width,
+            height=height,
+            frame_hashes=frame_hashes
+        )
+    except Exception as e:
+        log_error("Could not compute the fingerprint of", movie_path, e)
+        return None
+
+
+def fingerprint_key(fingerprint):
+    """
+    Returns the key of a fingerprint, identifying the exact file, or None.
+    """
+    if fingerprint is None:
+        return None
+    return fingerprint['key']
+
+
+def fingerprint_distance(a, b):
+    """
+    Returns the mean hamming distance of the frame hashes of two fingerprints,
+    or None if they can't be compared.
+    """
+    if a is None or b is None or len(a['frame_hashes']) == 0 or len(a['frame_hashes']) != len(b['frame_hashes']):
+        return None
+    # Re-encoded copies may differ by a few frames
+    if abs(a['frame_count'] - b['frame_count']) > max(1, 0.01 * a['frame_count']):
+        return None
+    return float(np.mean([hash_distance(x, y) for x, y in zip(a['frame_hashes'], b['frame_hashes'])]))
+
+
+def fingerprints_match(a, b):
+    """
+    Returns True if two fingerprints belong to the same file or to a copy of the same movie.
+    """
+    if fingerprint_key(a) is not None and fingerprint_key(a) == fingerprint_key(b):
+        return True
+    distance = fingerprint_distance(a, b)
+    return distance is not None and distance <= MATCH_DISTANCE
+
+
+class MovieIndex:
+    """
+    Maps the fingerprints of known movie files to their paths, stored as json in the given directory.
+    Files are only fingerprinted again if their size or modification time has changed.
+
+    The index is used from the GUI thread and from workers looking up moved movies,
+    the entries and the file are guarded by a lock, movies are fingerprinted outside of it.
+    """
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MOVIE_INDEX_FILE)
+        self.entries = dict()   # path: dict(size, mtime, fingerprint)
+        self._by_key = dict()   # fingerprint key: path
+        self.lock = RLock()
+        self.load()
+
+    def load(self):
+        with self.lock:
+            if not os.path.isfile(self.path):
+                return
+            try:
+                with open(self.path, "r") as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                log_warning("Could not load the movie index:", e)
+                self.entries = dict()
+            self._by_key = {fingerprint_key(e['fingerprint']): p for p, e in self.entries.items()}
+
+    def save(self):
+        with self.lock:
+            try:
+                if not os.path.isdir(os.path.dirname(self.path)):
+                    os.makedirs(os.path.dirname(self.path))
+                with open(self.path, "w") as f:
+                    json.dump(self.entries, f)
+            except Exception as e:
+                log_error("Could not save the movie index:", e)
+
+    def _is_current(self, path):
+        entry = self.entries.get(path)
+        if entry is None or not os.path.isfile(path):
+            return False
+        stat = os.stat(path)
+        return entry['size'] == stat.st_size and entry['mtime'] == int(stat.st_mtime)
+
+    def add(self, movie_path, fingerprint = None):
+        """
+        Adds a movie to the index.
+
+        :param movie_path: the path of the movie
+        :param fingerprint: the fingerprint if already known, else it is computed
+        :return: the fingerprint of the movie or None
+        """
+        movie_path = os.path.abspath(movie_path)
+        with self.lock:
+            if self._is_current(movie_path):
+                return self.entries[movie_path]['fingerprint']
+        if fingerprint is None:
+            fingerprint = movie_fingerprint(movie_path)
+        if fingerprint is None:
+            return None
+
+        stat = os.stat(movie_path)
+        with self.lock:
+            self.entries[movie_path] = dict(size=stat.st_size, mtime=int(stat.st_mtime), fingerprint=fingerprint)
+            self._by_key[fingerprint_key(fingerprint)] = movie_path
+        return fingerprint
+
+    def add_directory(self, directory, extensions = MOVIE_EXTENSIONS):
+        """
+        Adds all movies in a directory and its subdirectories to the index and saves it.
+
+        :return: the number of movies in the directory
+        """
+        n = 0
+        for root, dirs, files in os.walk(directory):
+            for f in files:
+                if f.lower().endswith(extensions) and self.add(os.path.join(root, f)) is not None:
+                    n += 1
+        self.save()
+        log_info("Movie Index:", n, "Movies in", directory)
+        return n
+
+    def find(self, fingerprint):
+        """
+        Looks up the path of a movie by its fingerprint. If the exact file isn't known,
+        the closest copy of the movie is returned.
+
+        :param fingerprint: the fingerprint as stored on the MovieDescriptor
+        :return: the path of the movie or None
+        """
+        if fingerprint is None:
+            return None
+        with self.lock:
+            path = self._by_key.get(fingerprint_key(fingerprint))
+            if path is not None and self._is_current(path):
+                return path
+            entries = list(self.entries.items())
+
+        best, best_distance = None, None
+        for p, e in entries:
+            distance = fingerprint_distance(fingerprint, e['fingerprint'])
+            if distance is not None and distance <= MATCH_DISTANCE and os.path.isfile(p) \
+                    and (best_distance is None or distance < best_distance):
+                best, best_distance = p, distance
+        return best
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
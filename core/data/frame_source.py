@@ -0,0 +1,135 @@
+"""
+A sequential frame reader shared by the analyses.
+
+Setting cv2.CAP_PROP_POS_FRAMES forces the decoder to jump back to the previous keyframe
+and decode forward again. On long-GOP material (H.264 / H.265 masters) this makes every
+sampled frame cost a whole GOP. The FrameSource instead walks forward with grab(),
+which only demuxes and decodes without converting the frame, and only seeks if the next
+wanted frame is far away or behind the current position.
+
+*Example*:
+
+with FrameSource(movie_path) as source:
+    for frame_idx, frame in source.read_frames(range(start, stop + 1, resolution)):
+        ...
+"""
+
+import cv2
+
+# If the next wanted frame is more than SEEK_THRESHOLD frames ahead, seeking is cheaper
+# than grabbing all frames in between. The value covers the GOP length of most masters.
+SEEK_THRESHOLD = 250
+
+
+class FrameSource:
+    def __init__(self, movie_path, seek_threshold = SEEK_THRESHOLD):
+        self.movie_path = movie_path
+        self.seek_threshold = seek_threshold
+        self.capture = None
+
+        # The index of the frame the next read() of the capture will return
+        self._position = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def open(self):
+        if self.capture is None:
+            self.capture = cv2.VideoCapture(self.movie_path)
+            self._position = 0
+        return self.capture
+
+    def get(self, prop):
+        """
+        Returns a property of the underlying capture, e.g. cv2.CAP_PROP_FRAME_COUNT.
+        """
+        return self.open().get(prop)
+
+    def read_frames(self, frame_indices, aborted = None):
+        """
+        Yields (frame_idx, frame) for all given frame indices, sorted ascending and without duplicates.
+        The iteration stops at the end of the movie.
+
+        :param frame_indices: An iterable of frame indices
+        :param aborted: An optional callable, if it returns True the iteration stops.
+        """
+        capture = self.open()
+
+        for idx in sorted(set(int(i) for i in frame_indices)):
+            if aborted is not None and aborted():
+                return
+            if idx < 0:
+                continue
+
+            if idx < self._position or idx - self._position > self.seek_threshold:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, idx)
+                self._position = idx
+            else:
+                while self._position < idx:
+                    if not capture.grab():
+                        return
+                    self._position += 1
+
+            ret, frame = capture.read()
+            if not ret or frame is None:
+                return
+            self._position += 1
+            yield idx, frame
+
+    def read_frame(self, frame_idx):
+        """
+        Returns a single frame or None if it could not be read.
+        """
+        for idx, frame in self.read_frames([frame_idx]):
+            return frame
+        return None
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+        self.capture = None
+        self._position = 0
+
+
+class DecodePlan:
+    """
+    Collects the frame indices several targets need and merges them, such that overlapping
+    and adjacent ranges are decoded only once. For every decoded frame, targets_of()
+    returns the keys of all targets which requested it.
+    """
+    def __init__(self):
+        self._targets = dict()
+        self._ranges = []
+
+    def add(self, key, frame_indices):
+        indices = [int(i) for i in frame_indices]
+        if len(indices) == 0:
+            return
+        self._ranges.append((min(indices), max(indices)))
+        for idx in indices:
+            self._targets.setdefault(idx, []).append(key)
+
+    def intervals(self):
+        """
+        Returns the sorted and merged (start, stop) frame ranges of all targets.
+        """
+        merged = []
+        for start, stop in sorted(self._ranges):
+            if len(merged) > 0 and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+            else:
+                merged.append((start, stop))
+        return merged
+
+    def frame_indices(self):
+        return sorted(self._targets.keys())
+
+    def targets_of(self, frame_idx):
+        return self._targets.get(frame_idx, [])
+
+    def __len__(self):
+        return len(self._targets)
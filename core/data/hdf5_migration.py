@@ -0,0 +1,162 @@
+"""
+Rewrites the analyses.hdf5 files of projects with the chunk layout and compression the analyses declare,
+see core.container.hdf5_manager.get_storage(). Files written by older versions of VIAN store all datasets
+uncompressed. The projects must not be opened in VIAN while their files are migrated.
+
+benchmark_hdf5() copies a file with several storages and compares the file size and throughput.
+
+*Example*:
+
+python -m core.data.hdf5_migration corpus.vian_corpus
+python -m core.data.hdf5_migration project/data/analyses.hdf5 --benchmark
+
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import h5py
+import numpy as np
+
+from core.data.log import log_info, log_error
+from core.data.headless import get_project_paths
+from core.container.hdf5_manager import copy_dataset, get_dataset_storage
+
+# The storages compared by benchmark_hdf5(), functions of the dataset name
+BENCHMARK_STORAGES = dict(
+    uncompressed=lambda name: dict(compression=None, shuffle=False),
+    lzf=lambda name: dict(compression="lzf", shuffle=True),
+    gzip=lambda name: dict(compression="gzip", compression_opts=4, shuffle=True),
+    declared=lambda name: get_dataset_storage(name) or dict(),
+)
+
+
+def get_hdf5_paths(paths):
+    """
+    Returns the paths of the hdf5 files, given a list of .hdf5 files, projects and corpora.
+    """
+    result = []
+    for p in paths:
+        if p.endswith(".hdf5"):
+            result.append(p)
+        else:
+            for project_path in get_project_paths([p]):
+                result.append(os.path.join(os.path.split(project_path)[0], "data", "analyses.hdf5"))
+    return result
+
+
+def rewrite_hdf5(path, out_path, storage_for):
+    """
+    Copies all datasets of a file into a new file.
+
+    :param path: the source file
+    :param out_path: the file to write
+    :param storage_for: a function returning the storage for a dataset name, see get_storage()
+    """
+    with h5py.File(path, "r") as src, h5py.File(out_path, "w") as dst:
+        for name in src.keys():
+            copy_dataset(src[name], dst, name, storage_for(name))
+
+
+def migrate_hdf5(path, storage_for = BENCHMARK_STORAGES['declared']):
+    """
+    Rewrites a file with the storage declared for its datasets, the file is replaced once it is written completely.
+
+    :param path: the path of the analyses.hdf5 file
+    :param storage_for: a function returning the storage for a dataset name
+    :return: the size of the file in bytes before and after the migration
+    """
+    size_before = os.path.getsize(path)
+    rewrite_hdf5(path, path + ".migrate", storage_for)
+    os.replace(path + ".migrate", path)
+    size_after = os.path.getsize(path)
+    log_info("Migrated", path, "{:.1f}MB -> {:.1f}MB".format(size_before / 1e6, size_after / 1e6))
+    return size_before, size_after
+
+
+def benchmark_hdf5(path, storages = None, n_reads = 200, seed = 0):
+    """
+    Copies a file with each storage and measures the file size, the write throughput,
+    the throughput of reading all datasets and the rate of reading random single rows.
+
+    :param path: the path of an hdf5 file
+    :param storages: a dict name: storage function, by default BENCHMARK_STORAGES
+    :param n_reads: the number of random rows read
+    :return: a list of dicts with the keys storage, size, write_mb_s, read_mb_s, rows_s
+    """
+    if storages is None:
+        storages = BENCHMARK_STORAGES
+
+    with h5py.File(path, "r") as f:
+        names = [n for n in f.keys() if f[n].shape is not None and len(f[n].shape) > 0 and f[n].shape[0] > 0]
+        n_bytes = sum(f[n].size * f[n].dtype.itemsize for n in names)
+        rng = np.random.RandomState(seed)
+        rows = []
+        for i in range(n_reads if len(names) > 0 else 0):
+            name = names[rng.randint(len(names))]
+            rows.append((name, rng.randint(f[name].shape[0])))
+
+    results = []
+    directory = tempfile.mkdtemp()
+    try:
+        for storage_name, storage_for in storages.items():
+            out_path = os.path.join(directory, storage_name + ".hdf5")
+            t = time.time()
+            rewrite_hdf5(path, out_path, storage_for)
+            t_write = time.time() - t
+
+            with h5py.File(out_path, "r") as f:
+                t = time.time()
+                for n in names:
+                    f[n][:]
+                t_read = time.time() - t
+            with h5py.File(out_path, "r") as f:
+                t = time.time()
+                for name, idx in rows:
+                    f[name][idx]
+                t_rows = time.time() - t
+
+            results.append(dict(storage=storage_name,
+                                size=os.path.getsize(out_path),
+                                write_mb_s=n_bytes / 1e6 / max(t_write, 1e-9),
+                                read_mb_s=n_bytes / 1e6 / max(t_read, 1e-9),
+                                rows_s=len(rows) / max(t_rows, 1e-9)))
+            os.remove(out_path)
+    finally:
+        shutil.rmtree(directory)
+
+    for r in results:
+        log_info("{storage:>14}: {size_mb:10.1f}MB  write {write_mb_s:8.1f}MB/s  "
+                 "read {read_mb_s:8.1f}MB/s  {rows_s:8.0f} rows/s".format(size_mb=r['size'] / 1e6, **r))
+    return results
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Rewrites analyses.hdf5 files with chunking and compression.")
+    parser.add_argument("paths", nargs="+", help="HDF5 files, projects (.eext) or corpora (.vian_corpus)")
+    parser.add_argument("--benchmark", action="store_true", help="Only compares the storages, nothing is rewritten")
+    parser.add_argument("--reads", type=int, default=200, help="The number of random rows read by the benchmark")
+    args = parser.parse_args(argv)
+
+    # Registers all analyses, such that their declared storage is known
+    import core.analysis.analysis_import
+
+    failed = 0
+    for p in get_hdf5_paths(args.paths):
+        try:
+            if args.benchmark:
+                benchmark_hdf5(p, n_reads=args.reads)
+            else:
+                migrate_hdf5(p)
+        except Exception as e:
+            log_error("Could not migrate", p, e)
+            failed += 1
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,11 +12,13 @@ from PyQt5.QtGui import QColor
 from core.data.enums import DataSerialization
 from scipy.signal import savgol_filter, resample
 from core.data.log import log_debug, log_info, log_error
-from core.container.container_interfaces import ITimelineItem
+from core.container.container_interfaces import ITimelineItem, restore_qobject
 from core.container.analysis import AnalysisContainer
 from core.container.project import Screenshot, ScreenshotGroup, Segment, Segmentation, Annotation, AnnotationLayer, \
     ITimeRange
 from core.data.computation import ms_to_frames
+from core.data.frame_source import FrameSource, DecodePlan
+from core.data.proxy_cache import ProxyFrameCache
 
 from typing import TYPE_CHECKING
 
@@ -150,6 +152,10 @@ class IAnalysisJob(QObject):
     M_MOVEMENT = "Movement"
     M_EYETRACKING = "Eyetracking"
 
+    # Set to True if IAnalysisJob.process() can't run in a worker process,
+    # e.g. because it needs the project or a model which can't be pickled
+    thread_only = False
+
     def __init__(self, name,
                  source_types,
                  menu = M_COLOR,
@@ -158,7 +164,8 @@ class IAnalysisJob(QObject):
                  author="No Author",
                  version="1.0.0",
                  multiple_result=False,
-                 data_serialization=DataSerialization.HDF5_MULTIPLE):
+                 data_serialization=DataSerialization.HDF5_MULTIPLE,
+                 merged_decoding=False):
         """
         
         :param name: The name of the Analysis, used in the UI.
@@ -168,6 +175,9 @@ class IAnalysisJob(QObject):
         :param version: The Version of the Analysis Implementation
         :param multiple_result: Whether the Analysis should run for each input container 
         seperately or once for all input containers
+        :param merged_decoding: If True, all targets are handed to IAnalysisJob.process_merged() at once,
+        which decodes the union of their frame ranges only once. The analysis has to implement
+        IAnalysisJob.accumulate() and IAnalysisJob.finalize() in this case.
         """
         super(IAnalysisJob, self).__init__()
         if (dataset_name is None or dataset_dtype is None or dataset_shape is None) and \
@@ -186,12 +196,24 @@ class IAnalysisJob(QObject):
         self.version = version
         self.multiple_result = multiple_result
         self.data_serialization = data_serialization
+        self.merged_decoding = merged_decoding
         self.hdf5_manager = None
 
         self.target_class_obj = None
         self.aborted = False
 
         self.max_width = 1920
+        self.use_proxy_frames = False
+
+    def __reduce__(self):
+        """
+        Analyses are pickled to run IAnalysisJob.process() in a worker process.
+        The HDF5Manager and the ClassificationObject stay in the main process.
+        """
+        state = dict(self.__dict__)
+        state['hdf5_manager'] = None
+        state['target_class_obj'] = None
+        return restore_qobject, (self.__class__, state)
 
     def get_name(self):
         return self.name
@@ -225,6 +247,13 @@ class IAnalysisJob(QObject):
             elif isinstance(t, Segmentation):
                 res_targets.extend(t.segments)
 
+        # If the project has proxy frames, they can be used instead of decoding the movie
+        proxy_dir = None
+        if self.use_proxy_frames:
+            proxy_cache = project.get_proxy_cache()
+            if proxy_cache is not None:
+                proxy_dir = proxy_cache.directory
+
         # Assemble the data for all elements
         targets, args = [], []
         for t in list(set(res_targets)):
@@ -234,6 +263,14 @@ class IAnalysisJob(QObject):
                     semantic_segmentations = t.get_connected_analysis("SemanticSegmentationAnalysis")
                     if len(semantic_segmentations) > 0:
                         semseg = semantic_segmentations[0]
+
+            # Proxy frames are already cropped, semantic segmentation masks need the full frame
+            margins = project.movie_descriptor.get_letterbox_rect()
+            proxy = None
+            if proxy_dir is not None and semseg is None:
+                proxy = proxy_dir
+                margins = None
+
             targets.append(t)
             args.append(
                 dict(
@@ -241,11 +278,27 @@ class IAnalysisJob(QObject):
                     end=ms_to_frames(t.get_end(), fps),
                     movie_path=project.movie_descriptor.movie_path,
                     target=t.get_id(),
-                    margins=project.movie_descriptor.get_letterbox_rect(),
-                    semseg=semseg
+                    margins=margins,
+                    semseg=semseg,
+                    proxy=proxy
                 ))
         return targets, args
 
+    def open_frame_source(self, args):
+        """
+        Returns the source to read the frames of a target from, as packed in IAnalysisJob.prepare().
+        This is either a FrameSource on the movie or, if available, the ProxyFrameCache of the project.
+
+        *Example*:
+
+        with self.open_frame_source(args) as source:
+            for frame_idx, frame in source.read_frames(range(args['start'], args['end'] + 1, self.resolution)):
+                ...
+        """
+        if args.get('proxy') is not None:
+            return ProxyFrameCache(args['proxy'])
+        return FrameSource(args['movie_path'])
+
     def process(self, args, sign_progress):
         """
         The Processing function, this will be executed in a separate thread.
@@ -266,6 +319,92 @@ class IAnalysisJob(QObject):
             sign_progress = self.dummy_callback
         return args, sign_progress
 
+    def process_merged(self, args, sign_progress):
+        """
+        The Processing function used if merged_decoding is set. 
+        
+        Instead of decoding the frames of every target separately, the frame indices of all targets 
+        are merged into a DecodePlan, the union is decoded once in ascending order and every 
+        frame is handed to the accumulators of all targets which requested it.
+        
+        :param args: A list of the Arguments as packed in IAnalysisJob.prepare()
+        :param sign_progress: a function to signal the current Progress. usage: sign_progress(float E[0.0,..1.0])
+        :return: A list of AnalysisJobAnalysis Objects
+        """
+        args, sign_progress = IAnalysisJob.process(self, args, sign_progress)
+        if not isinstance(args, list):
+            args = [args]
+        if len(args) == 0:
+            return []
+
+        accumulators = [self.create_accumulator(a) for a in args]
+
+        # Targets read from the proxy frames and from the movie are planned separately
+        plans = dict()
+        for i, a in enumerate(args):
+            if a.get('proxy') not in plans:
+                plans[a.get('proxy')] = (DecodePlan(), i)
+            plans[a.get('proxy')][0].add(i, self.get_frame_indices(a))
+
+        n_frames = np.clip(sum([len(p) for p, i in plans.values()]), 1, None)
+        counter = 0
+        for plan, first in plans.values():
+            log_debug("Merged Decoding:", len(args), "Targets,", len(plan), "Frames,",
+                      len(plan.intervals()), "Ranges")
+            with self.open_frame_source(args[first]) as source:
+                for frame_idx, frame in source.read_frames(plan.frame_indices(), aborted=lambda: self.aborted):
+                    sign_progress(counter / n_frames)
+                    counter += 1
+                    frame = self.prepare_frame(frame_idx, frame, args[first]['margins'])
+                    for k in plan.targets_of(frame_idx):
+                        self.accumulate(accumulators[k], frame_idx, frame, args[k])
+
+        result = []
+        for acc, a in zip(accumulators, args):
+            r = self.finalize(acc, a)
+            if r is not None:
+                result.append(r)
+        sign_progress(1.0)
+        return result
+
+    def get_frame_indices(self, args):
+        """
+        Returns the frame indices which have to be decoded for one target in merged_decoding mode.
+        
+        :param args: the Arguments of one target as packed in IAnalysisJob.prepare()
+        :return: An iterable of frame indices
+        """
+        return range(args['start'], args['end'] + 1, getattr(self, "resolution", 1))
+
+    def prepare_frame(self, frame_idx, frame, margins):
+        """
+        Called once for every decoded frame in merged_decoding mode, before it is handed to the 
+        accumulators. Override this to do work which is shared by all targets, such as cropping 
+        the letterbox or colorspace conversions.
+        
+        :return: The frame as handed to IAnalysisJob.accumulate()
+        """
+        return frame
+
+    def create_accumulator(self, args):
+        """
+        Returns the object which collects the per-frame data of one target in merged_decoding mode.
+        """
+        return []
+
+    def accumulate(self, accumulator, frame_idx, frame, args):
+        """
+        Adds a decoded frame to the accumulator of a target in merged_decoding mode.
+        """
+        raise NotImplementedError("IAnalysisJob:accumulate not implemented by " + self.__class__.__name__)
+
+    def finalize(self, accumulator, args):
+        """
+        Creates the AnalysisJobAnalysis Object of a target from its accumulator in merged_decoding mode.
+        Return None if the target has no result.
+        """
+        raise NotImplementedError("IAnalysisJob:finalize not implemented by " + self.__class__.__name__)
+
     def modify_project(self, project, result, main_window=None):
         """
         If your Analysis should perform any modifications to the project, except storing the analysis,
@@ -379,6 +518,16 @@ class IAnalysisJob(QObject):
         """
         return dict()
 
+    def get_hdf5_storage(self):
+        """
+        Returns how the dataset of this analysis is stored in the HDF5 file, a dict with the keys
+        chunks, compression, compression_opts and shuffle of h5py.File.create_dataset().
+        Keys which are not given default to core.container.hdf5_manager.DEFAULT_STORAGE.
+
+        :return: dict
+        """
+        return dict()
+
     def fit(self, targets, class_objs=None, callback=None) -> AnalysisContainer:
         """
         Performs the analysis for given target containers and classification objects.
@@ -404,6 +553,8 @@ class IAnalysisJob(QObject):
                 class_objs = [class_objs]
             X = [self._fit_single(project, targets, clobj, callback=callback) for clobj in class_objs]
 
+        if project.hdf5_manager is not None:
+            project.hdf5_manager.flush()
         return X
 
     def _fit_single(self, project, targets, clobj, callback):
@@ -411,7 +562,9 @@ class IAnalysisJob(QObject):
         args = self.prepare(project, targets, fps, clobj)
 
         res = []
-        if self.multiple_result:
+        if self.merged_decoding:
+            res = self.process_merged(args, callback)
+        elif self.multiple_result:
             for i, arg in enumerate(args):
                 res.append(self.process(arg, callback))
         else:
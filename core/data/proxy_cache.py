@@ -0,0 +1,235 @@
+"""
+A persistent low-resolution proxy of the movie, stored per project.
+
+The frames are letterbox-cropped, downscaled to a fixed width and stored every
+*stride* frames in a memory-mapped numpy array next to the analyses.hdf5. Once filled,
+analyses and the player overlays can read them without decoding the movie at all.
+
+Since only every stride-th frame is stored, a requested frame is served by the
+closest stored frame.
+
+The memory-mapped file can be opened concurrently by several threads and processes,
+which is why it is used instead of a dataset in the analyses.hdf5.
+"""
+
+import os
+import json
+
+import cv2
+import numpy as np
+
+from core.data.frame_source import FrameSource
+from core.data.log import log_info, log_error
+
+PROXY_VERSION = 1
+PROXY_FRAMES_FILE = "proxy_frames.npy"
+PROXY_META_FILE = "proxy_frames.json"
+
+DEFAULT_PROXY_STRIDE = 10
+DEFAULT_PROXY_WIDTH = 480
+
+
+class ProxyFrameCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta = None
+        self.frames = None
+        self.load()
+
+    @property
+    def frames_path(self):
+        return os.path.join(self.directory, PROXY_FRAMES_FILE)
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, PROXY_META_FILE)
+
+    def load(self):
+        """
+        Opens the stored proxy frames if they exist and have been completely filled.
+        """
+        self.release()
+        if not os.path.isfile(self.meta_path) or not os.path.isfile(self.frames_path):
+            return False
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+            if meta['version'] != PROXY_VERSION or not meta['complete']:
+                return False
+            self.frames = np.load(self.frames_path, mmap_mode="r")
+            self.meta = meta
+            return True
+        except Exception as e:
+            log_error("Could not load proxy frames:", e)
+            self.meta = None
+            self.frames = None
+            return False
+
+    def is_valid(self, margins = None, stride = None, width = None, fingerprint = None):
+        """
+        Returns True if complete proxy frames exist for the given letterbox margins and, if given,
+        for the given stride, width and movie fingerprint key.
+        """
+        if self.meta is None:
+            return False
+        if fingerprint is not None and self.meta.get('fingerprint') != fingerprint:
+            return False
+        if self.meta['margins'] != ([int(m) for m in margins] if margins is not None else None):
+            return False
+        if stride is not None and self.meta['stride'] != stride:
+            return False
+        if width is not None and self.meta['width'] != width:
+            return False
+        return True
+
+    def create(self, movie_path, margins = None, stride = DEFAULT_PROXY_STRIDE, width = DEFAULT_PROXY_WIDTH,
+               sign_progress = None, aborted = None, fingerprint = None):
+        """
+        Decodes the movie once and stores every stride-th frame, cropped to the margins
+        and downscaled to the given width.
+
+        :param movie_path: The path to the movie
+        :param margins: The letterbox rect as returned by MovieDescriptor.get_letterbox_rect()
+        :param stride: Every stride-th frame is stored
+        :param width: The width of the stored frames
+        :param sign_progress: an optional function to signal the progress
+        :param aborted: an optional callable, if it returns True the creation stops
+        :param fingerprint: the key of the movie fingerprint, stored to detect if the movie has changed
+        :return: True if the proxy has been completely filled
+        """
+        self.release()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        with FrameSource(movie_path) as source:
+            frame_count = int(source.get(cv2.CAP_PROP_FRAME_COUNT))
+            movie_width = int(source.get(cv2.CAP_PROP_FRAME_WIDTH))
+            movie_height = int(source.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+            if margins is not None:
+                margins = [int(m) for m in margins]
+                crop_width = margins[2] - margins[0]
+                crop_height = margins[3] - margins[1]
+            else:
+                crop_width = movie_width
+                crop_height = movie_height
+
+            width = int(np.clip(width, 1, crop_width))
+            height = int(np.clip(round(crop_height * width / crop_width), 1, None))
+            n = int(np.ceil(frame_count / stride))
+
+            meta = dict(
+                version=PROXY_VERSION,
+                complete=False,
+                movie_path=movie_path,
+                fingerprint=fingerprint,
+                movie_width=movie_width,
+                movie_height=movie_height,
+                margins=margins,
+                stride=stride,
+                width=width,
+                height=height,
+                length=0
+            )
+            with open(self.meta_path, "w") as f:
+                json.dump(meta, f)
+
+            frames = np.lib.format.open_memmap(self.frames_path, mode="w+", dtype=np.uint8, shape=(n, height, width, 3))
+            length = 0
+            for frame_idx, frame in source.read_frames(range(0, n * stride, stride), aborted=aborted):
+                if margins is not None:
+                    frame = frame[margins[1]:margins[3], margins[0]:margins[2]]
+                frames[frame_idx // stride] = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                length = frame_idx // stride + 1
+                if sign_progress is not None:
+                    sign_progress(length / n)
+        frames.flush()
+        del frames
+
+        meta['length'] = length
+        meta['complete'] = not (aborted is not None and aborted())
+        with open(self.meta_path, "w") as f:
+            json.dump(meta, f)
+
+        log_info("Proxy Frames created:", length, "Frames")
+        return self.load()
+
+    def stored_index(self, frame_idx):
+        """
+        Returns the index of the stored frame closest to the given frame index, or None if it is
+        out of the range of the movie.
+        """
+        if self.meta is None or frame_idx < 0:
+            return None
+        idx = int(round(frame_idx / self.meta['stride']))
+        if idx >= self.meta['length']:
+            if frame_idx < self.meta['length'] * self.meta['stride']:
+                return self.meta['length'] - 1
+            return None
+        return idx
+
+    def get_frame(self, frame_idx):
+        """
+        Returns the cropped and downscaled frame closest to frame_idx, or None.
+        """
+        idx = self.stored_index(frame_idx)
+        if idx is None:
+            return None
+        return np.array(self.frames[idx])
+
+    def get_padded_frame(self, frame_idx):
+        """
+        Returns the frame closest to frame_idx with the letterbox added again,
+        such that it has the aspect ratio of the movie.
+        """
+        frame = self.get_frame(frame_idx)
+        if frame is None or self.meta['margins'] is None:
+            return frame
+
+        margins = self.meta['margins']
+        fx = self.meta['width'] / (margins[2] - margins[0])
+        padded = np.zeros(shape=(int(round(self.meta['movie_height'] * fx)),
+                                 int(round(self.meta['movie_width'] * fx)), 3), dtype=np.uint8)
+        y = int(np.clip(round(margins[1] * fx), 0, padded.shape[0] - frame.shape[0]))
+        x = int(np.clip(round(margins[0] * fx), 0, padded.shape[1] - frame.shape[1]))
+        padded[y:y + frame.shape[0], x:x + frame.shape[1]] = frame
+        return padded
+
+    def read_frames(self, frame_indices, aborted = None):
+        """
+        Same as FrameSource.read_frames(), but each frame is served by the closest stored frame.
+        """
+        for frame_idx in sorted(set(int(i) for i in frame_indices)):
+            if aborted is not None and aborted():
+                return
+            if frame_idx < 0:
+                continue
+            idx = self.stored_index(frame_idx)
+            if idx is None:
+                return
+            yield frame_idx, np.array(self.frames[idx])
+
+    def read_frame(self, frame_idx):
+        return self.get_frame(frame_idx)
+
+    def get(self, prop):
+        if self.meta is None:
+            return 0
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.meta['width']
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.meta['height']
+        return 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def release(self):
+        """
+        Drops the memory-mapped file, it is closed once all frames read from it are gone.
+        """
+        self.frames = None
+        self.meta = None
@@ -132,10 +132,32 @@ class UserSettings():
         self.DIR_PROJECTS = self.DIR_ROOT + "/projects/"
         self.DIR_VOCABULARIES = self.DIR_ROOT + "/vocabularies/"
         self.DIR_SCRIPTS = self.DIR_ROOT + "/scripts/"
+        self.DIR_CACHE = self.DIR_ROOT + "/cache/"
 
         self.MULTI_EXPERIMENTS = False
         self.PROCESSING_WIDTH = 1920
 
+        # Number of worker processes for the colorimetry, 1 computes it in a single thread
+        self.COLORIMETRY_PROCESSES = 1
+        self.COLORIMETRY_CHUNK_SIZE = 16
+
+        # Number of worker processes for the analyses, 1 runs them in a single thread
+        self.ANALYSIS_PROCESSES = 1
+
+        # Directories searched for movies which have been moved, projects are relinked by the movie fingerprint
+        self.MOVIE_DIRECTORIES = []
+
+        # Results of analyses are cached in DIR_CACHE and reused if the analysis is run again with the same inputs
+        self.USE_ANALYSIS_CACHE = True
+
+        # Analyses and screenshot images of a project are only loaded when they are accessed
+        self.LAZY_PROJECT_LOADING = True
+
+        # Proxy Frames, downscaled frames stored in the project to avoid decoding the movie
+        self.USE_PROXY_FRAMES = False
+        self.PROXY_FRAME_STRIDE = 10
+        self.PROXY_FRAME_WIDTH = 480
+
         self.UPDATE_SOURCE = ""#"\\\\130.60.131.134\\team\\Software\\VIAN\\OSX\\"
 
         if not os.path.isdir(self.DIR_ROOT):
@@ -241,9 +263,10 @@ class UserSettings():
         self.DIR_PROJECTS = self.DIR_ROOT + "/projects/"
         self.DIR_SCRIPTS = self.DIR_ROOT + "/scripts/"
         self.DIR_VOCABULARIES = self.DIR_ROOT + "/vocabularies/"
+        self.DIR_CACHE = self.DIR_ROOT + "/cache/"
 
         for d in [self.DIR_ROOT, self.DIR_TEMPLATES, self.DIR_BACKUPS, self.DIR_PLUGINS,
-                  self.DIR_CORPORA, self.DIR_PROJECTS, self.DIR_SCRIPTS, self.DIR_VOCABULARIES]:
+                  self.DIR_CORPORA, self.DIR_PROJECTS, self.DIR_SCRIPTS, self.DIR_VOCABULARIES, self.DIR_CACHE]:
             if not os.path.isdir(d):
                 os.mkdir(d)
                 log_info(d + "\t Directory created.")
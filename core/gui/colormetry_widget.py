@@ -4,7 +4,7 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from core.data.interfaces import IProjectChangeNotify
 from core.data.log import log_error, log_info
-from core.analysis.colorimetry.hilbert import create_hilbert_transform, hilbert_mapping_3d, HilbertMode
+from core.analysis.colorimetry.hilbert import get_hilbert_transform, hilbert_mapping_3d, HilbertMode
 from core.visualization.palette_plot import PaletteWidget, PaletteLABWidget, PaletteTimeWidget
 from core.visualization.basic_vis import HistogramVis
 from core.gui.ewidgetbase import ExpandableWidget, ESimpleDockWidget
@@ -58,7 +58,7 @@ class ColorimetryLiveWidget(EDockWidget, IProjectChangeNotify):
 
         # self.vis_tab = QTabWidget(self)
         # self.lt.addWidget(self.vis_tab)
-        self.hilbert_table, self.hilbert_colors = create_hilbert_transform(16)
+        self.hilbert_table, self.hilbert_colors = get_hilbert_transform(16)
 
         self.worker_ready = True
         self.latest_worker_data = None
@@ -74,6 +74,11 @@ class ColorimetryLiveWidget(EDockWidget, IProjectChangeNotify):
 
         self.current_data = None
 
+        # The times and spatial frequencies fetched so far, only the new entries are fetched on an update
+        self.spatial_times = np.zeros(shape=(0, ))
+        self.spatial_data = dict()
+        self.spatial_generation = None
+
         # self.palette = PaletteVis(self)
         self.palette = PaletteWidget(self)
         self.lab_palette = PaletteLABWidget(self)
@@ -136,6 +141,18 @@ class ColorimetryLiveWidget(EDockWidget, IProjectChangeNotify):
         if self.latest_worker_data is not None:
             self.update_timestep(self.latest_worker_data, None)
 
+    def update_spatial(self, colorimetry):
+        """
+        Fetches the times and spatial frequencies the widget doesn't have yet, see ColormetryAnalysis.get_spatial().
+        """
+        since = len(self.spatial_times) if self.spatial_generation == colorimetry.generation else 0
+        data = colorimetry.get_spatial(since)
+        self.spatial_generation = data['generation']
+        start = data['spatial_start']
+        self.spatial_times = np.concatenate([self.spatial_times[:start], data['times']])
+        for k, v in data['spatial'].items():
+            self.spatial_data[k] = np.concatenate([self.spatial_data.get(k, np.zeros((0, ) + v.shape[1:]))[:start], v])
+
     @pyqtSlot(object, int)
     def update_timestep(self, data, time_ms):
         if data is not None:
@@ -155,6 +172,7 @@ class ColorimetryLiveWidget(EDockWidget, IProjectChangeNotify):
 
             if self.spatial_complexity_vis.isVisible():
                 self.spatial_complexity_vis.clear_view()
+                self.update_spatial(self.main_window.project.colormetry_analysis)
                 colors = [
                     QColor(200, 61, 50),
                     QColor(98, 161, 169),
@@ -162,9 +180,9 @@ class ColorimetryLiveWidget(EDockWidget, IProjectChangeNotify):
                     QColor(230, 183, 64)
                 ]
                 cidx = data['current_idx']
-                for i, key in enumerate(data['spatial'].keys()):
-                    xs = data['times']
-                    ys = data['spatial'][key]
+                for i, key in enumerate(self.spatial_data.keys()):
+                    xs = self.spatial_times
+                    ys = self.spatial_data[key]
                     self.spatial_complexity_vis.plot(xs[:cidx], ys[:cidx, 0], colors[i],
                                                      line_name=key,
                                                      force_xmax=self.main_window.project.movie_descriptor.duration)
@@ -234,6 +252,9 @@ class ColorimetryLiveWidget(EDockWidget, IProjectChangeNotify):
     def on_closed(self):
         self.palette.clear_view()
         self.lab_palette.clear_view()
+        self.spatial_times = np.zeros(shape=(0, ))
+        self.spatial_data = dict()
+        self.spatial_generation = None
 
     def on_changed(self, project, item):
         pass
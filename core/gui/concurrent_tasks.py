@@ -31,8 +31,17 @@ class ConcurrentTaskDock(EDockWidget, IProjectChangeNotify):
         self.task_list_widget.remove_task(task_id)
 
     @pyqtSlot(int, float)
-    def update_progress(self, task_id, value_float):
-        return self.task_list_widget.update_progress(task_id, value_float)
+    def update_progress(self, task_id, value_float, items_per_second = None, eta = None):
+        return self.task_list_widget.update_progress(task_id, value_float, items_per_second, eta)
+
+    @pyqtSlot(object)
+    def update_progress_batch(self, reports):
+        """
+        Updates several tasks at once.
+
+        :param reports: a dict task_id: (fraction, frames per second, remaining seconds) as sent by a ProgressChannel
+        """
+        return self.task_list_widget.update_progress_batch(reports)
 
 
 class ConcurrentTasksList(QWidget):
@@ -59,10 +68,17 @@ class ConcurrentTasksList(QWidget):
         self.update_total()
 
     @pyqtSlot(int, float)
-    def update_progress(self,task_id, value_float):
+    def update_progress(self,task_id, value_float, items_per_second = None, eta = None):
         if task_id in self.task_entries:
             w = self.task_entries[task_id]
-            w.update_progress(value_float)
+            w.set_progress(value_float, items_per_second, eta)
+        return self.update_total()
+
+    @pyqtSlot(object)
+    def update_progress_batch(self, reports):
+        for task_id, (value_float, items_per_second, eta) in reports.items():
+            if task_id in self.task_entries:
+                self.task_entries[task_id].set_progress(value_float, items_per_second, eta)
         return self.update_total()
 
     def update_total(self):
@@ -93,6 +109,7 @@ class ConcurrentTaskEntry(QWidget):
         self.setLayout(QHBoxLayout(self))
         self.lbl_name = QLabel(name)
         self.progress_bar = QProgressBar(self)
+        self.lbl_rate = QLabel("")
         self.btn_abort = QPushButton("Abort")
 
         if job is not None:
@@ -102,14 +119,25 @@ class ConcurrentTaskEntry(QWidget):
 
         self.layout().addWidget(self.lbl_name)
         self.layout().addWidget(self.progress_bar)
+        self.layout().addWidget(self.lbl_rate)
         self.layout().addWidget(self.btn_abort)
 
         self.show()
 
-    def update_progress(self, float_value):
+    def update_progress(self, float_value, items_per_second = None, eta = None):
+        self.set_progress(float_value, items_per_second, eta)
+        self.onProgress.emit()
+
+    def set_progress(self, float_value, items_per_second = None, eta = None):
         self.progress_bar.setValue(float_value * 100)
         self.progress = float_value
-        self.onProgress.emit()
+
+        text = []
+        if items_per_second is not None:
+            text.append("{:.1f} fps".format(items_per_second))
+        if eta is not None and float_value < 1.0:
+            text.append("ETA " + ms_to_string(eta * 1000))
+        self.lbl_rate.setText(", ".join(text))
 
     def abort(self):
         self.onAborted.emit(self.task_id)
@@ -10,6 +10,7 @@ from core.data.computation import is_vian_light
 
 from core.gui.vian_webapp import *
 from core.data.cache import HDF5Cache
+from core.data.fingerprint import MovieIndex
 from core.data.exporters import *
 from core.data.importers import *
 from core.data.corpus_client import WebAppCorpusInterface, get_vian_version
@@ -149,6 +150,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.settings.load()
 
         self.hdf5_cache = HDF5Cache(self.settings.DIR_ROOT + "/scr_cache.hdf5")
+        self.movie_index = MovieIndex(self.settings.DIR_CACHE)
 
         self.clipboard_data = []
         # loading_screen.showMessage("Checking ELAN Connection", Qt.AlignHCenter|Qt.AlignBottom,
@@ -460,6 +462,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.actionColormetry.triggered.connect(self.toggle_colormetry)
         self.actionClearColormetry.triggered.connect(self.clear_colormetry)
 
+        self.actionCreateProxyFrames = self.menuAnalysis.addAction("Create Proxy Frames")
+        self.actionCreateProxyFrames.triggered.connect(self.create_proxy_frames)
+
         self.actionStart_AudioExtraction.triggered.connect(partial(self.audio_handler.extract))
 
         self.actionBrowserVisualizations.triggered.connect(partial(self.on_browser_visualization))
@@ -532,7 +537,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Autosave
         self.autosave_timer = QTimer()
-        self.autosave_timer.timeout.connect(self.on_save_project, False)
+        self.autosave_timer.timeout.connect(self.on_autosave)
         self.update_autosave_timer(do_start=False)
 
         self.time_update_interval = 50
@@ -636,7 +641,9 @@ class MainWindow(QtWidgets.QMainWindow):
     def toggle_colormetry(self):
         log_debug("toggle colormetry", self.project.movie_descriptor.fps / 2)
         if self.colormetry_running is False:
-            job = ColormetryJob2(int(self.project.movie_descriptor.fps / 2), self, self.settings.PROCESSING_WIDTH)
+            job = ColormetryJob2(int(self.project.movie_descriptor.fps / 2), self, self.settings.PROCESSING_WIDTH,
+                                 n_processes=self.settings.COLORIMETRY_PROCESSES,
+                                 chunk_size=self.settings.COLORIMETRY_CHUNK_SIZE)
             args = job.prepare(self.project)
             self.actionColormetry.setText("Pause Colormetry")
             worker = MinimalThreadWorker(job.run_concurrent, args, True)
@@ -651,6 +658,17 @@ class MainWindow(QtWidgets.QMainWindow):
             self.colormetry_job.abort()
             self.colormetry_running = False
 
+    def create_proxy_frames(self):
+        if self.project is None or self.project.proxy_cache is None:
+            return
+        job = CreateProxyFramesJob([self.project.movie_descriptor.get_movie_path(),
+                                    self.project.proxy_cache.directory,
+                                    self.project.movie_descriptor.get_letterbox_rect(),
+                                    self.settings.PROXY_FRAME_STRIDE,
+                                    self.settings.PROXY_FRAME_WIDTH,
+                                    self.project.movie_descriptor.get_fingerprint_key()])
+        self.run_job_concurrent(job)
+
     def on_colormetry_push_back(self, data):
         if self.project is not None and self.project.colormetry_analysis is not None:
             self.project.colormetry_analysis.append_data(data[0])
@@ -658,6 +676,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def on_colormetry_finished(self, res):
         try:
+            self.project.hdf5_manager.flush()
             self.project.colormetry_analysis.check_finished()
             if self.project.colormetry_analysis.has_finished:
                 self.timeline.timeline.set_colormetry_progress(1.0)
@@ -1351,7 +1370,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def worker_progress(self, tpl):
         # self.progress_bar.set_progress(float)
-        total = self.concurrent_task_viewer.update_progress(tpl[0],tpl[1])
+        total = self.concurrent_task_viewer.update_progress(*tpl)
         self.progress_bar.set_progress(float(total))
 
     def worker_abort(self, int):
@@ -1700,6 +1719,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def analysis_triggered(self, analysis:IAnalysisJob):
         analysis.max_width = self.settings.PROCESSING_WIDTH
+        analysis.use_proxy_frames = self.settings.USE_PROXY_FRAMES
 
         targets = []
         for sel in self.project.selected:
@@ -1822,6 +1842,21 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.project is not None:
             self.project.create_experiment()
 
+    def find_movie(self, fingerprint):
+        """
+        Returns the path of the movie with the given fingerprint or None.
+        If it isn't known yet, the directories in UserSettings.MOVIE_DIRECTORIES are indexed.
+        """
+        if fingerprint is None:
+            return None
+        path = self.movie_index.find(fingerprint)
+        if path is None:
+            for d in self.settings.MOVIE_DIRECTORIES:
+                if os.path.isdir(d):
+                    self.movie_index.add_directory(d)
+            path = self.movie_index.find(fingerprint)
+        return path
+
     def on_set_movie_path(self):
         if self.project is not None:
             path = parse_file_path(QFileDialog.getOpenFileName(self)[0])
@@ -2032,7 +2067,8 @@ class MainWindow(QtWidgets.QMainWindow):
         new = VIANProject()
         log_info("Loading Project Path", path)
         new.inhibit_dispatch = True
-        new.load_project(path, main_window=self, library=self.vocabulary_library)
+        new.load_project(path, main_window=self, library=self.vocabulary_library,
+                         lazy=self.settings.LAZY_PROJECT_LOADING)
 
         self.project = new
         self.settings.add_to_recent_files(self.project)
@@ -2086,6 +2122,9 @@ class MainWindow(QtWidgets.QMainWindow):
             path = self.project.path
             args = [self.project, self.project.path]
 
+        # The journal is compacted into the stored project
+        args.append(self.project.begin_full_store())
+
         if sync:
             store_project_concurrent(args, self.dummy_func)
         else:
@@ -2100,6 +2139,22 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def on_save_project_as(self):
         self.on_save_project(True)
+
+    def on_autosave(self):
+        """
+        Appends the changes to the journal of the project, the project is stored completely
+        if the changes can't be journaled or the journal has to be compacted.
+        """
+        if self.project is None or self.corpus_widget.in_template_mode:
+            return
+        try:
+            if self.project.store_journal():
+                log_info("Changes journaled to:", self.project.get_journal().path)
+                self.project.undo_manager.no_changes = True
+                return
+        except Exception as e:
+            log_error("Exception in store_journal()", e)
+        self.on_save_project(False)
     #endregion
 
     #region Tools
@@ -2436,25 +2491,52 @@ class MainWindow(QtWidgets.QMainWindow):
         self.thread_pool.start(worker, QThread.HighPriority)
 
         # Check if the file exists locally
-        success = True
         if not os.path.isfile(self.project.movie_descriptor.movie_path):
-            exists = False
-            if self.project.movie_descriptor.movie_path == "":
-                exists = False
-            if not exists:
-                QMessageBox.information(self, "Could not find movie",
-                                        "Could not find movie: " + str(self.project.movie_descriptor.movie_path) +
-                                        "\nPlease set it manually after clicking \"OK\".")
-                path = QtWidgets.QFileDialog.getOpenFileName(self)[0]
-                if os.path.isfile(path):
-                    self.project.movie_descriptor.set_movie_path(path)
-                else:
-                    success = False
+            # Look up the movie by its fingerprint, in the known movies and the movie directories.
+            # Indexing the directories fingerprints the movies in them, which is done on a worker.
+            project = self.project
+            fingerprint = project.movie_descriptor.fingerprint
+            worker = MinimalThreadWorker(lambda: (project, self.find_movie(fingerprint)))
+            worker.signals.finished.connect(self.on_movie_found)
+            self.thread_pool.start(worker, QThread.HighPriority)
+            return
 
-        if not success:
-            self.close_project()
+        self.dispatch_on_movie_loaded()
+
+    @pyqtSlot(object)
+    def on_movie_found(self, result):
+        """
+        Relinks the movie of the project once it has been looked up by find_movie(), or asks for its path.
+
+        :param result: a tuple (project, path), path is None if the movie hasn't been found
+        """
+        project, path = result
+        if project is not self.project:
             return
 
+        if path is not None:
+            log_info("Movie relinked:", path)
+            self.project.movie_descriptor.set_movie_path(path)
+        else:
+            QMessageBox.information(self, "Could not find movie",
+                                    "Could not find movie: " + str(self.project.movie_descriptor.movie_path) +
+                                    "\nPlease set it manually after clicking \"OK\".")
+            path = QtWidgets.QFileDialog.getOpenFileName(self)[0]
+            if os.path.isfile(path):
+                self.project.movie_descriptor.set_movie_path(path)
+            else:
+                self.close_project()
+                return
+        self.dispatch_on_movie_loaded()
+
+    def dispatch_on_movie_loaded(self):
+        """
+        Finishes loading the project once its movie has been found.
+        """
+        if self.movie_index.add(self.project.movie_descriptor.get_movie_path(),
+                                self.project.movie_descriptor.fingerprint) is not None:
+            self.movie_index.save()
+
         self.onMovieOpened.emit(self.project)
         for o in self.i_project_notify_reciever:
             o.on_loaded(self.project)
@@ -2463,9 +2545,14 @@ class MainWindow(QtWidgets.QMainWindow):
         self.frame_update_worker.set_movie_path(self.project.movie_descriptor.get_movie_path())
         self.frame_update_worker.set_project(self.project)
 
-        self.screenshots_manager.set_loading(True)
-        job = LoadScreenshotsJob(self.project)
-        self.run_job_concurrent(job)
+        # Lazily loaded screenshots read their frame when they are shown in the screenshot manager
+        if not self.settings.LAZY_PROJECT_LOADING:
+            self.screenshots_manager.set_loading(True)
+            job = LoadScreenshotsJob(self.project)
+            self.run_job_concurrent(job)
+
+        if self.settings.USE_PROXY_FRAMES and self.project.get_proxy_cache() is None:
+            self.create_proxy_frames()
 
         self.setWindowTitle("VIAN Project:" + str(self.project.path))
         self.dispatch_on_timestep_update(-1)
@@ -87,7 +87,7 @@ class Outliner(EDockWidget, IProjectChangeNotify):
                 self.add_annotation_layer(l)
 
             self.analyzes_group = AnalyzesOutlinerRootItem(self.project_item, 3)
-            for i, a in enumerate(sorted(self.main_window.project.analysis, key=lambda x:x.analysis_job_class)):
+            for i, a in enumerate(sorted(self.main_window.project.get_loaded_analyses(), key=lambda x:x.analysis_job_class)):
                 self.add_analysis(a)
 
             self.node_scripts_group = NodeScriptsRootItem(self.project_item, 4)
@@ -119,7 +119,7 @@ class Outliner(EDockWidget, IProjectChangeNotify):
 
             for entry in self.item_list:
                 if entry.has_item:
-                    for i, a in enumerate(entry.get_container().connected_analyses):
+                    for i, a in enumerate(entry.get_container().get_loaded_analyses()):
                         analysis_item = AnalyzesOutlinerItem(entry, i, a)
                         self.item_list.append(analysis_item)
 
@@ -477,7 +477,8 @@ class AbstractOutlinerItem(QTreeWidgetItem):
     def connect_analyses_slots(self, item):
         item.onAnalysisAdded.connect(self.add_analysis)
         item.onAnalysisRemoved.connect(self.remove_analysis)
-        for a in item.connected_analyses:
+        # Pending analyses of a lazily loaded project are added by onAnalysisAdded once they are loaded
+        for a in item.get_loaded_analyses():
             self.add_analysis(a)
 
     # @pyqtSlot(object)
@@ -1,5 +1,5 @@
 from PyQt5 import QtGui, QtWidgets
-from PyQt5.QtCore import Qt, QPoint, QRectF, pyqtSlot
+from PyQt5.QtCore import Qt, QPoint, QRectF, QTimer, pyqtSlot
 from PyQt5.QtGui import QFont, QColor
 from PyQt5.QtWidgets import *
 from core.data.enums import *
@@ -12,6 +12,7 @@ from core.gui.ewidgetbase import EDockWidget, EToolBar, ImagePreviewPopup
 from core.visualization.image_plots import ImagePlotCircular, ImagePlotTime, ImagePlotPlane
 from core.analysis.color.average_color import ColorFeatureAnalysis
 from core.gui.ewidgetbase import ExpandableWidget, ESimpleDockWidget
+from core.concurrent.worker import MinimalThreadWorker
 
 SCALING_MODE_NONE = 0
 SCALING_MODE_WIDTH = 1
@@ -265,8 +266,7 @@ class ScreenshotsManagerDockWidget(EDockWidget, IProjectChangeNotify):
 
     def color_dt_mode_changed(self, v):
         self.color_dt_mode = v
-        for scr in self.main_window.project.screenshots:
-            self.update_screenshot(scr)
+        self.update_screenshots(self.main_window.project.screenshots)
 
     def remove_screenshot(self, scr):
         self.color_dt.remove_image_by_uid(scr.unique_id)
@@ -275,10 +275,13 @@ class ScreenshotsManagerDockWidget(EDockWidget, IProjectChangeNotify):
 
     def on_loaded(self, project:VIANProject):
         project.onScreenshotGroupAdded.connect(self.connect_scr_group)
+        screenshots = []
         for grp in project.screenshot_groups:
             self.connect_scr_group(grp)
             for scr in grp.screenshots:
-                self.add_screenshot(scr)
+                self.add_screenshot(scr, update=False)
+                screenshots.append(scr)
+        self.update_screenshots(screenshots)
         project.onScreenshotsHighlighted.connect(self.on_screenshots_highlighted)
 
     def on_closed(self):
@@ -305,11 +308,12 @@ class ScreenshotsManagerDockWidget(EDockWidget, IProjectChangeNotify):
         grp.onScreenshotRemoved.connect(self.remove_screenshot)
 
     @pyqtSlot(object)
-    def add_screenshot(self, scr:Screenshot):
+    def add_screenshot(self, scr:Screenshot, update = True):
         scr.onImageSet.connect(self.update_screenshot)
         scr.onAnalysisAdded.connect(self.on_analysis_added)
         scr.onAnalysisRemoved.connect(self.on_analysis_removed)
-        self.update_screenshot(scr)
+        if update:
+            self.update_screenshot(scr)
 
     def on_analysis_added(self, a):
         self.update_screenshot(a.target_container)
@@ -317,22 +321,41 @@ class ScreenshotsManagerDockWidget(EDockWidget, IProjectChangeNotify):
     def on_analysis_removed(self, a):
         self.update_screenshot(a.target_container)
 
+    def get_color_feature_analysis(self, scr):
+        clobj = self.main_window.project.active_classification_object
+        if clobj is None:
+            clobj = "default"
+        try:
+            return scr.get_connected_analysis(ColorFeatureAnalysis, as_clobj_dict=True)[clobj][0]
+        except Exception as e:
+            # Analysis is missing
+            return None
+
+    def update_screenshots(self, screenshots):
+        """
+        Updates the plots of several screenshots, their color features are read at once.
+        """
+        if self.main_window.project is None:
+            return
+        analyses = [self.get_color_feature_analysis(scr) for scr in screenshots]
+        for scr, a in zip(screenshots, self.main_window.project.get_analyses_data(analyses)):
+            self.set_screenshot_features(scr, a)
+
     @pyqtSlot(object, object, object)
     def update_screenshot(self, scr, ndarray=None, pixmap=None):
         if self.main_window.project is None:
             return
-        clobj = self.main_window.project.active_classification_object
-        if clobj is None:
-            try:
-                a = scr.get_connected_analysis(ColorFeatureAnalysis, as_clobj_dict=True)["default"][0].get_adata()
-            except Exception as e:
-                # Analysis is missing or not yet computed
-                a = None
-        else:
+        a = None
+        analysis = self.get_color_feature_analysis(scr)
+        if analysis is not None:
             try:
-                a = scr.get_connected_analysis(ColorFeatureAnalysis, as_clobj_dict=True)[clobj][0].get_adata()
+                a = analysis.get_adata()
             except Exception as e:
+                # Analysis is not yet computed
                 a = None
+        self.set_screenshot_features(scr, a, ndarray, pixmap)
+
+    def set_screenshot_features(self, scr, a, ndarray=None, pixmap=None):
         if a is None:
             self.lc_view.remove_image_by_uid(scr.unique_id)
             self.ab_view.remove_image_by_uid(scr.unique_id)
@@ -359,7 +382,8 @@ class ScreenshotsManagerDockWidget(EDockWidget, IProjectChangeNotify):
             y = sat
 
         if pixmap is None:
-            ndarray = scr.get_img_movie(ignore_cl_obj=False)
+            # The frame is set once it has been read, which emits onImageSet
+            ndarray = scr.get_img_movie(ignore_cl_obj=False, load=False)
             if ndarray.shape[2] == 3:
                 pixmap = numpy_to_pixmap(ndarray)
             else:
@@ -472,6 +496,81 @@ class ScreenshotsManagerWidget(QGraphicsView, IProjectChangeNotify):
 
         self.qimage_cache = dict()
 
+        # The frames of lazily loaded screenshots are read in the background once they are visible
+        self.requested_frames = set()
+        self.frame_generation = 0
+        self.placeholder_pixmap = None
+        self.frame_request_timer = QTimer(self)
+        self.frame_request_timer.setSingleShot(True)
+        self.frame_request_timer.setInterval(100)
+        self.frame_request_timer.timeout.connect(self.request_visible_frames)
+        self.verticalScrollBar().valueChanged.connect(self.on_view_changed)
+        self.horizontalScrollBar().valueChanged.connect(self.on_view_changed)
+
+    def on_view_changed(self, *args):
+        self.frame_request_timer.start()
+
+    def request_visible_frames(self):
+        """
+        Reads the frames of the visible screenshots which haven't been read yet in a worker.
+        """
+        if self.project is None:
+            return
+        visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        screenshots = []
+        for item in self.images_plain:
+            scr = item.screenshot_obj
+            if scr.unique_id in self.requested_frames or not scr.is_img_pending():
+                continue
+            if visible.intersects(item.sceneBoundingRect()):
+                self.requested_frames.add(scr.unique_id)
+                screenshots.append(scr)
+        if len(screenshots) == 0:
+            return
+
+        project = self.project
+        generation = self.frame_generation
+
+        def read_frames():
+            frames = []
+            for scr in screenshots:
+                # Stop once the project has been closed
+                if generation != self.frame_generation:
+                    break
+                frames.append((scr, project.read_movie_frame(scr.frame_pos)))
+            return generation, frames
+
+        worker = MinimalThreadWorker(read_frames)
+        worker.signals.finished.connect(self.on_frames_read)
+        self.main_window.thread_pool.start(worker)
+
+    def get_placeholder_pixmap(self):
+        """
+        Returns the pixmap shown until the frame of a screenshot has been read,
+        it has the size of the frame such that the layout doesn't change once the frame is set.
+        """
+        width = self.project.movie_descriptor.display_width
+        height = self.project.movie_descriptor.display_height
+        if width is None or height is None:
+            width, height = 1280, 720
+        if self.placeholder_pixmap is None or self.placeholder_pixmap.size() != QtCore.QSize(width, height):
+            self.placeholder_pixmap = QtGui.QPixmap(width, height)
+            self.placeholder_pixmap.fill(QColor(30, 30, 30))
+        return self.placeholder_pixmap
+
+    @pyqtSlot(object)
+    def on_frames_read(self, result):
+        generation, frames = result
+        if generation != self.frame_generation:
+            return
+        for scr, frame in frames:
+            if frame is not None and scr.is_img_pending():
+                scr.set_img_movie(frame)
+
+    def resizeEvent(self, event):
+        super(ScreenshotsManagerWidget, self).resizeEvent(event)
+        self.on_view_changed()
+
     def set_loading(self, state):
         if state:
             self.clear_manager()
@@ -548,13 +647,16 @@ class ScreenshotsManagerWidget(QGraphicsView, IProjectChangeNotify):
                 if s.annotation_is_visible and s.img_blend is not None:
                     image = s.img_blend
                 else:
-                    image = s.get_img_movie()
+                    # Placeholders are replaced once the frames are read, see request_visible_frames()
+                    image = s.get_img_movie(load=False)
 
                 if image is None:
                     continue
                 # Convert to Pixmap
                 # Cache the converted QPixamps if these are not the initial place holders
-                if image.shape[0] > 100:
+                if s.is_img_pending():
+                    qpixmap = self.get_placeholder_pixmap()
+                elif image.shape[0] > 100:
                     # Check if the Image is already in the cache
                     # if str(s.unique_id) in self.qimage_cache:
                     #     qpixmap = self.qimage_cache[str(s.unique_id)]
@@ -602,6 +704,7 @@ class ScreenshotsManagerWidget(QGraphicsView, IProjectChangeNotify):
         else:
             # print("Current Location", self.current_y, self.verticalScrollBar().value())
             self.verticalScrollBar().setValue(self.current_y)
+        self.on_view_changed()
 
     def clear_manager(self):
         self.current_y = self.verticalScrollBar().value()
@@ -844,6 +947,8 @@ class ScreenshotsManagerWidget(QGraphicsView, IProjectChangeNotify):
         self.clear_manager()
         self.setEnabled(True)
         self.project = project
+        self.requested_frames = set()
+        self.frame_generation += 1
         self.update_manager()
 
     def on_changed(self, project, item):
@@ -866,6 +971,8 @@ class ScreenshotsManagerWidget(QGraphicsView, IProjectChangeNotify):
     def on_closed(self):
         self.clear_manager()
         self.setEnabled(False)
+        self.requested_frames = set()
+        self.frame_generation += 1
 
     def on_selected(self, sender, selected):
         return
@@ -913,6 +1020,7 @@ class ScreenshotsManagerWidget(QGraphicsView, IProjectChangeNotify):
                 self.arrange_images()
                 self.frame_segment(self.current_segment_index, center = False)
             self.translate(cursor_pos.x(), cursor_pos.y())
+            self.on_view_changed()
 
         else:
             super(ScreenshotsManagerWidget, self).wheelEvent(event)
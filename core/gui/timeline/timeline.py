@@ -750,7 +750,7 @@ class Timeline(QtWidgets.QWidget, IProjectChangeNotify, ITimeStepDepending):
         project.onScreenshotGroupRemoved.connect(self.recreate_timeline)
         project.onAnalysisAdded.connect(self.on_analysis_added)
 
-        for a in project.analysis:
+        for a in project.get_loaded_analyses():
             if issubclass(a.__class__, IAnalysisJobAnalysis):
                 timeline_datasets = a.get_timeline_datasets()
                 if len(timeline_datasets) > 0:
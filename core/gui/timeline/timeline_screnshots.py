@@ -59,8 +59,7 @@ class TimebarPicture(QtWidgets.QWidget):
         qimage, qpixmap = screenshot.get_preview()
         self.pixmap = qpixmap
         self.qimage = qimage
-        self.size = (screenshot.get_img_movie(ignore_cl_obj = True).shape[0],
-                     screenshot.get_img_movie(ignore_cl_obj = True).shape[1])
+        self.size = (screenshot.img_movie.shape[0], screenshot.img_movie.shape[1])
         width = self.size[1] * self.pic_height // self.size[0]
         self.img_rect = QtCore.QRect(1, 1, width, self.pic_height)
         self.resize(width, self.pic_height)
@@ -90,6 +89,8 @@ class TimebarPicture(QtWidgets.QWidget):
         self.update()
 
     def paintEvent(self, QPaintEvent):
+        # The image of the screenshot is only read from the movie once it becomes visible
+        self.item.load_img_movie()
         if self.is_hovered or self.is_selected:
             col = QtGui.QColor(self.color[0], self.color[1], self.color[2], 200)
             w  = 7
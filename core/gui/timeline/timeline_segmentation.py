@@ -46,9 +46,12 @@ class TimebarSegmentationSlice(TimebarSlice):
 
     @pyqtSlot(object)
     def set_color(self, analysis):
-        color_analysis = self.item.get_connected_analysis(ColorFeatureAnalysis, None)
+        # Only looked up if shown, the analyses of a lazily loaded project are loaded on access
+        color_analysis = []
+        if self.timeline.use_color_features is True:
+            color_analysis = self.item.get_connected_analysis(ColorFeatureAnalysis, None)
         try:
-            if len(color_analysis) > 0 and self.timeline.use_color_features is True:
+            if len(color_analysis) > 0:
                 color_analysis = color_analysis[0]
                 data = color_analysis.get_adata()['color_bgr']
                 self.color = (data[2], data[1], data[0], 100)
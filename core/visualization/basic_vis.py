@@ -5,7 +5,7 @@ from PyQt5.QtCore import *
 import numpy as np
 from core.data.computation import get_heatmap_value, ms_to_string
 from core.gui.ewidgetbase import EGraphicsView
-from core.analysis.colorimetry.hilbert import create_hilbert_transform
+from core.analysis.colorimetry.hilbert import get_hilbert_transform
 from core.gui.dialogs.image_export_dialog import ExportImageDialog
 
 class IVIANVisualization():
@@ -425,7 +425,7 @@ class MatrixPlot(EGraphicsView, IVIANVisualization):
 
 
 class HistogramVis(EGraphicsView, IVIANVisualization):
-    def __init__(self, parent, cache_file = "data/hilbert.npz", naming_fields=None):
+    def __init__(self, parent, naming_fields=None):
         EGraphicsView.__init__(self, parent, auto_frame=False)
         IVIANVisualization.__init__(self, naming_fields)
         self.naming_fields['plot_name'] = "color_histogram"
@@ -440,13 +440,7 @@ class HistogramVis(EGraphicsView, IVIANVisualization):
         # self.view.addItem(self.plt)
 
         self.qimage = None
-        if not os.path.isfile(cache_file):
-            self.table, self.colors = create_hilbert_transform(16)
-            np.savez(cache_file, table=self.table, colors=self.colors)
-        else:
-            d = np.load(cache_file)
-            self.table = (d['table'][0], d['table'][1], d['table'][2])
-            self.colors = d['colors']
+        self.table, self.colors = get_hilbert_transform(16)
 
         self.raw_data = None
 
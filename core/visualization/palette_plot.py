@@ -105,7 +105,6 @@ class PaletteView(QWidget, IVIANVisualization):
         IVIANVisualization.__init__(self, naming_fields)
         self.naming_fields['plot_name'] = "palette_plot"
         self.palette_layer = None
-        self.hilbert_lookup = get_hilbert_lookup()
         self.mode = "Layer"
         self.depth = 0
         self.image = None
@@ -167,7 +166,7 @@ class PaletteView(QWidget, IVIANVisualization):
                 indices = []
                 for c in cols_to_draw:
                     c = tpl_bgr_to_lab(np.array([c[2], c[1], c[0]], np.uint8), False)
-                    indices.append(self.hilbert_lookup[c[0], c[1], c[2]])
+                    indices.append(hilbert_index_3d(c[0], c[1], c[2], 256))
                 new_sort = np.argsort(indices)
                 cols_to_draw = cols_to_draw[new_sort]
                 bins_to_draw = bins_to_draw[new_sort]
@@ -89,17 +89,28 @@ class ServerData:
         palettes = []
 
         uuids = []
-        for i, s in enumerate(self.project.screenshots):
+        screenshots = []
+        features = []
+        palettes_analyses = []
+        for s in self.project.screenshots:
             if self.selected_uuids is not None and s.unique_id not in self.selected_uuids:
                 continue
-
+            screenshots.append(s)
             t = s.get_connected_analysis(ColorFeatureAnalysis)
-            if len(t) > 0:
-                try:
-                    arr = t[0].get_adata()['color_lab']
-                except Exception as e:
-                    log_error(e)
+            features.append(t[0] if len(t) > 0 else None)
+            t2 = s.get_connected_analysis(ColorPaletteAnalysis)
+            palettes_analyses.append(t2[0] if len(t2) > 0 else None)
+
+        # The analyses of all screenshots are read at once
+        features_data = self.project.get_analyses_data(features)
+        palettes_data = self.project.get_analyses_data(palettes_analyses)
+
+        for s, t, t_data, t2, t2_data in zip(screenshots, features, features_data, palettes_analyses, palettes_data):
+            if t is not None:
+                if t_data is None:
+                    log_error("Could not load analysis", t.unique_id)
                     continue
+                arr = t_data['color_lab']
                 d = arr.tolist()
                 a.append(d[1])
                 b.append(d[2])
@@ -111,14 +122,11 @@ class ServerData:
                 hue.append(float(lch[2]))
                 saturation.append(float(lab_to_sat(arr)))
 
-            t2 = s.get_connected_analysis(ColorPaletteAnalysis)
-            if len(t2) > 0:
-                try:
-                    arr = t2[0].get_adata()
-                except Exception as e:
-                    log_error(e)
+            if t2 is not None:
+                if t2_data is None:
+                    log_error("Could not load analysis", t2.unique_id)
                     continue
-                pal = get_palette_at_merge_depth(arr, depth=15)
+                pal = get_palette_at_merge_depth(t2_data, depth=15)
                 if pal is not None:
                     palettes.extend(pal)
 
@@ -190,13 +198,14 @@ class ServerData:
             os.mkdir(rdir)
 
         for s in self.project.screenshots:
-            if s.img_movie is None:
+            img = s.get_img_movie(ignore_cl_obj=True)
+            if img is None:
                 continue
 
-            if s.img_movie.shape[0] > 100:
+            if img.shape[0] > 100:
                 p = os.path.join(rdir, str(s.unique_id) + ".jpg")
                 if not os.path.isfile(p):
-                    cv2.imwrite(p, s.img_movie)
+                    cv2.imwrite(p, img)
                 ps.append(p)
         return ps
 
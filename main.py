@@ -21,6 +21,7 @@ import sys
 
 import time
 import logging
+import multiprocessing
 import traceback as tb
 import subprocess
 
@@ -120,6 +121,8 @@ def set_style_sheet(app, path):
 
 
 if __name__ == '__main__':
+    # The worker processes of the analyses and the colorimetry are spawned from the frozen executable
+    multiprocessing.freeze_support()
     attributes = None
     PyQt5.QtCore.qInstallMessageHandler(handler)
 
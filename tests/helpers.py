@@ -0,0 +1,25 @@
+"""
+Fixtures shared by the tests.
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+MOVIE_PATH = "data/test_movie.avi"
+
+
+def create_test_movie(n_frames = 100, step = 2, path = MOVIE_PATH):
+    """
+    Creates the data directory of a test and writes a synthetic 64x48 MJPG movie into it,
+    frame i is filled with the value i * step.
+
+    :return: the path of the movie
+    """
+    os.mkdir("data")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for i in range(n_frames):
+        writer.write(np.full((48, 64, 3), i * step, dtype=np.uint8))
+    writer.release()
+    return path
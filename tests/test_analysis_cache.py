@@ -0,0 +1,65 @@
+import unittest
+import shutil
+
+import numpy as np
+
+from core.container.analysis_cache import AnalysisResultCache, analysis_cache_key
+from core.data.fingerprint import movie_fingerprint, fingerprint_key
+from core.analysis.color.average_color import ColorFeatureAnalysis
+from helpers import MOVIE_PATH, create_test_movie
+
+
+class TestAnalysisResultCache(unittest.TestCase):
+    def setUp(self) -> None:
+        create_test_movie(n_frames=50, step=4)
+        self.cache = AnalysisResultCache("data/cache")
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        shutil.rmtree("data")
+
+    def get_args(self):
+        return [dict(start=i * 10, end=i * 10 + 9, movie_path=MOVIE_PATH, target=str(i),
+                     margins=None, semseg=None, proxy=None) for i in range(5)]
+
+    def test_key(self):
+        movie_key = fingerprint_key(movie_fingerprint(MOVIE_PATH))
+        args = self.get_args()[0]
+        key = analysis_cache_key(ColorFeatureAnalysis(resolution=5), args, movie_key)
+        self.assertEqual(key, analysis_cache_key(ColorFeatureAnalysis(resolution=5), dict(args, target="x"), movie_key))
+        self.assertNotEqual(key, analysis_cache_key(ColorFeatureAnalysis(resolution=10), args, movie_key))
+        self.assertNotEqual(key, analysis_cache_key(ColorFeatureAnalysis(resolution=5), dict(args, end=20), movie_key))
+        self.assertNotEqual(key, analysis_cache_key(ColorFeatureAnalysis(resolution=5), dict(args, margins=[0, 4, 64, 44]), movie_key))
+        self.assertIsNone(analysis_cache_key(ColorFeatureAnalysis(resolution=5), args, None))
+
+        # Results of analyses with parameters which can't be serialized are not cached
+        analysis = ColorFeatureAnalysis(resolution=5)
+        analysis.weights = np.ones(3)
+        self.assertIsNone(analysis_cache_key(analysis, args, movie_key))
+
+    def test_round_trip(self):
+        analysis = ColorFeatureAnalysis(resolution=5)
+        args = self.get_args()
+        movie_key = fingerprint_key(movie_fingerprint(MOVIE_PATH))
+
+        hits, misses, keys = self.cache.split(analysis, args, movie_key)
+        self.assertEqual((hits, misses), ([], args))
+        results = analysis.process_merged(args[:3], lambda p: None)
+        for r in results:
+            self.cache.put(keys[r.target_container], analysis, r)
+
+        hits, misses, keys = self.cache.split(analysis, args, movie_key)
+        self.assertEqual([r.target_container for r in hits], ["0", "1", "2"])
+        self.assertEqual(misses, args[3:])
+        self.assertEqual(sorted(keys.keys()), ["3", "4"])
+        for r, e in zip(hits, results):
+            self.assertEqual(r.analysis_job_class, e.analysis_job_class)
+            self.assertEqual(r.parameters, e.parameters)
+            self.assertTrue(np.allclose(r.data['color_lab'], e.data['color_lab'], atol=0.1))
+
+        hits, misses, keys = self.cache.split(analysis, args[0], movie_key)
+        self.assertEqual((len(hits), misses), (1, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+from core.data.fingerprint import movie_fingerprint, fingerprints_match, fingerprint_key, MovieIndex
+from core.container.project import VIANProject
+
+MOVIE_PATH = "data/test_movie.avi"
+
+
+def write_movie(path, fourcc, seed = 0):
+    rng = np.random.RandomState(seed)
+    texture = cv2.resize(rng.randint(0, 255, size=(6, 8, 3)).astype(np.uint8), (64, 48))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), 25, (64, 48))
+    for i in range(60):
+        writer.write(np.roll(texture, i, axis=1))
+    writer.release()
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self) -> None:
+        os.mkdir("data")
+        write_movie(MOVIE_PATH, "MJPG")
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def test_fingerprint(self):
+        fp = movie_fingerprint(MOVIE_PATH)
+        self.assertEqual(fp['frame_count'], 60)
+        self.assertEqual(len(fp['frame_hashes']), 5)
+        self.assertEqual(fp, movie_fingerprint(MOVIE_PATH))
+        self.assertIsNone(movie_fingerprint("data/missing.avi"))
+
+        # A re-encoded copy matches, another movie doesn't
+        write_movie("data/copy.avi", "XVID")
+        write_movie("data/other.avi", "MJPG", seed=1)
+        copy = movie_fingerprint("data/copy.avi")
+        self.assertNotEqual(fingerprint_key(fp), fingerprint_key(copy))
+        self.assertTrue(fingerprints_match(fp, copy))
+        self.assertFalse(fingerprints_match(fp, movie_fingerprint("data/other.avi")))
+
+    def test_index(self):
+        fp = movie_fingerprint(MOVIE_PATH)
+        os.mkdir("data/moved")
+        shutil.move(MOVIE_PATH, "data/moved/renamed.avi")
+
+        index = MovieIndex("data/cache")
+        self.assertIsNone(index.find(fp))
+        self.assertEqual(index.add_directory("data/moved"), 1)
+        self.assertEqual(index.find(fp), os.path.abspath("data/moved/renamed.avi"))
+
+        # The index is stored and files aren't fingerprinted again
+        index = MovieIndex("data/cache")
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.find(fp), os.path.abspath("data/moved/renamed.avi"))
+
+    def test_descriptor(self):
+        with VIANProject(name="NoDir") as project:
+            project.movie_descriptor.set_movie_path(MOVIE_PATH)
+            fp = project.movie_descriptor.fingerprint
+            self.assertEqual(fp, movie_fingerprint(MOVIE_PATH))
+
+            # The fingerprint is recomputed once the movie file has changed
+            write_movie(MOVIE_PATH, "MJPG", seed=1)
+            os.utime(MOVIE_PATH, (0, 0))
+            project.movie_descriptor.parse_movie()
+            self.assertNotEqual(fingerprint_key(fp), project.movie_descriptor.get_fingerprint_key())
+
+
+if __name__ == '__main__':
+    unittest.main()
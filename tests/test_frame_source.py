@@ -0,0 +1,69 @@
+import unittest
+import shutil
+
+import cv2
+import numpy as np
+
+from core.data.frame_source import FrameSource, DecodePlan
+from core.data.proxy_cache import ProxyFrameCache
+from helpers import MOVIE_PATH, create_test_movie
+
+
+class TestFrameSource(unittest.TestCase):
+    def setUp(self) -> None:
+        create_test_movie()
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def seek_frame(self, idx):
+        cap = cv2.VideoCapture(MOVIE_PATH)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ret, frame = cap.read()
+        cap.release()
+        return frame
+
+    def test_matches_seeking(self):
+        wanted = [90, 3, 10, 11, 40, 99]
+        with FrameSource(MOVIE_PATH, seek_threshold=5) as source:
+            result = list(source.read_frames(wanted))
+
+        self.assertEqual([r[0] for r in result], sorted(wanted))
+        for idx, frame in result:
+            self.assertTrue(np.array_equal(frame, self.seek_frame(idx)))
+
+    def test_stops_at_end(self):
+        with FrameSource(MOVIE_PATH) as source:
+            result = [idx for idx, frame in source.read_frames(range(0, 200, 30))]
+        self.assertEqual(result, [0, 30, 60, 90])
+
+    def test_proxy_frames(self):
+        proxy = ProxyFrameCache("data")
+        self.assertFalse(proxy.is_valid())
+        self.assertTrue(proxy.create(MOVIE_PATH, margins=[0, 8, 64, 40], stride=10, width=32))
+
+        proxy = ProxyFrameCache("data")
+        self.assertTrue(proxy.is_valid([0, 8, 64, 40], stride=10))
+        self.assertFalse(proxy.is_valid(None))
+        self.assertEqual(proxy.get_frame(0).shape, (16, 32, 3))
+        self.assertEqual(proxy.get_padded_frame(0).shape, (24, 32, 3))
+        self.assertEqual(proxy.stored_index(14), 1)
+        self.assertEqual([idx for idx, frame in proxy.read_frames(range(0, 200, 30))], [0, 30, 60, 90])
+
+
+class TestDecodePlan(unittest.TestCase):
+    def test_merge(self):
+        plan = DecodePlan()
+        plan.add(0, range(0, 100, 10))
+        plan.add(1, range(50, 150, 10))
+        plan.add(2, range(141, 190, 10))
+        plan.add(3, range(300, 310, 10))
+
+        self.assertEqual(plan.intervals(), [(0, 181), (300, 300)])
+        self.assertEqual(len(plan), 10 + 5 + 5 + 1)
+        self.assertEqual(plan.targets_of(60), [0, 1])
+        self.assertEqual(plan.targets_of(61), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
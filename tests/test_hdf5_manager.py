@@ -0,0 +1,93 @@
+import unittest
+import os
+import shutil
+
+import numpy as np
+
+from core.container.hdf5_manager import HDF5Manager
+
+HDF5_PATH = "data/analyses.hdf5"
+
+
+class TestHDF5Manager(unittest.TestCase):
+    def setUp(self) -> None:
+        os.mkdir("data")
+        self.manager = HDF5Manager(flush_rows=7)
+        self.manager.set_path(HDF5_PATH)
+        self.manager.initialize_dataset("test", (50, 3), np.float32, dict())
+
+    def tearDown(self) -> None:
+        self.manager.on_close()
+        shutil.rmtree("data")
+
+    def test_buffered_dump(self):
+        for i in range(123):
+            self.manager.dump(np.full(3, i, dtype=np.float32), "test", str(i))
+
+        # Reading a buffered dataset flushes it
+        self.assertTrue(np.array_equal(self.manager.load("120"), [120, 120, 120]))
+        self.assertEqual(self.manager.h5_file["test"].shape, (150, 3))
+        self.assertTrue(np.array_equal(self.manager.h5_file["test"][:123, 0], np.arange(123)))
+
+    def test_read_cache(self):
+        for i in range(10):
+            self.manager.dump(np.full(3, i, dtype=np.float32), "test", str(i))
+        self.manager.load("3")[:] = -1
+        self.assertTrue(np.array_equal(self.manager.load("3"), [3, 3, 3]))
+        self.assertEqual(self.manager.get_cache_stats()['hits'], 1)
+
+        # Dumping a unique id again invalidates its cached array
+        self.manager.dump(np.full(3, 30, dtype=np.float32), "test", "3")
+        self.assertTrue(np.array_equal(self.manager.load("3"), [30, 30, 30]))
+        self.assertEqual(self.manager.get_cache_stats()['misses'], 2)
+
+        self.manager._cache.max_bytes = 3 * 4 * 4
+        for i in range(10):
+            self.manager.load(str(i))
+        self.assertEqual(self.manager.get_cache_stats()['entries'], 4)
+        self.manager.cleanup()
+        self.assertEqual(self.manager.get_cache_stats()['entries'], 0)
+
+    def test_load_many(self):
+        for i in range(200):
+            self.manager.dump(np.full(3, i, dtype=np.float32), "test", str(i))
+
+        # Dense positions are read as one range, sparse ones by their index
+        for uids in [["5", "3", "missing", "4", "3"], ["190", "0", "100"]]:
+            rows, ids = self.manager.load_many(uids)
+            self.assertEqual(ids, [u for u in uids if u != "missing"])
+            self.assertTrue(np.array_equal(rows[:, 0], [int(u) for u in ids]))
+
+        self.manager.initialize_dataset("ragged", (50, 10, 2), np.float32, dict(), dict(ragged=True))
+        for i in range(20):
+            self.manager.dump(np.full((i % 4, 2), i, dtype=np.float32), "ragged", "r" + str(i))
+        rows, ids = self.manager.load_many(["r7", "r2", "r4"])
+        self.assertEqual([r.shape[0] for r in rows], [3, 2, 0])
+        self.assertTrue(np.all(rows[0] == 7))
+
+        # Samples spread over the dataset are read as separate ranges
+        for i in range(20, 400):
+            self.manager.dump(np.full((i % 4, 2), i, dtype=np.float32), "ragged", "r" + str(i))
+        uids = ["r397", "r5", "r201", "r6", "r5", "r8"]
+        rows, ids = self.manager.load_many(uids)
+        self.assertEqual(ids, uids)
+        for r, u in zip(rows, uids):
+            i = int(u[1:])
+            np.testing.assert_array_equal(r, np.full((i % 4, 2), i))
+
+    def test_colorimetry(self):
+        self.manager.initialize_colorimetry(10)
+        for i in range(10):
+            self.manager.dump_colorimetry(dict(palette=np.zeros((1000, 6)),
+                                               hist=np.ones((16, 16, 16)),
+                                               features=np.arange(8),
+                                               time_ms=i * 100,
+                                               spatial_edge=np.ones(2),
+                                               spatial_color=np.ones(2),
+                                               spatial_hue=np.ones(2),
+                                               spatial_luminance=np.ones(2)), i, 10)
+        self.assertTrue(np.array_equal(self.manager.get_colorimetry_times(), np.arange(10) * 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import os
+import shutil
+
+import h5py
+import numpy as np
+
+from core.container.hdf5_manager import HDF5Manager, DS_COL_PAL, RAGGED_OFFSETS
+from core.data.hdf5_migration import migrate_hdf5, benchmark_hdf5
+
+HDF5_PATH = "data/analyses.hdf5"
+
+
+class TestHDF5Storage(unittest.TestCase):
+    def setUp(self) -> None:
+        os.mkdir("data")
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def write(self, storage):
+        manager = HDF5Manager()
+        manager.set_path(HDF5_PATH)
+        manager.initialize_dataset("Palettes", (50, 1024, 6), np.float16, dict(title="Palettes"), storage)
+        for i in range(200):
+            row = np.zeros((1024, 6), dtype=np.float16)
+            row[:10] = i
+            manager.dump(row, "Palettes", str(i))
+        manager.initialize_colorimetry(100, remove=False)
+        manager.on_close()
+
+    def test_storage(self):
+        self.write(dict(compression="gzip"))
+        with h5py.File(HDF5_PATH, "r") as f:
+            self.assertEqual(f["Palettes"].compression, "gzip")
+            self.assertEqual(f["Palettes"].chunks[1:], (1024, 6))
+            self.assertEqual(f[DS_COL_PAL].compression, "gzip")
+
+    def test_migration(self):
+        self.write(dict(compression=None))
+        with h5py.File(HDF5_PATH, "r") as f:
+            self.assertIsNone(f["Palettes"].compression)
+            expected = f["Palettes"][:]
+
+        size_before, size_after = migrate_hdf5(HDF5_PATH)
+        self.assertLess(size_after, size_before / 10)
+        with h5py.File(HDF5_PATH, "r") as f:
+            self.assertEqual(f["Palettes"].compression, "lzf")
+            self.assertEqual(f["Palettes"].attrs['title'], "Palettes")
+            np.testing.assert_array_equal(f["Palettes"][:], expected)
+
+        results = benchmark_hdf5(HDF5_PATH, n_reads=20)
+        self.assertEqual([r['storage'] for r in results], ["uncompressed", "lzf", "gzip", "declared"])
+        self.assertLess(results[2]['size'], results[0]['size'])
+
+        # Padded palettes are migrated to ragged ones
+        migrate_hdf5(HDF5_PATH, lambda name: dict(ragged=True) if name == "Palettes" else None)
+        manager = HDF5Manager()
+        manager.set_path(HDF5_PATH)
+        self.assertTrue(manager.is_ragged("Palettes"))
+        self.assertEqual(manager.h5_file["Palettes"].shape, (1990, 6))
+        self.assertEqual(manager.load_ragged("Palettes", 7).shape, (10, 6))
+        self.assertTrue(np.all(manager.load_ragged("Palettes", 7) == 7))
+        manager.on_close()
+
+    def test_ragged(self):
+        manager = HDF5Manager()
+        manager.set_path(HDF5_PATH)
+        manager.initialize_dataset("Palettes", (50, 1024, 6), np.float16, dict(), dict(ragged=True))
+        for i in range(200):
+            manager.dump(np.full((i % 7, 6), i, dtype=np.float16), "Palettes", str(i))
+            if i % 50 == 0:
+                self.assertEqual(manager.load(str(i)).shape, (i % 7, 6))
+        for i in range(200):
+            np.testing.assert_array_equal(manager.load(str(i)), np.full((i % 7, 6), i))
+        self.assertEqual(manager.h5_file["Palettes" + RAGGED_OFFSETS].shape[0], 200)
+
+        manager.initialize_colorimetry(10, remove=False)
+        for i in range(10):
+            manager.dump_colorimetry(dict(palette=np.full((i + 1, 6), i), hist=np.zeros((16, 16, 16)),
+                                          features=np.zeros(8), time_ms=i + 1,
+                                          spatial_edge=np.zeros(2), spatial_color=np.zeros(2),
+                                          spatial_hue=np.zeros(2), spatial_luminance=np.zeros(2)), i, 10)
+        self.assertEqual(manager.get_colorimetry_pal(3).shape, (4, 6))
+        self.assertEqual([p.shape[0] for p in manager.get_colorimetry_pal()], list(range(1, 11)))
+        manager.cleanup()
+        self.assertLessEqual(manager.h5_file[DS_COL_PAL].shape[0], 100)
+        manager.on_close()
+
+        manager = HDF5Manager()
+        manager.set_path(HDF5_PATH)
+        np.testing.assert_array_equal(manager.load_ragged("Palettes", 199), np.full((3, 6), 199))
+        self.assertEqual(manager.get_colorimetry_pal(9).shape, (10, 6))
+        manager.on_close()
+
+    def test_ragged_resume(self):
+        def palette(i):
+            return np.full((i % 5 + 1, 6), i)
+
+        manager = HDF5Manager()
+        manager.set_path(HDF5_PATH)
+        manager.initialize_dataset("Palettes", (50, 1024, 6), np.float16, dict(), dict(ragged=True))
+        for i in range(3):
+            manager.dump(palette(i), "Palettes", str(i))
+        stored = manager.get_indices()
+        stored = dict(curr_pos=dict(stored['curr_pos']), uidmapping=dict(stored['uidmapping']))
+
+        # Samples written after the project has been stored, closed without storing it
+        for i in range(3, 6):
+            manager.dump(palette(i), "Palettes", str(i))
+        manager.on_close()
+
+        manager = HDF5Manager()
+        manager.set_path(HDF5_PATH)
+        manager.set_indices(stored)
+        manager._index["Palettes"] = 6
+        for i in range(6, 9):
+            manager.dump(palette(i), "Palettes", str(i))
+
+        # The first write after the indices are set flushes the buffered rows without re-acquiring the lock
+        manager.set_indices(dict(curr_pos=dict(), uidmapping=dict()))
+        manager.dump(palette(9), "Palettes", "9")
+        for i in range(10):
+            np.testing.assert_array_equal(manager.load_ragged("Palettes", i), palette(i))
+        manager.on_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
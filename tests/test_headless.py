@@ -0,0 +1,47 @@
+import unittest
+import json
+import shutil
+
+from core.container.project import VIANProject
+from core.data.headless import run_batch, requirements_from_analyses, get_project_paths
+from helpers import MOVIE_PATH, create_test_movie
+
+PROJECT_PATH = "data/project/project.eext"
+
+
+class TestHeadless(unittest.TestCase):
+    def setUp(self) -> None:
+        create_test_movie()
+
+        with VIANProject(name="HeadlessProject", path=PROJECT_PATH, movie_path=MOVIE_PATH) as project:
+            segmentation = project.create_segmentation("Segmentation")
+            segmentation.create_segment2(0, 2000)
+            segmentation.create_segment2(2000, 4000)
+            project.store_project()
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def test_run_batch(self):
+        requirements = requirements_from_analyses(["ColorFeatureAnalysis"])
+        reports = run_batch([PROJECT_PATH], requirements, cache_directory="data/cache")
+        self.assertEqual(len(reports), 1)
+        self.assertIsNone(reports[0]['error'])
+        self.assertEqual(reports[0]['n_analyses'], 2)
+
+        project = VIANProject().load_project(PROJECT_PATH)
+        self.assertEqual(len([a for a in project.analysis if a.analysis_job_class == "ColorFeatureAnalysis"]), 2)
+        project.close()
+
+        # Analyses which are already in the project are not computed again
+        reports = run_batch([PROJECT_PATH], requirements)
+        self.assertEqual(reports[0]['n_analyses'], 0)
+
+    def test_corpus_paths(self):
+        with open("data/corpus.vian_corpus", "w") as f:
+            json.dump(dict(projects={"uuid": PROJECT_PATH}), f)
+        self.assertEqual(get_project_paths(["data/corpus.vian_corpus", "a.eext"]), [PROJECT_PATH, "a.eext"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+import os
+import shutil
+
+import numpy as np
+
+from core.analysis.colorimetry.hilbert import *
+
+
+class TestHilbert(unittest.TestCase):
+    def setUp(self) -> None:
+        os.mkdir("data")
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def test_matches_traversal(self):
+        for s in [2, 4, 8, 16]:
+            mapped = []
+            hilbert_traversal_3d(None, mapped, HilbertMode.Indices_All, s)
+            coords = hilbert_coordinates_3d(np.arange(s ** 3), s)
+            self.assertTrue(np.array_equal(np.array(mapped), coords))
+            self.assertTrue(np.array_equal(hilbert_index_3d(coords[:, 0], coords[:, 1], coords[:, 2], s),
+                                           np.arange(s ** 3)))
+
+        for n in range(1, 6):
+            mapping = []
+            hilbert_2d(mapping, n=n, multiplier=64)
+            self.assertTrue(np.array_equal(np.array(mapping).reshape(-1, 2), hilbert_coordinates_2d(n, 64)))
+
+    def test_cache(self):
+        lookup = get_hilbert_lookup(8)
+        self.assertTrue(os.path.isfile("data/hilbert_lookup_8.npz"))
+        self.assertTrue(np.array_equal(lookup, create_hilbert_lookup_table(8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
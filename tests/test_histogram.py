@@ -0,0 +1,33 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from core.analysis.colorimetry.computation import calculate_histogram, calculate_histograms
+
+
+class TestHistogram(unittest.TestCase):
+    def test_batched(self):
+        rng = np.random.RandomState(0)
+        stack = np.stack([cv2.cvtColor(rng.uniform(size=(20, 30, 3)).astype(np.float32), cv2.COLOR_BGR2LAB)
+                          for _ in range(5)])
+
+        for lab_mode in [False, True]:
+            hists = calculate_histograms(stack, 16, lab_mode=lab_mode)
+            self.assertEqual(hists.shape, (5, 16, 16, 16))
+            for i in range(5):
+                data = stack[i].reshape(-1, 3).astype(np.uint8)
+                self.assertTrue(np.array_equal(hists[i], calculate_histogram(data, 16, lab_mode=lab_mode)))
+            self.assertTrue(np.array_equal(np.sum(hists, axis=0), calculate_histogram(stack, 16, lab_mode=lab_mode)))
+
+    def test_range(self):
+        # The upper bound of the range is excluded, as in cv2.calcHist
+        img = np.full((4, 4, 3), 255, dtype=np.uint8)
+        img[0, 0] = 0
+        hist = calculate_histogram(img)
+        self.assertEqual(np.sum(hist), 1)
+        self.assertEqual(hist[0, 0, 0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
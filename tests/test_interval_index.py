@@ -0,0 +1,65 @@
+import unittest
+import random
+
+from core.container.interval_index import IntervalIndex
+from core.container.project import VIANProject
+
+
+class Item:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    def get_start(self):
+        return self.start
+
+    def get_end(self):
+        return self.end
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def test_queries(self):
+        rng = random.Random(0)
+        items = []
+        for i in range(300):
+            start = rng.randint(0, 10000)
+            items.append(Item(start, start + rng.randint(0, 500)))
+        index = IntervalIndex(lambda: items)
+
+        # Items are added and removed incrementally
+        for i in range(50):
+            start = rng.randint(0, 10000)
+            items.append(Item(start, start + rng.randint(0, 500)))
+            index.add(items[-1])
+            index.remove(items.pop(rng.randrange(len(items))))
+        self.assertEqual(len(index), len(items))
+
+        for t in range(0, 10500, 37):
+            self.assertEqual(set(index.at(t)), set(i for i in items if i.start <= t < i.end))
+            self.assertEqual(set(index.at(t, closed=True)), set(i for i in items if i.start <= t <= i.end))
+            self.assertEqual(set(index.overlapping(t, t + 100)),
+                             set(i for i in items if i.start < t + 100 and i.end > t))
+            self.assertEqual(set(index.starting_in(t, t + 100)), set(i for i in items if t <= i.start < t + 100))
+            self.assertEqual(abs(index.nearest(t).start - t), min(abs(i.start - t) for i in items))
+
+        # A changed item is found again once the index has been invalidated
+        items[0].start, items[0].end = 20000, 20100
+        index.invalidate()
+        self.assertEqual(index.at(20050), [items[0]])
+
+    def test_segmentation(self):
+        project = VIANProject(name="IndexProject")
+        segmentation = project.create_segmentation("Segmentation")
+        for i in range(10):
+            segmentation.create_segment2(i * 1000, (i + 1) * 1000, dispatch=False)
+        self.assertEqual(segmentation.get_segment_of_time(2500).ID, 3)
+
+        segmentation.segments[2].set_end(2200)
+        self.assertIsNone(segmentation.get_segment_of_time(2500))
+        segmentation.remove_segment(segmentation.segments[0])
+        self.assertIsNone(segmentation.get_segment_of_time(500))
+        self.assertEqual([s.get_start() for s in segmentation.get_segments_in_range(1500, 3500)], [1000, 2000, 3000])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import os
+import shutil
+
+from core.container.project import VIANProject
+from core.container.journal import ProjectJournal
+
+PROJECT_PATH = "data/project/project.eext"
+JOURNAL_PATH = "data/project/project.journal"
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        os.mkdir("data")
+        with VIANProject(name="JournalProject", path=PROJECT_PATH) as project:
+            segmentation = project.create_segmentation("Segmentation")
+            for i in range(3):
+                segmentation.create_segment2(i * 1000, (i + 1) * 1000)
+            experiment = project.create_experiment("Experiment")
+            cl_obj = experiment.create_class_object("Object")
+            vocabulary = project.create_vocabulary("Vocabulary")
+            vocabulary.create_word("Word")
+            cl_obj.add_vocabulary(vocabulary)
+            project.store_project()
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def test_journal(self):
+        project = VIANProject().load_project(PROJECT_PATH)
+        segmentation = project.segmentation[0]
+        segmentation.segments[0].set_start(500)
+        segmentation.create_segment2(3000, 4000)
+        segmentation.remove_segment(segmentation.segments[2])
+        project.create_annotation_layer("Layer")
+        experiment = project.experiments[-1]
+        keyword = experiment.get_unique_keywords()[0]
+        experiment.tag_container(segmentation.segments[1], keyword)
+        project.set_name("Renamed")
+
+        project_size = os.path.getsize(PROJECT_PATH)
+        self.assertTrue(project.store_journal())
+        self.assertEqual(os.path.getsize(PROJECT_PATH), project_size)
+        self.assertTrue(os.path.isfile(JOURNAL_PATH))
+        project.close()
+
+        # The journaled changes are applied when the project is loaded
+        project = VIANProject().load_project(PROJECT_PATH)
+        segments = project.segmentation[0].segments
+        self.assertEqual(project.name, "Renamed")
+        self.assertEqual([s.get_start() for s in segments], [500, 1000, 3000])
+        self.assertEqual(project.annotation_layers[-1].name, "Layer")
+        experiment = project.experiments[-1]
+        self.assertTrue(experiment.has_tag(segments[1], experiment.get_unique_keywords()[0]))
+
+        # Storing the project compacts the journal
+        project.store_project()
+        self.assertFalse(os.path.isfile(JOURNAL_PATH))
+        project.close()
+        project = VIANProject().load_project(PROJECT_PATH)
+        self.assertEqual(len(project.segmentation[0].segments), 3)
+        project.close()
+
+    def test_failed_store(self):
+        project = VIANProject().load_project(PROJECT_PATH)
+        project.set_name("Renamed")
+
+        # A store which fails doesn't lose the changes collected before, the next autosave stores completely
+        os.mkdir(PROJECT_PATH + ".tmp")
+        with self.assertRaises(Exception):
+            project.store_project()
+        os.rmdir(PROJECT_PATH + ".tmp")
+        self.assertFalse(project.store_journal())
+
+        project.store_project()
+        project.close()
+        project = VIANProject().load_project(PROJECT_PATH)
+        self.assertEqual(project.name, "Renamed")
+        project.close()
+
+    def test_truncate(self):
+        journal = ProjectJournal(JOURNAL_PATH)
+        journal.append([dict(op="update", data=dict(notes="first"))])
+        offset = journal.size()
+        journal.append([dict(op="update", data=dict(notes="second"))])
+
+        # Records written after the offset has been taken are kept
+        journal.truncate(offset)
+        self.assertEqual(journal.read(), [dict(op="update", data=dict(notes="second"))])
+
+        # An incomplete last record is ignored
+        with open(JOURNAL_PATH, "a") as f:
+            f.write('{"op": "upd')
+        self.assertEqual(len(journal.read()), 1)
+
+        data = dict(notes="")
+        journal.replay(data)
+        journal.replay(data)
+        self.assertEqual(data['notes'], "second")
+
+
+if __name__ == '__main__':
+    unittest.main()
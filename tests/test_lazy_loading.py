@@ -0,0 +1,81 @@
+import unittest
+import shutil
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+from core.container.project import VIANProject
+from core.container.analysis import IAnalysisJobAnalysis
+from core.analysis.color.average_color import ColorFeatureAnalysis
+from helpers import MOVIE_PATH, create_test_movie
+
+PROJECT_PATH = "data/project/project.eext"
+
+
+def color_features(i):
+    return dict(color_lab=np.array([i, 0, 0]), color_bgr=np.array([i, i, i]),
+                saturation_l=0.0, saturation_p=0.0, hue=0.0)
+
+
+class TestLazyLoading(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Screenshots create QPixmaps when their image is set
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self) -> None:
+        create_test_movie()
+
+        with VIANProject(name="LazyProject", path=PROJECT_PATH, movie_path=MOVIE_PATH) as project:
+            project.connect_hdf5()
+            cl_obj = project.get_classification_object_global("Global")
+            segmentation = project.create_segmentation("Segmentation")
+            for i in range(3):
+                segment = segmentation.create_segment2(i * 1000, (i + 1) * 1000)
+                project.add_analysis(IAnalysisJobAnalysis("Color", color_features(i), ColorFeatureAnalysis,
+                                                          dict(), segment, cl_obj))
+            project.create_screenshot("Shot", frame_pos=50)
+            project.store_project()
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def test_analyses(self):
+        project = VIANProject().load_project(PROJECT_PATH, lazy=True)
+        segments = project.segmentation[0].segments
+        self.assertEqual(len(project.pending_analyses), 3)
+        self.assertEqual(len([a for a in project.get_loaded_analyses() if isinstance(a, IAnalysisJobAnalysis)]), 0)
+
+        # Missing analyses are found without deserializing the pending ones
+        missing = project.get_missing_analyses(dict(segment_analyses=[("ColorFeatureAnalysis", "Global", 0)]))
+        self.assertEqual(missing["segment_analyses"][2], 3)
+        self.assertEqual(len(project.pending_analyses), 3)
+
+        # Accessing the analyses of a segment only loads these
+        analyses = segments[1].connected_analyses
+        self.assertEqual(len(analyses), 1)
+        self.assertEqual(analyses[0].get_adata()['color_lab'][0], 1)
+        self.assertEqual(len(project.pending_analyses), 2)
+        self.assertFalse(project.undo_manager.has_modifications())
+
+        # Pending analyses are stored unchanged
+        project.store_project()
+        project.close()
+        project = VIANProject().load_project(PROJECT_PATH)
+        self.assertEqual(len(project.pending_analyses), 0)
+        self.assertEqual(len([a for a in project.analysis if isinstance(a, IAnalysisJobAnalysis)]), 3)
+        project.close()
+
+    def test_screenshots(self):
+        project = VIANProject().load_project(PROJECT_PATH, lazy=True)
+        screenshot = project.screenshots[0]
+        self.assertEqual(screenshot.img_movie.shape, (30, 50, 3))
+
+        img = screenshot.get_img_movie(ignore_cl_obj=True)
+        self.assertEqual(img.shape[1], 250)
+        self.assertAlmostEqual(float(np.mean(img)), 100, delta=3)
+        project.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+from sklearn.cluster import AgglomerativeClustering
+
+from core.analysis.misc import chain_connectivity, cluster_adjacently, adjacent_ward_tree
+
+
+class TestClusterAdjacently(unittest.TestCase):
+    def test_matches_refitting(self):
+        rng = np.random.RandomState(0)
+        X = rng.uniform(size=(50, 8))
+        X[25:] += 0.5
+
+        labels = cluster_adjacently(X, range(1, 20))
+        for n_clusters in range(1, 20):
+            model = AgglomerativeClustering(linkage="ward", connectivity=chain_connectivity(X.shape[0]),
+                                            n_clusters=n_clusters, compute_full_tree=True)
+            model.fit(X)
+            self.assertTrue(np.array_equal(labels[n_clusters], model.labels_))
+
+            # Only adjacent samples are merged, a label never reappears once it changed
+            changes = np.count_nonzero(np.diff(labels[n_clusters]))
+            self.assertEqual(changes, n_clusters - 1)
+
+    def test_cut(self):
+        rng = np.random.RandomState(1)
+        X = rng.uniform(size=(30, 4))
+
+        tree = adjacent_ward_tree(X)
+        labels = cluster_adjacently(X, range(1, 31))
+        for n_clusters in [30, 1, 12, 5]:
+            self.assertTrue(np.array_equal(tree.cut(n_clusters), labels[n_clusters]))
+        self.assertEqual(len(np.unique(tree.cut(30))), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+from fastcluster import linkage
+
+from core.analysis.color.palette_extraction import weighted_ward_linkage, label_means, to_cluster_tree
+
+
+class TestPaletteExtraction(unittest.TestCase):
+    def test_weighted_ward(self):
+        rng = np.random.RandomState(0)
+        X = rng.uniform(0, 100, size=(40, 3))
+        weights = rng.randint(1, 5, size=40) * 2
+
+        Z = weighted_ward_linkage(X, weights)
+        Z_repeated = linkage(np.repeat(X, weights, axis=0), 'ward')
+
+        # The repeated copies are merged first with a distance of zero
+        n_zero = int(np.sum(weights)) - X.shape[0]
+        self.assertTrue(np.allclose(Z_repeated[:n_zero, 2], 0))
+        self.assertTrue(np.allclose(Z[:, 2], Z_repeated[n_zero:, 2]))
+        self.assertTrue(np.array_equal(Z[:, 3], Z_repeated[n_zero:, 3]))
+
+    def test_label_means(self):
+        rng = np.random.RandomState(0)
+        img = rng.uniform(size=(20, 30, 3))
+        labels = rng.randint(0, 5, size=(20, 30)) * 2
+
+        indices, means, counts = label_means(img, labels)
+        self.assertEqual(indices.tolist(), [0, 2, 4, 6, 8])
+        for i, lbl in enumerate(indices):
+            self.assertTrue(np.allclose(means[i], np.mean(img[labels == lbl], axis=0)))
+            self.assertEqual(counts[i], np.sum(labels == lbl))
+
+    def test_cluster_tree(self):
+        colors = [np.array([50, 0, 0], dtype=np.float32),
+                  np.array([52, 0, 0], dtype=np.float32),
+                  np.array([90, 0, 0], dtype=np.float32),
+                  np.array([10, 0, 0], dtype=np.float32)]
+        Z = linkage(np.array(colors), 'ward')
+        (layers, cols, ns), merge_dists = to_cluster_tree(Z, [0, 1, 2, 3], colors, weights=[1, 1, 2, 1])
+
+        # Clusters are split in place, the left child first: [10, [90, [50, 52]]]
+        self.assertEqual(layers.tolist(), [0, 1, 1, 2, 2, 2, 3, 3, 3, 3])
+        self.assertEqual(ns.tolist(), [5, 1, 4, 1, 2, 2, 1, 2, 1, 1])
+        self.assertEqual(merge_dists, list(Z[::-1, 2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
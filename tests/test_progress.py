@@ -0,0 +1,68 @@
+import unittest
+
+from core.concurrent.progress import ProgressChannel, TaskProgress
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class TestProgressChannel(unittest.TestCase):
+    def test_throttle(self):
+        clock = Clock()
+        sent = []
+        channel = ProgressChannel(sent.append, min_interval=0.1, min_delta=0.01, clock=clock)
+        channel.add_task(1, n_items=1000)
+
+        # 1000 signals within one second are reduced to one report every 0.1s
+        for i in range(1000):
+            clock.t = i / 1000
+            channel.update(1, i / 1000)
+        self.assertTrue(9 <= len(sent) <= 11)
+
+        # The final value is always sent
+        channel.update(1, 1.0)
+        value, items_per_second, eta = sent[-1][1]
+        self.assertEqual((value, eta), (1.0, 0.0))
+        self.assertAlmostEqual(items_per_second, 1000 / 0.999)
+
+    def test_coalesce(self):
+        clock = Clock()
+        sent = []
+        channel = ProgressChannel(sent.append, min_interval=0.1, min_delta=0.01, clock=clock)
+        for task_id in range(4):
+            channel.add_task(task_id)
+            channel.update(task_id, 0.0)
+        sent.clear()
+
+        # The updates of parallel tasks are sent together
+        clock.t = 0.05
+        for task_id in range(4):
+            channel.update(task_id, 0.5)
+        self.assertEqual(sent, [])
+        clock.t = 0.2
+        channel.update(0, 0.6)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sorted(sent[0].keys()), [0, 1, 2, 3])
+        self.assertAlmostEqual(channel.total(), (0.6 + 0.5 * 3) / 4)
+
+        channel.update(1, 0.55)
+        channel.flush()
+        self.assertEqual(list(sent[-1].keys()), [1])
+
+    def test_eta(self):
+        clock = Clock()
+        progress = TaskProgress(n_items=200, clock=clock)
+        clock.t = 10.0
+        progress.set(0.0)
+        clock.t = 12.0
+        progress.set(0.25)
+        self.assertEqual(progress.report(), (0.25, 25.0, 6.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 import os
 import shutil
 
+import numpy as np
+
 import core.data.headless2 as vian
 from core.container.project import VIANProject
 from core.data.creation_events import ALL_REGISTERED_PIPELINES
@@ -39,6 +41,37 @@ class TestCreate(unittest.TestCase):
             segmentation.create_segment2(1000, 2000, body="Another Annotation")
 
 
+    def test_colorimetry_update(self):
+        with VIANProject(name="TestProject", path="data/test_project.eext") as project:
+            project.store_project()
+            project.connect_hdf5()
+            project.movie_descriptor.fps = 30
+            project.movie_descriptor.duration = 10000
+            colorimetry = project.create_colormetry(resolution=30)
+            colorimetry.clear()
+            for i in range(6):
+                colorimetry.append_data(dict(palette=np.full((i + 1, 6), i), hist=np.zeros((16, 16, 16)),
+                                             features=np.full(8, i), time_ms=i * 1000,
+                                             spatial_edge=np.full(2, i), spatial_color=np.ones(2),
+                                             spatial_hue=np.ones(2), spatial_luminance=np.ones(2)))
+                if i == 2:
+                    spatial = colorimetry.get_spatial()
+
+            # The consumer fetches the entries computed since the ones it already has
+            self.assertEqual(spatial['times'].tolist(), [0, 1000, 2000])
+            spatial = colorimetry.get_spatial(since=len(spatial['times']))
+            self.assertEqual(spatial['spatial_start'], 3)
+            self.assertEqual(spatial['spatial']['edge'][:, 0].tolist(), [3, 4, 5])
+
+            update = colorimetry.get_update(4000)
+            self.assertEqual(update['palette'][0].shape[0], 5)
+            self.assertNotIn('times', update)
+            self.assertEqual(len(colorimetry.get_update(3000, since=0)['times']), 6)
+
+            generation = spatial['generation']
+            colorimetry.clear()
+            self.assertNotEqual(colorimetry.get_spatial()['generation'], generation)
+
     def test_pipelines(self):
         with VIANProject(name="TestProject", path="data/test_project.eext") as project:
             pipeline = project.create_pipeline_script("TestPipeline", author="UnitTest")
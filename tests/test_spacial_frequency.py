@@ -0,0 +1,79 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from core.analysis.spacial_frequency import get_spacial_frequency_maps, get_spacial_frequency_heatmap, \
+    get_heatmap_rgb, neighborhood_mean_cv, neighborhood_var_cv, img_lab_to_lch, SPACIAL_FREQUENCY_METHODS
+
+
+def reference_map(input_img, method, normalize):
+    """
+    The maps as computed one method at a time before the pass has been fused, returns (map, raw map).
+    """
+    lab = cv2.cvtColor(input_img, cv2.COLOR_BGR2LAB)
+    if method == "edge-mean":
+        edges = cv2.Canny(lab, 20, 20).astype(np.float32)
+        edges = np.clip(cv2.GaussianBlur(edges, (1, 1), 0), 0, 1.0)
+        raw = neighborhood_mean_cv(edges, 20)
+        m = raw / np.amax(raw) if normalize else raw.copy()
+        return m, raw
+
+    if method == "color-var":
+        raw = neighborhood_var_cv(lab.astype(np.float32), 20, channels=(1, 2))
+        m = raw / np.amax(raw) if normalize else raw.copy()
+        hcut = np.percentile(m, 95)
+        m[np.where(m > 0.95)] = np.mean(m)
+        m = cv2.blur(m, (12, 12))
+        return m / hcut, raw
+
+    if method == "hue-var":
+        lch = img_lab_to_lch(cv2.cvtColor(input_img.astype(np.float32) / 255, cv2.COLOR_BGR2LAB))
+        raw = neighborhood_var_cv(lch.astype(np.float32), 20, channels=(1))
+        m = raw / np.amax(raw) if normalize else raw.copy()
+        m = m / np.amax(m)
+        m = m / np.percentile(m, 95)
+        m[np.where(m > 0.95)] = np.mean(m)
+        return cv2.blur(m, (12, 12)), raw
+
+    raw = neighborhood_var_cv(lab.astype(np.float32), 20, channels=(0))
+    m = raw / np.amax(raw) if normalize else raw.copy()
+    m = m / np.percentile(m, 95)
+    m[np.where(m > 0.95)] = np.mean(m)
+    return cv2.blur(m, (12, 12)), raw
+
+
+class TestSpacialFrequency(unittest.TestCase):
+    def setUp(self) -> None:
+        rng = np.random.RandomState(0)
+        self.img = cv2.resize(rng.randint(0, 255, size=(12, 16, 3)).astype(np.uint8), (96, 72))
+
+    def test_fused(self):
+        for normalize in (True, False):
+            maps = get_spacial_frequency_maps(self.img, normalize=normalize)
+            self.assertEqual(sorted(maps.keys()), sorted(SPACIAL_FREQUENCY_METHODS))
+            for method in SPACIAL_FREQUENCY_METHODS:
+                m, raw = reference_map(self.img, method, normalize)
+                np.testing.assert_allclose(maps[method][1], raw, rtol=1e-5, atol=1e-7)
+                np.testing.assert_allclose(maps[method][0], m, rtol=1e-4, atol=1e-6)
+
+                # A single method computed through the heatmap gives the same maps
+                color_img, heatmap, heatmap_raw = get_spacial_frequency_heatmap(self.img, method=method,
+                                                                                normalize=normalize)
+                np.testing.assert_allclose(heatmap_raw, raw, rtol=1e-5, atol=1e-7)
+                if method == "edge-mean":
+                    np.testing.assert_array_equal(heatmap, (m * 255).astype(np.uint8))
+                else:
+                    np.testing.assert_allclose(heatmap, m, rtol=1e-4, atol=1e-6)
+                np.testing.assert_array_equal(color_img, get_heatmap_rgb(m, self.img)[0])
+
+    def test_raw_only(self):
+        maps = get_spacial_frequency_maps(self.img, normalize=False, raw_only=True)
+        for method in SPACIAL_FREQUENCY_METHODS:
+            self.assertIsNone(maps[method][0])
+            np.testing.assert_allclose(maps[method][1], reference_map(self.img, method, False)[1],
+                                       rtol=1e-5, atol=1e-7)
+
+
+if __name__ == '__main__':
+    unittest.main()
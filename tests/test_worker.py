@@ -0,0 +1,74 @@
+import unittest
+import shutil
+import pickle
+
+import numpy as np
+
+from core.concurrent.worker import ProcessTaskExecutor, split_merged_args
+from core.analysis.color.average_color import ColorFeatureAnalysis
+from core.analysis.audio.audio_volume import AudioVolumeAnalysis
+from helpers import MOVIE_PATH, create_test_movie
+
+
+class TestProcessTaskExecutor(unittest.TestCase):
+    def setUp(self) -> None:
+        create_test_movie()
+
+    def tearDown(self) -> None:
+        shutil.rmtree("data")
+
+    def test_matches_thread(self):
+        analysis = ColorFeatureAnalysis(resolution=5)
+        args = [dict(start=i * 10, end=i * 10 + 9, movie_path=MOVIE_PATH, target=str(i),
+                     margins=None, semseg=None, proxy=None) for i in range(10)]
+        tasks = [(i, analysis, a, None) for i, a in enumerate(split_merged_args(args, 3))]
+        self.assertEqual(sorted(a['target'] for t in tasks for a in t[2]), sorted(a['target'] for a in args))
+
+        results, progress, errors = dict(), [], []
+        executor = ProcessTaskExecutor(2)
+        try:
+            local = executor.run(tasks, lambda task_id, a, r: results.update({task_id: r}),
+                                 lambda task_id, p: progress.append(task_id), errors.append, lambda: False)
+        finally:
+            executor.shutdown()
+
+        self.assertEqual(local, [])
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(results.keys()), [0, 1, 2])
+        self.assertTrue(len(progress) > 0)
+        for task_id, a, targets, _ in tasks:
+            expected = analysis.process_merged(targets, lambda p: None)
+            self.assertEqual([r.target_container for r in results[task_id]], [r.target_container for r in expected])
+            for r, e in zip(results[task_id], expected):
+                self.assertTrue(np.array_equal(r.data['color_lab'], e.data['color_lab']))
+
+    def test_thread_only(self):
+        executor = ProcessTaskExecutor(1)
+        try:
+            self.assertFalse(executor.can_run(AudioVolumeAnalysis(), dict()))
+            self.assertTrue(executor.can_run(ColorFeatureAnalysis(), dict()))
+            self.assertFalse(executor.can_run(ColorFeatureAnalysis(), dict(semseg=object())))
+            self.assertFalse(executor.can_run(ColorFeatureAnalysis(), [dict(semseg=None), dict(semseg=object())]))
+
+            restored = pickle.loads(pickle.dumps(ColorFeatureAnalysis(resolution=7)))
+            self.assertEqual(restored.resolution, 7)
+        finally:
+            executor.shutdown()
+
+    def test_unpicklable(self):
+        args = dict(start=0, end=9, movie_path=MOVIE_PATH, target="0", margins=None, semseg=None, proxy=None,
+                    callback=lambda: None)
+        tasks = [(0, ColorFeatureAnalysis(resolution=5), args, None)]
+        errors = []
+        executor = ProcessTaskExecutor(1)
+        try:
+            local = executor.run(tasks, lambda task_id, a, r: None, lambda task_id, p: None,
+                                 errors.append, lambda: False)
+        finally:
+            executor.shutdown()
+        self.assertEqual(local, tasks)
+        self.assertEqual(errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()